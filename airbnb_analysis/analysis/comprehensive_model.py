@@ -9,13 +9,27 @@ import statsmodels.api as sm
 BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
-from airbnb_analysis.models.regression import fit_log_linear_model
+from airbnb_analysis.models.regression import fit_log_linear_model, fit_fixed_effects_model, RegressionAccumulator
 from airbnb_analysis.visualization.style import save_figure
-from airbnb_analysis.config.settings import OUTPUT_DIR
+from airbnb_analysis.config.settings import OUTPUT_DIR, MODEL_DIR, STREAMING_CONFIG, SCORING_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
+from airbnb_analysis.data.cleaner import compute_cleaning_stats
+from airbnb_analysis.models.price_model import (
+    MODEL_FEATURES,
+    engineer_model_features,
+    build_model_artifact,
+    save_model_artifact,
+)
 
-def run_comprehensive_model(df):
-    """运行综合价格预测模型"""
+def prepare_model_data(df):
+    """特征工程，返回删除缺失值后的特征和价格"""
+    df_model = engineer_model_features(df)
+
+    # 过滤有效数据
+    return df_model[MODEL_FEATURES + ['price']].dropna()
+
+def run_comprehensive_model(df, city_name=None):
+    """运行综合价格预测模型（city_name记录在模型工件中，评分时据此核对输入城市）"""
     print("\n" + "="*80)
     print("综合模型: 价格预测")
     print("="*80)
@@ -23,24 +37,8 @@ def run_comprehensive_model(df):
     print("\n" + "="*80)
     print("="*80)
 
-# 准备建模数据
-    df_model = df.copy()
-
-# 特征工程
-    df_model['is_entire'] = (df_model[FEATURE_COLS['room_type']] == 'Entire home/apt').astype(int)
-    df_model['is_manhattan'] = (df_model[FEATURE_COLS['neighbourhood_group']] == 'Manhattan').astype(int)
-    df_model['is_superhost'] = (df_model[FEATURE_COLS['superhost']] == 't').astype(int)
-    df_model['log_accommodates'] = np.log1p(df_model[FEATURE_COLS['accommodates']])
-    df_model['log_ltm'] = np.log1p(df_model[FEATURE_COLS['reviews_ltm']] + 1)
-    df_model['log_host_listings'] = np.log1p(df_model[FEATURE_COLS['host_listings_count']] + 1)
-
-# 选择特征
-    features = ['is_entire', 'accommodates', 'is_manhattan', 'is_superhost',
-                'calculated_host_listings_count', 'review_scores_rating', 
-                'number_of_reviews_ltm', 'latitude', 'longitude']
-
-# 过滤有效数据
-    df_model_clean = df_model[features + ['price']].dropna()
+    features = MODEL_FEATURES
+    df_model_clean = prepare_model_data(df)
 
     if len(df_model_clean) > 1000:
         X = df_model_clean[features]
@@ -56,7 +54,13 @@ def run_comprehensive_model(df):
         model = fit_log_linear_model(X, y_log)
         
         print("\n价格预测模型 (Log-linear):")
-        print(model.summary().tables[1])
+        print(model.summary_frame().round(4).to_string())
+        
+        # 保存模型工件供批量评分使用；填充用的中位数在清洗后的数据上重算
+        # （中位数填充不改变中位数，与清洗时使用的值一致）
+        artifact = build_model_artifact(model, compute_cleaning_stats(df), city_name)
+        artifact_path = save_model_artifact(artifact, MODEL_DIR / SCORING_CONFIG['artifact_file'])
+        print(f"\n✓ 模型工件已保存: {artifact_path}")
         
         # 特征重要性可视化
         fig, ax = plt.subplots(figsize=(10, 8))
@@ -77,9 +81,103 @@ def run_comprehensive_model(df):
         save_figure(fig, 'comprehensive_price_model.png', OUTPUT_DIR)
         plt.close()
 
+    run_neighbourhood_model(df, city_name)
+
     print("\n" + "="*80)
     print("所有分析完成！图表已保存。")
     print("="*80)
 
     return {}
 
+def fit_neighbourhood_model(df):
+    """扩展综合模型：在综合模型特征上加入街区（neighbourhood_cleansed）固定效应"""
+    neighbourhood = FEATURE_COLS['neighbourhood']
+    if neighbourhood not in df.columns:
+        return None
+    df_model = prepare_model_data(df)
+    groups = df[neighbourhood].reindex(df_model.index)
+    valid = groups.notna().to_numpy()
+    if valid.sum() <= len(MODEL_FEATURES) + groups[valid].nunique():
+        return None
+    df_model = df_model[valid]
+    y_log = np.log(df_model['price'].to_numpy(dtype=float))
+    return fit_fixed_effects_model(
+        df_model[MODEL_FEATURES].to_numpy(dtype=float), y_log, groups[valid].astype(str).to_numpy(),
+        MODEL_FEATURES, prefix='neighbourhood'
+    )
+
+def run_neighbourhood_model(df, city_name=None):
+    """运行街区固定效应综合模型并打印特征系数表"""
+    print("\n" + "="*80)
+    print(f"综合模型: 街区固定效应{f' ({city_name})' if city_name else ''}")
+    print("="*80)
+
+    model = fit_neighbourhood_model(df)
+    if model is None:
+        print("  ⚠ 缺少街区数据或样本量不足")
+        return None
+
+    features = [name for name in model.params.index if not name.startswith('neighbourhood[')]
+    print(f"  样本量: {model.nobs}, 街区数: {model.n_levels}, R²: {model.rsquared:.4f}")
+    if model.absorbed:
+        print(f"  被固定效应吸收的特征: {', '.join(model.absorbed)}")
+    print(f"\n价格预测模型 (Log-linear, 街区固定效应):")
+    print(model.summary_frame().loc[features].round(4).to_string())
+    return model
+
+def _iter_pooled_chunks(cities_data, cities, chunksize):
+    """逐城市、逐块生成混合模型的设计矩阵（特征 + 城市虚拟变量）和对数价格"""
+    for index, city_name in enumerate(cities):
+        try:
+            df_clean = prepare_model_data(cities_data[city_name])
+        except KeyError:
+            continue
+        for start in range(0, len(df_clean), chunksize):
+            chunk = df_clean.iloc[start:start + chunksize]
+            # 城市固定效应：每个城市一个截距（不再单独设常数项）
+            city_dummies = np.zeros((len(chunk), len(cities)))
+            city_dummies[:, index] = 1
+            X = np.column_stack([chunk[MODEL_FEATURES].to_numpy(dtype=float), city_dummies])
+            yield X, np.log(chunk['price'].to_numpy(dtype=float))
+
+def fit_pooled_model(cities_data, cov_type='HC1', chunksize=None):
+    """各城市混合的综合模型（城市固定效应，HC稳健标准误）
+
+    逐城市、逐块累积充分统计量，不拼接各城市的数据框；第二遍累积稳健协方差。
+    """
+    if chunksize is None:
+        chunksize = STREAMING_CONFIG['chunksize']
+    cities = list(cities_data)
+    names = MODEL_FEATURES + [f'city[{city_name}]' for city_name in cities]
+
+    acc = RegressionAccumulator(names)
+    for X, y in _iter_pooled_chunks(cities_data, cities, chunksize):
+        acc.update(X, y)
+    if acc.n == 0:
+        return None
+
+    # 删除全为0的列（如只在纽约出现的is_manhattan、没有有效数据的城市）
+    kept = [name for name, value in zip(names, np.diag(acc.xtx)) if value > 0]
+    kept_index = [names.index(name) for name in kept]
+    acc = acc.subset(kept)
+    result = acc.fit()
+    for X, y in _iter_pooled_chunks(cities_data, cities, chunksize):
+        acc.update_robust(X[:, kept_index], y, result, cov_type)
+    return acc.robust_fit(result)
+
+def run_pooled_model(cities_data):
+    """运行多城市混合综合模型并打印系数表"""
+    print("\n" + "="*80)
+    print("综合模型: 多城市混合（城市固定效应）")
+    print("="*80)
+
+    model = fit_pooled_model(cities_data)
+    if model is None:
+        print("  ⚠ 没有可用于建模的数据")
+        return None
+
+    features = [name for name in model.params.index if not name.startswith('city[')]
+    print(f"  样本量: {model.nobs}, 城市数: {len(model.params) - len(features)}, R²: {model.rsquared:.4f}")
+    print(f"\n价格预测模型 (Log-linear, {model.cov_type}稳健标准误):")
+    print(model.summary_frame().loc[features].round(4).to_string())
+    return model
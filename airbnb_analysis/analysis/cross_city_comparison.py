@@ -57,6 +57,10 @@ def extract_test_results(all_results):
                         'correlation': test_result.get('correlation'),
                         'premium_ratio': test_result.get('premium_ratio'),
                         'interaction_coef': test_result.get('interaction_coef'),
+                        'effect_size': test_result.get('effect_size'),
+                        'ci_low': test_result.get('ci_low'),
+                        'ci_high': test_result.get('ci_high'),
+                        'null_value': test_result.get('null_value'),
                     })
     
     return pd.DataFrame(test_results)
@@ -178,6 +182,20 @@ def analyze_effect_size(df_results):
         ])
         print(premium_summary)
     
+    # 效应量置信区间（自助法）
+    ci_data = df_results[df_results['ci_low'].notna() & df_results['ci_high'].notna()].copy()
+    if len(ci_data) > 0:
+        print("\n效应量置信区间:")
+        print(ci_data[['city', 'scenario', 'test_name', 'effect_size', 'ci_low', 'ci_high']].to_string(index=False))
+        # 只对有零效应值的效应判断区间是否含零效应（epsilon²等非负效应量没有，以检验p值为准）
+        tested = ci_data[ci_data['null_value'].notna()]
+        if len(tested) > 0:
+            null_value = tested['null_value'].astype(float)
+            excludes_null = (tested['ci_low'] > null_value) | (tested['ci_high'] < null_value)
+            ci_summary = excludes_null.groupby([tested['scenario'], tested['test_name']]).agg(['count', 'sum'])
+            ci_summary.columns = ['城市数', '区间不含零效应']
+            print(ci_summary)
+    
     return corr_data, premium_data
 
 def create_comparison_visualizations(df_results):
@@ -12,14 +12,36 @@ from airbnb_analysis.utils.validate_results import (
     validate_scenario2,
     validate_scenario3,
     validate_scenario4,
-    validate_scenario5
+    validate_scenario5,
+    collect_scenario_effects,
+    fit_city_interaction_models
 )
 from airbnb_analysis.data.multi_city_loader import load_all_cities_data
-from airbnb_analysis.config.settings import DATA_DIR, MULTI_CITY_RESULTS_DIR, MULTI_CITY_CONFIG
+from airbnb_analysis.models.rank_cache import RankCache
+from airbnb_analysis.analysis.comprehensive_model import run_pooled_model, fit_neighbourhood_model
+from airbnb_analysis.models.bootstrap import bootstrap_effects, create_bootstrap_executor
+from airbnb_analysis.config.settings import (
+    DATA_DIR, MULTI_CITY_RESULTS_DIR, MULTI_CITY_CONFIG, BOOTSTRAP_CONFIG
+)
 from airbnb_analysis.config.constants import CITY_NAMES
 
-def analyze_city(df, city_name):
-    """对单个城市运行所有场景的分析"""
+def add_effect_intervals(results, df, city_name, executor=None):
+    """为各场景检验添加效应量及其自助法置信区间"""
+    effects = collect_scenario_effects(df)
+    for effect in effects:
+        effect['name'] = (city_name,) + effect['name']
+    
+    intervals = bootstrap_effects(effects, executor=executor)
+    for (_, scenario, test), interval in intervals.items():
+        if test in results[scenario]:
+            results[scenario][test]['effect_size'] = interval['effect_size']
+            results[scenario][test]['ci_low'] = interval['ci_low']
+            results[scenario][test]['ci_high'] = interval['ci_high']
+            results[scenario][test]['null_value'] = interval['null_value']
+    return results
+
+def analyze_city(df, city_name, executor=None, interaction_model=None):
+    """对单个城市运行所有场景的分析（interaction_model为批量预先拟合的交互效应模型）"""
     print(f"\n{'='*80}")
     print(f"分析城市: {CITY_NAMES.get(city_name, city_name)}")
     print(f"{'='*80}")
@@ -42,9 +64,12 @@ def analyze_city(df, city_name):
         return results
     
     try:
+        # 各场景的Spearman相关共用同一个秩缓存
+        rank_cache = RankCache(df)
+        
         # 场景1: 物理空间溢价
         print("\n场景1: 物理空间溢价...")
-        results['scenario1'] = validate_scenario1(df)
+        results['scenario1'] = validate_scenario1(df, rank_cache, interaction_model)
         
         # 场景2: 位置溢价
         print("场景2: 位置溢价...")
@@ -56,11 +81,29 @@ def analyze_city(df, city_name):
         
         # 场景4: 信任货币化
         print("场景4: 信任货币化...")
-        results['scenario4'] = validate_scenario4(df)
+        results['scenario4'] = validate_scenario4(df, rank_cache)
         
         # 场景5: 活跃度信号
         print("场景5: 活跃度信号...")
-        results['scenario5'] = validate_scenario5(df)
+        results['scenario5'] = validate_scenario5(df, rank_cache)
+        
+        # 扩展综合模型: 街区固定效应（稀疏虚拟变量）
+        print("综合模型: 街区固定效应...")
+        model = fit_neighbourhood_model(df)
+        if model is not None:
+            features = [name for name in model.params.index if not name.startswith('neighbourhood[')]
+            results['neighbourhood_model'] = {
+                'nobs': model.nobs,
+                'n_neighbourhoods': model.n_levels,
+                'rsquared': model.rsquared,
+                'absorbed': model.absorbed,
+                'coefficients': model.summary_frame().loc[features].to_dict('index'),
+            }
+        
+        # 效应量置信区间（重抽样分块在进程池中并行计算）
+        if BOOTSTRAP_CONFIG['enabled']:
+            print("效应量置信区间（自助法）...")
+            add_effect_intervals(results, df, city_name, executor)
         
         print(f"\n✓ {city_name} 分析完成")
         
@@ -89,17 +132,41 @@ def analyze_all_cities(data_dir=None, cities_data=None):
     MULTI_CITY_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
     
     all_results = {}
+    executor = create_bootstrap_executor() if BOOTSTRAP_CONFIG['enabled'] else None
+    
+    # 各城市的交互效应模型一次批量求解
+    interaction_models = fit_city_interaction_models(cities_data)
     
     # 分析每个城市
-    for city_name, df in cities_data.items():
-        result = analyze_city(df, city_name)
-        all_results[city_name] = result
-        
-        # 保存单个城市的结果
-        result_file = MULTI_CITY_RESULTS_DIR / f"{city_name}_results.json"
-        with open(result_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False, default=str)
-        print(f"  结果已保存: {result_file}")
+    try:
+        for city_name, df in cities_data.items():
+            result = analyze_city(df, city_name, executor, interaction_models.get(city_name))
+            all_results[city_name] = result
+            
+            # 保存单个城市的结果
+            result_file = MULTI_CITY_RESULTS_DIR / f"{city_name}_results.json"
+            with open(result_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+            print(f"  结果已保存: {result_file}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    # 多城市混合综合模型（城市固定效应，逐城市累积充分统计量）
+    try:
+        pooled_model = run_pooled_model(cities_data)
+        if pooled_model is not None:
+            pooled_file = MULTI_CITY_RESULTS_DIR / "pooled_model_results.json"
+            with open(pooled_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'nobs': pooled_model.nobs,
+                    'rsquared': pooled_model.rsquared,
+                    'cov_type': pooled_model.cov_type,
+                    'coefficients': pooled_model.summary_frame().to_dict('index'),
+                }, f, indent=2, ensure_ascii=False, default=str)
+            print(f"  混合模型结果已保存: {pooled_file}")
+    except Exception as e:
+        print(f"  ⚠ 混合模型拟合失败: {e}")
     
     # 保存汇总结果
     summary_file = MULTI_CITY_RESULTS_DIR / "all_cities_results.json"
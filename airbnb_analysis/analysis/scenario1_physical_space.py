@@ -10,9 +10,11 @@ BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
 from airbnb_analysis.models.statistical_tests import test_privacy_premium, compute_correlation
-from airbnb_analysis.models.regression import fit_linear_regression, fit_interaction_model
+from airbnb_analysis.models.regression import fit_line, fit_interaction_model
 from airbnb_analysis.models.smoothing import fit_lowess
+from airbnb_analysis.models.quantile_sketch import compute_quantiles
 from airbnb_analysis.visualization.style import save_figure, set_legend_outside
+from airbnb_analysis.visualization.violin import plot_violins
 from airbnb_analysis.config.settings import OUTPUT_DIR, ANALYSIS_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
 
@@ -85,11 +87,11 @@ def analyze_privacy_premium(df):
 
     # Right: Violin on log-price (best view of distribution shift under long tails)
     df_room['log_price_plot'] = np.log1p(df_room[FEATURE_COLS['price']])
-    sns.violinplot(
-        data=df_room,
+    plot_violins(
+        axes[1],
+        df_room,
         x=FEATURE_COLS['room_type'],
         y='log_price_plot',
-        ax=axes[1],
         palette=['#4C72B0', '#DD8452'],
         inner='quartile',
         cut=0
@@ -122,9 +124,11 @@ def analyze_capacity_premium(df):
     # 数据过滤
     df_cap = df[
         df[FEATURE_COLS['accommodates']].between(1, ANALYSIS_CONFIG['accommodates_max'])
-    ].copy()
-    price_low = df_cap[FEATURE_COLS['price']].quantile(ANALYSIS_CONFIG['price_quantile_low'])
-    price_high = df_cap[FEATURE_COLS['price']].quantile(ANALYSIS_CONFIG['price_quantile_high'])
+    ]
+    price_low, price_high = compute_quantiles(
+        df_cap[FEATURE_COLS['price']],
+        [ANALYSIS_CONFIG['price_quantile_low'], ANALYSIS_CONFIG['price_quantile_high']]
+    )
     df_cap = df_cap[df_cap[FEATURE_COLS['price']].between(price_low, price_high)]
     
     # 散点图
@@ -135,18 +139,17 @@ def analyze_capacity_premium(df):
     )
     
     # 线性回归
-    X = df_cap[[FEATURE_COLS['accommodates']]].values
-    y = df_cap[FEATURE_COLS['price']].values
-    lr = fit_linear_regression(X, y)
+    lr = fit_line(df_cap[FEATURE_COLS['accommodates']].values, df_cap[FEATURE_COLS['price']].values)
     
     x_line = np.linspace(
         df_cap[FEATURE_COLS['accommodates']].min(),
         df_cap[FEATURE_COLS['accommodates']].max(), 
         100
     )
-    y_line = lr.predict(x_line.reshape(-1, 1))
+    y_line = lr.predict(x_line)
     axes[0].plot(x_line, y_line, 'r-', linewidth=2, 
-                label=f'Linear: y={lr.coef_[0]:.2f}x+{lr.intercept_:.2f}')
+                label=f'Linear: y={lr.slope:.2f}x+{lr.intercept:.2f}')
+    axes[0].fill_between(x_line, *lr.confidence_band(x_line), color='r', alpha=0.15)
     
     # LOWESS
     x_lowess, y_lowess = fit_lowess(
@@ -164,7 +167,7 @@ def analyze_capacity_premium(df):
     axes[0].grid(True, alpha=0.3)
     
     # Boxplot
-    df_cap_grouped = df_cap[df_cap[FEATURE_COLS['accommodates']].between(1, 8)].copy()
+    df_cap_grouped = df_cap[df_cap[FEATURE_COLS['accommodates']].between(1, 8)]
     sns.boxplot(
         data=df_cap_grouped, 
         x=FEATURE_COLS['accommodates'], 
@@ -188,8 +191,8 @@ def analyze_capacity_premium(df):
     print(f"\n容量溢价分析:")
     print(f"  Spearman 相关系数: {corr_result['correlation']:.4f} "
           f"(p={corr_result['p_value']:.4f})")
-    print(f"  线性回归系数: {lr.coef_[0]:.2f} "
-          f"(每增加1人，价格增加${lr.coef_[0]:.2f})")
+    print(f"  线性回归系数: {lr.slope:.2f} "
+          f"(每增加1人，价格增加${lr.slope:.2f}, R²={lr.r_squared:.3f})")
     
     return {'lr': lr, 'correlation': corr_result}
 
@@ -200,9 +203,11 @@ def analyze_interaction_effect(df):
     # 数据过滤
     df_cap = df[
         df[FEATURE_COLS['accommodates']].between(1, ANALYSIS_CONFIG['accommodates_max'])
-    ].copy()
-    price_low = df_cap[FEATURE_COLS['price']].quantile(ANALYSIS_CONFIG['price_quantile_low'])
-    price_high = df_cap[FEATURE_COLS['price']].quantile(ANALYSIS_CONFIG['price_quantile_high'])
+    ]
+    price_low, price_high = compute_quantiles(
+        df_cap[FEATURE_COLS['price']],
+        [ANALYSIS_CONFIG['price_quantile_low'], ANALYSIS_CONFIG['price_quantile_high']]
+    )
     df_cap = df_cap[df_cap[FEATURE_COLS['price']].between(price_low, price_high)]
     
     # Facet scatter plot
@@ -216,16 +221,14 @@ def analyze_interaction_effect(df):
             )
             
             # Regression line for each room type
-            X_sub = df_subset[[FEATURE_COLS['accommodates']]].values
-            y_sub = df_subset[FEATURE_COLS['price']].values
-            if len(X_sub) > 1:
-                lr_sub = fit_linear_regression(X_sub, y_sub)
+            if len(df_subset) > 1:
+                lr_sub = fit_line(df_subset[FEATURE_COLS['accommodates']].values, df_subset[FEATURE_COLS['price']].values)
                 x_line_sub = np.linspace(
                     df_subset[FEATURE_COLS['accommodates']].min(), 
                     df_subset[FEATURE_COLS['accommodates']].max(), 
                     100
                 )
-                y_line_sub = lr_sub.predict(x_line_sub.reshape(-1, 1))
+                y_line_sub = lr_sub.predict(x_line_sub)
                 axes[0].plot(x_line_sub, y_line_sub, '--', linewidth=2, alpha=0.8)
     
     axes[0].set_xlabel('Accommodates', fontsize=12)
@@ -267,7 +270,7 @@ def analyze_interaction_effect(df):
     
     model = fit_interaction_model(df_model, 'price ~ accommodates * is_entire')
     print(f"\n交互效应模型:")
-    print(model.summary().tables[1])
+    print(model.summary_frame().round(4).to_string())
     
     return {'model': model}
 
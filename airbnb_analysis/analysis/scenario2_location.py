@@ -7,7 +7,6 @@ import sys
 from pathlib import Path
 from scipy.stats import mannwhitneyu, kruskal, spearmanr, gaussian_kde
 from statsmodels.nonparametric.smoothers_lowess import lowess
-from sklearn.linear_model import LinearRegression
 import statsmodels.api as sm
 from statsmodels.formula.api import ols
 
@@ -15,14 +14,53 @@ BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
 from airbnb_analysis.models.statistical_tests import test_group_differences, test_privacy_premium, compute_correlation
-from airbnb_analysis.models.regression import fit_linear_regression, fit_interaction_model, fit_log_linear_model
+from airbnb_analysis.models.regression import fit_line, fit_interaction_model, fit_log_linear_model
 from airbnb_analysis.models.smoothing import fit_lowess, fit_kde
+from airbnb_analysis.models.quantile_sketch import compute_quantiles
+from airbnb_analysis.models.spatial_index import SpatialIndex, load_or_build_spatial_index, save_spatial_index
+from airbnb_analysis.models.spatial_aggregation import aggregate_hex_cells
 from airbnb_analysis.visualization.style import save_figure, set_legend_outside
-from airbnb_analysis.config.settings import OUTPUT_DIR, ANALYSIS_CONFIG
+from airbnb_analysis.visualization.violin import plot_violins
+from airbnb_analysis.visualization.hexbin import plot_hex_cells
+from airbnb_analysis.config.settings import OUTPUT_DIR, ANALYSIS_CONFIG, SPATIAL_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
 
-def run_scenario2(df):
-    """运行场景2的所有分析"""
+def report_comparable_prices(df, city_name=None):
+    """可比房源价格：每个房源查询最近的同房型、同容纳人数房源（KD树空间索引，给出城市名时读取磁盘缓存）"""
+    if city_name is not None:
+        index = load_or_build_spatial_index(df, city_name)
+    else:
+        index = SpatialIndex.from_frame(df)
+    n_trees = index.n_trees
+    radius_km = SPATIAL_CONFIG['comparable_radius_km']
+    latitude = df[FEATURE_COLS['latitude']]
+    longitude = df[FEATURE_COLS['longitude']]
+    room_type = df[FEATURE_COLS['room_type']].to_numpy(dtype=object)
+    comparable = index.comparable_median(
+        latitude, longitude, room_type=room_type,
+        accommodates=df[FEATURE_COLS['accommodates']].to_numpy(dtype=float),
+        exclude=np.arange(len(df))
+    )
+    # 半径内的同房型房源数（不含自身）
+    nearby = np.array([len(hits) for hits in index.query_radius(latitude, longitude, radius_km, room_type=room_type)]) - 1
+    if city_name is not None and index.n_trees > n_trees:
+        # 查询中新建了子集KD树，写回缓存供下次直接使用
+        save_spatial_index(index, df, city_name)
+
+    has_comparable = ~np.isnan(comparable)
+    if has_comparable.sum() <= 2:
+        return
+
+    price = df[FEATURE_COLS['price']].to_numpy(dtype=float)[has_comparable]
+    corr_result = compute_correlation(price, comparable[has_comparable])
+    print(f"\n可比房源价格（最近{SPATIAL_CONFIG['comparable_k']}个同房型、同容纳人数房源的价格中位数）:")
+    print(f"  有可比房源的房源数: {has_comparable.sum()}")
+    print(f"  与自身价格的Spearman相关: r={corr_result['correlation']:.3f}, p={corr_result['p_value']:.4f}")
+    print(f"  价格/可比价格的中位数: {np.median(price / comparable[has_comparable]):.3f}")
+    print(f"  {radius_km:g}公里内同房型房源数的中位数: {np.median(nearby[nearby >= 0]):.0f}")
+
+def run_scenario2(df, city_name=None):
+    """运行场景2的所有分析（city_name用于空间索引缓存）"""
     print("\n" + "="*80)
     print("场景2: 黄金地段的绝对统治")
     print("="*80)
@@ -31,25 +69,28 @@ def run_scenario2(df):
     fig, axes = plt.subplots(1, 2, figsize=(18, 8))
     
     # Geographic scatter
-    df_loc = df[df[FEATURE_COLS['latitude']].notna() & df[FEATURE_COLS['longitude']].notna()].copy()
-    price_low = df_loc[FEATURE_COLS['price']].quantile(ANALYSIS_CONFIG['price_quantile_low'])
-    price_high = df_loc[FEATURE_COLS['price']].quantile(ANALYSIS_CONFIG['price_quantile_high'])
+    df_loc = df[df[FEATURE_COLS['latitude']].notna() & df[FEATURE_COLS['longitude']].notna()]
+    price_low, price_high = compute_quantiles(
+        df_loc[FEATURE_COLS['price']],
+        [ANALYSIS_CONFIG['price_quantile_low'], ANALYSIS_CONFIG['price_quantile_high']]
+    )
     df_loc = df_loc[df_loc[FEATURE_COLS['price']].between(price_low, price_high)]
+    price_p10, price_p90 = compute_quantiles(df_loc[FEATURE_COLS['price']], [0.1, 0.9])
     
     scatter = axes[0].scatter(df_loc[FEATURE_COLS['longitude']], df_loc[FEATURE_COLS['latitude']], 
                              c=df_loc[FEATURE_COLS['price']], s=20, alpha=0.5, 
-                             cmap='YlOrRd', vmin=df_loc[FEATURE_COLS['price']].quantile(0.1),
-                             vmax=df_loc[FEATURE_COLS['price']].quantile(0.9))
+                             cmap='YlOrRd', vmin=price_p10,
+                             vmax=price_p90)
     axes[0].set_xlabel('Longitude', fontsize=12)
     axes[0].set_ylabel('Latitude', fontsize=12)
     axes[0].set_title('Spatial Price Distribution: Price Concentration in Core Areas', 
                       fontsize=14, fontweight='bold')
     plt.colorbar(scatter, ax=axes[0], label='Price ($)')
     
-    # Hexbin plot for density
-    hb = axes[1].hexbin(df_loc[FEATURE_COLS['longitude']], df_loc[FEATURE_COLS['latitude']], 
-                        C=df_loc[FEATURE_COLS['price']],
-                        gridsize=30, cmap='YlOrRd', reduce_C_function=np.median)
+    # Hexbin plot for density（单元中位数由一次排序批量计算）
+    grid, cells = aggregate_hex_cells(df_loc[FEATURE_COLS['longitude']], df_loc[FEATURE_COLS['latitude']],
+                                      df_loc[FEATURE_COLS['price']])
+    hb = plot_hex_cells(axes[1], grid, cells, column='median', cmap='YlOrRd')
     axes[1].set_xlabel('Longitude', fontsize=12)
     axes[1].set_ylabel('Latitude', fontsize=12)
     axes[1].set_title('Price Density Heatmap (Median Price by Grid)', 
@@ -63,8 +104,8 @@ def run_scenario2(df):
     # 2.2 区域分组对比
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
     
-    df_region = df[df[FEATURE_COLS['neighbourhood_group']].notna()].copy()
-    order = df_region.groupby(FEATURE_COLS['neighbourhood_group'])[FEATURE_COLS['price']].median().sort_values(ascending=False).index
+    df_region = df[df[FEATURE_COLS['neighbourhood_group']].notna()]
+    order = df_region.groupby(FEATURE_COLS['neighbourhood_group'], observed=True)[FEATURE_COLS['price']].median().sort_values(ascending=False).index
     
     # Boxplot
     sns.boxplot(data=df_region, x=FEATURE_COLS['neighbourhood_group'], y=FEATURE_COLS['price'], 
@@ -75,8 +116,8 @@ def run_scenario2(df):
     axes[0].tick_params(axis='x', rotation=45)
     
     # Violin plot
-    sns.violinplot(data=df_region, x=FEATURE_COLS['neighbourhood_group'], y=FEATURE_COLS['price'], 
-                  ax=axes[1], palette='viridis', inner='quartile', order=order)
+    plot_violins(axes[1], df_region, x=FEATURE_COLS['neighbourhood_group'], y=FEATURE_COLS['price'], 
+                 palette='viridis', inner='quartile', order=order)
     axes[1].set_title('Price Distribution Shape by Borough', fontsize=14, fontweight='bold')
     axes[1].set_xlabel('Neighbourhood Group', fontsize=12)
     axes[1].set_ylabel('Price ($)', fontsize=12)
@@ -98,7 +139,7 @@ def run_scenario2(df):
     # 2.3 子区位跃迁（仅Manhattan）
     fig, ax = plt.subplots(figsize=(14, 8))
     
-    df_manhattan = df[df[FEATURE_COLS['neighbourhood_group']] == 'Manhattan'].copy()
+    df_manhattan = df[df[FEATURE_COLS['neighbourhood_group']] == 'Manhattan']
     df_manhattan = df_manhattan[df_manhattan[FEATURE_COLS['neighbourhood']].notna()]
     
     # 只显示有足够样本的子区域
@@ -108,7 +149,7 @@ def run_scenario2(df):
     
     if len(df_manhattan_filtered) > 0:
         # 按中位数排序
-        order = df_manhattan_filtered.groupby(FEATURE_COLS['neighbourhood'])[FEATURE_COLS['price']].median().sort_values(ascending=False).index[:15]
+        order = df_manhattan_filtered.groupby(FEATURE_COLS['neighbourhood'], observed=True)[FEATURE_COLS['price']].median().sort_values(ascending=False).index[:15]
         
         sns.boxplot(data=df_manhattan_filtered, x=FEATURE_COLS['neighbourhood'], y=FEATURE_COLS['price'], 
                    ax=ax, palette='coolwarm', order=order)
@@ -123,7 +164,7 @@ def run_scenario2(df):
         plt.close()
         
         print(f"\nManhattan子区域价格中位数 (Top 5):")
-        top5 = df_manhattan_filtered.groupby(FEATURE_COLS['neighbourhood'])[FEATURE_COLS['price']].median().sort_values(ascending=False).head(5)
+        top5 = df_manhattan_filtered.groupby(FEATURE_COLS['neighbourhood'], observed=True)[FEATURE_COLS['price']].median().sort_values(ascending=False).head(5)
         for neigh, median in top5.items():
             print(f"  {neigh}: ${median:.2f}")
 
@@ -132,7 +173,7 @@ def run_scenario2(df):
     
     # 固定条件：Private room, accommodates = 1
     df_controlled = df[(df[FEATURE_COLS['room_type']] == 'Private room') & 
-                       (df[FEATURE_COLS['accommodates']] == 1)].copy()
+                       (df[FEATURE_COLS['accommodates']] == 1)]
     df_controlled = df_controlled[df_controlled[FEATURE_COLS['neighbourhood']].notna()]
     
     # 只显示有足够样本的子区域
@@ -142,7 +183,7 @@ def run_scenario2(df):
     
     if len(df_controlled_filtered) > 0:
         # 按中位数排序
-        order = df_controlled_filtered.groupby(FEATURE_COLS['neighbourhood'])[FEATURE_COLS['price']].median().sort_values(ascending=False).index[:15]
+        order = df_controlled_filtered.groupby(FEATURE_COLS['neighbourhood'], observed=True)[FEATURE_COLS['price']].median().sort_values(ascending=False).index[:15]
         
         sns.boxplot(data=df_controlled_filtered, x=FEATURE_COLS['neighbourhood'], y=FEATURE_COLS['price'], 
                    ax=ax, palette='Set3', order=order)
@@ -157,9 +198,22 @@ def run_scenario2(df):
         plt.close()
         
         print(f"\n控制条件后（Private room, 1人）各区域价格中位数 (Top 5):")
-        top5 = df_controlled_filtered.groupby(FEATURE_COLS['neighbourhood'])[FEATURE_COLS['price']].median().sort_values(ascending=False).head(5)
+        top5 = df_controlled_filtered.groupby(FEATURE_COLS['neighbourhood'], observed=True)[FEATURE_COLS['price']].median().sort_values(ascending=False).head(5)
         for neigh, median in top5.items():
             print(f"  {neigh}: ${median:.2f}")
-    
+
+        # 控制子集中各区域样本很小，渐近分布不可靠，使用置换检验
+        result = test_group_differences(
+            df_controlled_filtered, FEATURE_COLS['neighbourhood'], FEATURE_COLS['price'],
+            min_samples=5, pvalue_method='permutation'
+        )
+        if result:
+            print(f"  Kruskal-Wallis 置换检验 p-value: {result['p_value']:.4f} "
+                  f"({result['n_permutations']} 次置换)")
+
+    # 2.5 可比房源价格（可选）
+    if SPATIAL_CONFIG['comparable_report']:
+        report_comparable_prices(df, city_name)
+
     return {}
 
@@ -7,7 +7,6 @@ import sys
 from pathlib import Path
 from scipy.stats import mannwhitneyu, kruskal, spearmanr, gaussian_kde
 from statsmodels.nonparametric.smoothers_lowess import lowess
-from sklearn.linear_model import LinearRegression
 import statsmodels.api as sm
 from statsmodels.formula.api import ols
 
@@ -15,9 +14,10 @@ BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
 from airbnb_analysis.models.statistical_tests import test_group_differences, test_privacy_premium, compute_correlation
-from airbnb_analysis.models.regression import fit_linear_regression, fit_interaction_model, fit_log_linear_model
+from airbnb_analysis.models.regression import fit_line, fit_interaction_model, fit_log_linear_model
 from airbnb_analysis.models.smoothing import fit_lowess, fit_kde
 from airbnb_analysis.visualization.style import save_figure, set_legend_outside
+from airbnb_analysis.visualization.violin import plot_violins
 from airbnb_analysis.config.settings import OUTPUT_DIR, ANALYSIS_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
 
@@ -30,7 +30,7 @@ def run_scenario3(df):
     # 3.1 房东规模 → 价格
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
     
-    df_scale = df[df['host_listings_count_binned'].notna()].copy()
+    df_scale = df[df['host_listings_count_binned'].notna()]
 
     sns.boxplot(data=df_scale, x='host_listings_count_binned', y=FEATURE_COLS['price'], 
                ax=axes[0], palette='mako', order=['1', '2-3', '4-5', '>5'])
@@ -38,8 +38,8 @@ def run_scenario3(df):
     axes[0].set_xlabel('Host Listings Count', fontsize=12)
     axes[0].set_ylabel('Price ($)', fontsize=12)
     
-    sns.violinplot(data=df_scale, x='host_listings_count_binned', y=FEATURE_COLS['price'], 
-                  ax=axes[1], palette='mako', inner='quartile', order=['1', '2-3', '4-5', '>5'])
+    plot_violins(axes[1], df_scale, x='host_listings_count_binned', y=FEATURE_COLS['price'], 
+                 palette='mako', inner='quartile', order=['1', '2-3', '4-5', '>5'])
     axes[1].set_title('Price Distribution by Host Scale', fontsize=14, fontweight='bold')
     axes[1].set_xlabel('Host Listings Count', fontsize=12)
     axes[1].set_ylabel('Price ($)', fontsize=12)
@@ -66,8 +66,8 @@ def run_scenario3(df):
     axes[0].set_xlabel('Host Listings Count', fontsize=12)
     axes[0].set_ylabel('Availability (days/year)', fontsize=12)
     
-    sns.violinplot(data=df_scale, x='host_listings_count_binned', y=FEATURE_COLS['availability'], 
-                  ax=axes[1], palette='rocket', inner='quartile', order=['1', '2-3', '4-5', '>5'])
+    plot_violins(axes[1], df_scale, x='host_listings_count_binned', y=FEATURE_COLS['availability'], 
+                 palette='rocket', inner='quartile', order=['1', '2-3', '4-5', '>5'])
     axes[1].set_title('Occupancy Stability by Host Scale', fontsize=14, fontweight='bold')
     axes[1].set_xlabel('Host Listings Count', fontsize=12)
     axes[1].set_ylabel('Availability (days/year)', fontsize=12)
@@ -89,7 +89,7 @@ def run_scenario3(df):
     fig, ax = plt.subplots(figsize=(12, 8))
     
     df_entire = df[(df[FEATURE_COLS['room_type']] == 'Entire home/apt') & 
-                   (df['host_listings_count_binned'].notna())].copy()
+                   (df['host_listings_count_binned'].notna())]
     
     sns.boxplot(data=df_entire, x='host_listings_count_binned', y=FEATURE_COLS['price'], 
                ax=ax, palette='viridis', order=['1', '2-3', '4-5', '>5'])
@@ -104,7 +104,7 @@ def run_scenario3(df):
     # 3.4 整租规模 vs 混合规模
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
     
-    df_entire_homes = df[df['entire_homes_binned'].notna()].copy()
+    df_entire_homes = df[df['entire_homes_binned'].notna()]
     
     sns.boxplot(data=df_entire_homes, x='entire_homes_binned', y=FEATURE_COLS['price'], 
                ax=axes[0], palette='plasma', order=['0', '1', '2+'])
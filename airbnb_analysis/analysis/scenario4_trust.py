@@ -7,7 +7,6 @@ import sys
 from pathlib import Path
 from scipy.stats import mannwhitneyu, kruskal, spearmanr, gaussian_kde
 from statsmodels.nonparametric.smoothers_lowess import lowess
-from sklearn.linear_model import LinearRegression
 import statsmodels.api as sm
 from statsmodels.formula.api import ols
 
@@ -15,8 +14,9 @@ BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
 from airbnb_analysis.models.statistical_tests import test_group_differences, test_privacy_premium, compute_correlation
-from airbnb_analysis.models.regression import fit_linear_regression, fit_interaction_model, fit_log_linear_model
+from airbnb_analysis.models.regression import fit_line, fit_interaction_model, fit_log_linear_model
 from airbnb_analysis.models.smoothing import fit_lowess, fit_kde
+from airbnb_analysis.data.adapter import flag_mask
 from airbnb_analysis.visualization.style import save_figure, set_legend_outside
 from airbnb_analysis.config.settings import OUTPUT_DIR, ANALYSIS_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
@@ -30,7 +30,7 @@ def run_scenario4(df):
         # 4.1 评分分布：阈值效应
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
     
-    df_rating = df[df[FEATURE_COLS['review_rating']].notna()].copy()
+    df_rating = df[df[FEATURE_COLS['review_rating']].notna()]
     
     # Histogram
     axes[0].hist(df_rating[FEATURE_COLS['review_rating']], bins=50, color='steelblue', alpha=0.7, edgecolor='black')
@@ -48,8 +48,9 @@ def run_scenario4(df):
     if len(rating_clean) > 10:
         kde = fit_kde(rating_clean)
         x_kde = np.linspace(rating_clean.min(), rating_clean.max(), 200)
-        axes[1].plot(x_kde, kde(x_kde), 'b-', linewidth=2, label='KDE')
-        axes[1].fill_between(x_kde, kde(x_kde), alpha=0.3)
+        density = kde(x_kde)
+        axes[1].plot(x_kde, density, 'b-', linewidth=2, label='KDE')
+        axes[1].fill_between(x_kde, density, alpha=0.3)
         axes[1].axvline(4.7, color='orange', linestyle='--', linewidth=2, label='Threshold: 4.7')
         axes[1].set_xlabel('Review Score Rating', fontsize=12)
         axes[1].set_ylabel('Density', fontsize=12)
@@ -68,7 +69,7 @@ def run_scenario4(df):
     # 4.2 评分 vs 入住率
     fig, ax = plt.subplots(figsize=(12, 8))
     
-    df_rating_occ = df[df[FEATURE_COLS['review_rating']].notna() & df[FEATURE_COLS['availability']].notna()].copy()
+    df_rating_occ = df[df[FEATURE_COLS['review_rating']].notna() & df[FEATURE_COLS['availability']].notna()]
     df_rating_occ = df_rating_occ[df_rating_occ[FEATURE_COLS['review_rating']].between(3, 5)]
     
     ax.scatter(df_rating_occ[FEATURE_COLS['review_rating']], df_rating_occ[FEATURE_COLS['availability']], 
@@ -83,13 +84,12 @@ def run_scenario4(df):
     ax.plot(x_lowess, y_lowess, 'r-', linewidth=3, label='LOWESS')
     
     # Linear regression
-    X = df_rating_occ[[FEATURE_COLS['review_rating']]].values
-    y = df_rating_occ[FEATURE_COLS['availability']].values
-    lr = fit_linear_regression(X, y)
+    lr = fit_line(df_rating_occ[FEATURE_COLS['review_rating']].values, df_rating_occ[FEATURE_COLS['availability']].values)
     x_line = np.linspace(df_rating_occ[FEATURE_COLS['review_rating']].min(), 
                          df_rating_occ[FEATURE_COLS['review_rating']].max(), 100)
-    y_line = lr.predict(x_line.reshape(-1, 1))
-    ax.plot(x_line, y_line, 'g--', linewidth=2, label=f'Linear: y={lr.coef_[0]:.1f}x+{lr.intercept_:.1f}')
+    y_line = lr.predict(x_line)
+    ax.plot(x_line, y_line, 'g--', linewidth=2, label=f'Linear: y={lr.slope:.1f}x+{lr.intercept:.1f}')
+    ax.fill_between(x_line, *lr.confidence_band(x_line), color='g', alpha=0.15)
     
     ax.set_xlabel('Review Score Rating', fontsize=12)
     ax.set_ylabel('Availability (days/year)', fontsize=12)
@@ -112,7 +112,8 @@ def run_scenario4(df):
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
     
     df_superhost = df[df[FEATURE_COLS['superhost']].notna()].copy()
-    df_superhost[FEATURE_COLS['superhost']] = df_superhost[FEATURE_COLS['superhost']].astype(str)
+    # 统一为't'/'f'标签（兼容布尔类型的superhost列）
+    df_superhost[FEATURE_COLS['superhost']] = np.where(flag_mask(df_superhost[FEATURE_COLS['superhost']]), 't', 'f')
     
     sns.boxplot(data=df_superhost, x=FEATURE_COLS['superhost'], y=FEATURE_COLS['availability'], 
                ax=axes[0], palette='Set1')
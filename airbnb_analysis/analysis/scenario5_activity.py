@@ -7,7 +7,6 @@ import sys
 from pathlib import Path
 from scipy.stats import mannwhitneyu, kruskal, spearmanr, gaussian_kde
 from statsmodels.nonparametric.smoothers_lowess import lowess
-from sklearn.linear_model import LinearRegression
 import statsmodels.api as sm
 from statsmodels.formula.api import ols
 
@@ -15,8 +14,9 @@ BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
 from airbnb_analysis.models.statistical_tests import test_group_differences, test_privacy_premium, compute_correlation
-from airbnb_analysis.models.regression import fit_linear_regression, fit_interaction_model, fit_log_linear_model
+from airbnb_analysis.models.regression import fit_line, fit_interaction_model, fit_log_linear_model
 from airbnb_analysis.models.smoothing import fit_lowess, fit_kde
+from airbnb_analysis.models.quantile_sketch import compute_quantiles
 from airbnb_analysis.visualization.style import save_figure, set_legend_outside
 from airbnb_analysis.config.settings import OUTPUT_DIR, ANALYSIS_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
@@ -30,9 +30,9 @@ def run_scenario5(df):
     # 5.1 历史评论 vs 近一年评论：脱钩
     fig, ax = plt.subplots(figsize=(12, 8))
     
-    df_reviews = df[df[FEATURE_COLS['reviews_total']].notna() & df[FEATURE_COLS['reviews_ltm']].notna()].copy()
-    df_reviews = df_reviews[df_reviews[FEATURE_COLS['reviews_total']] <= df_reviews[FEATURE_COLS['reviews_total']].quantile(0.95)]
-    df_reviews = df_reviews[df_reviews[FEATURE_COLS['reviews_ltm']] <= df_reviews[FEATURE_COLS['reviews_ltm']].quantile(0.95)]
+    df_reviews = df[df[FEATURE_COLS['reviews_total']].notna() & df[FEATURE_COLS['reviews_ltm']].notna()]
+    df_reviews = df_reviews[df_reviews[FEATURE_COLS['reviews_total']] <= compute_quantiles(df_reviews[FEATURE_COLS['reviews_total']], [0.95])[0]]
+    df_reviews = df_reviews[df_reviews[FEATURE_COLS['reviews_ltm']] <= compute_quantiles(df_reviews[FEATURE_COLS['reviews_ltm']], [0.95])[0]]
 
     ax.scatter(df_reviews[FEATURE_COLS['reviews_total']], df_reviews[FEATURE_COLS['reviews_ltm']], 
           alpha=0.3, s=20, color='steelblue')
@@ -74,10 +74,9 @@ def run_scenario5(df):
 # 5.2 近一年评论 vs 价格
     fig, ax = plt.subplots(figsize=(12, 8))
 
-    df_ltm_price = df[df[FEATURE_COLS['reviews_ltm']].notna() & df[FEATURE_COLS['price']].notna()].copy()
-    df_ltm_price = df_ltm_price[df_ltm_price[FEATURE_COLS['reviews_ltm']] <= df_ltm_price[FEATURE_COLS['reviews_ltm']].quantile(0.95)]
-    df_ltm_price = df_ltm_price[df_ltm_price[FEATURE_COLS['price']].between(df_ltm_price[FEATURE_COLS['price']].quantile(0.01), 
-                                                           df_ltm_price[FEATURE_COLS['price']].quantile(0.99))]
+    df_ltm_price = df[df[FEATURE_COLS['reviews_ltm']].notna() & df[FEATURE_COLS['price']].notna()]
+    df_ltm_price = df_ltm_price[df_ltm_price[FEATURE_COLS['reviews_ltm']] <= compute_quantiles(df_ltm_price[FEATURE_COLS['reviews_ltm']], [0.95])[0]]
+    df_ltm_price = df_ltm_price[df_ltm_price[FEATURE_COLS['price']].between(*compute_quantiles(df_ltm_price[FEATURE_COLS['price']], [0.01, 0.99]))].copy()
 
     ax.scatter(df_ltm_price[FEATURE_COLS['reviews_ltm']], df_ltm_price[FEATURE_COLS['price']], 
           alpha=0.3, s=20, color='steelblue')
@@ -91,15 +90,13 @@ def run_scenario5(df):
     ax.plot(x_lowess, y_lowess, 'r-', linewidth=3, label='LOWESS')
 
 # Log transformation regression
-    df_ltm_price['log_ltm'] = np.log1p(df_ltm_price[FEATURE_COLS['reviews_ltm']])
-    X = df_ltm_price[['log_ltm']].values
-    y = df_ltm_price[FEATURE_COLS['price']].values
-    lr = LinearRegression()
-    lr.fit(X, y)
+    df_ltm_price['log_ltm'] = np.log1p(df_ltm_price[FEATURE_COLS['reviews_ltm']].astype(float))
+    lr = fit_line(df_ltm_price['log_ltm'].values, df_ltm_price[FEATURE_COLS['price']].values)
     x_line = np.linspace(df_ltm_price[FEATURE_COLS['reviews_ltm']].min(), 
                      df_ltm_price[FEATURE_COLS['reviews_ltm']].max(), 100)
-    y_line = lr.predict(np.log1p(x_line).reshape(-1, 1))
+    y_line = lr.predict(np.log1p(x_line))
     ax.plot(x_line, y_line, 'g--', linewidth=2, label='Log-linear fit')
+    ax.fill_between(x_line, *lr.confidence_band(np.log1p(x_line)), color='g', alpha=0.15)
 
     ax.set_xlabel('Reviews Last 12 Months (LTM)', fontsize=12)
     ax.set_ylabel('Price ($)', fontsize=12)
@@ -118,10 +115,9 @@ def run_scenario5(df):
 # 5.3 历史评论 vs 价格（对照组）
     fig, ax = plt.subplots(figsize=(12, 8))
 
-    df_hist_price = df[df[FEATURE_COLS['reviews_total']].notna() & df[FEATURE_COLS['price']].notna()].copy()
-    df_hist_price = df_hist_price[df_hist_price[FEATURE_COLS['reviews_total']] <= df_hist_price[FEATURE_COLS['reviews_total']].quantile(0.95)]
-    df_hist_price = df_hist_price[df_hist_price[FEATURE_COLS['price']].between(df_hist_price[FEATURE_COLS['price']].quantile(0.01), 
-                                                               df_hist_price[FEATURE_COLS['price']].quantile(0.99))]
+    df_hist_price = df[df[FEATURE_COLS['reviews_total']].notna() & df[FEATURE_COLS['price']].notna()]
+    df_hist_price = df_hist_price[df_hist_price[FEATURE_COLS['reviews_total']] <= compute_quantiles(df_hist_price[FEATURE_COLS['reviews_total']], [0.95])[0]]
+    df_hist_price = df_hist_price[df_hist_price[FEATURE_COLS['price']].between(*compute_quantiles(df_hist_price[FEATURE_COLS['price']], [0.01, 0.99]))]
 
     ax.scatter(df_hist_price[FEATURE_COLS['reviews_total']], df_hist_price[FEATURE_COLS['price']], 
           alpha=0.3, s=20, color='lightcoral')
@@ -154,8 +150,8 @@ def run_scenario5(df):
 # 5.4 近一年评论 vs 入住率
     fig, ax = plt.subplots(figsize=(12, 8))
 
-    df_ltm_occ = df[df[FEATURE_COLS['reviews_ltm']].notna() & df[FEATURE_COLS['availability']].notna()].copy()
-    df_ltm_occ = df_ltm_occ[df_ltm_occ[FEATURE_COLS['reviews_ltm']] <= df_ltm_occ[FEATURE_COLS['reviews_ltm']].quantile(0.95)]
+    df_ltm_occ = df[df[FEATURE_COLS['reviews_ltm']].notna() & df[FEATURE_COLS['availability']].notna()]
+    df_ltm_occ = df_ltm_occ[df_ltm_occ[FEATURE_COLS['reviews_ltm']] <= compute_quantiles(df_ltm_occ[FEATURE_COLS['reviews_ltm']], [0.95])[0]]
 
     ax.scatter(df_ltm_occ[FEATURE_COLS['reviews_ltm']], df_ltm_occ[FEATURE_COLS['availability']], 
           alpha=0.3, s=20, color='steelblue')
@@ -169,14 +165,12 @@ def run_scenario5(df):
     ax.plot(x_lowess, y_lowess, 'r-', linewidth=3, label='LOWESS')
 
 # Linear regression
-    X = df_ltm_occ[[FEATURE_COLS['reviews_ltm']]].values
-    y = df_ltm_occ[FEATURE_COLS['availability']].values
-    lr = LinearRegression()
-    lr.fit(X, y)
+    lr = fit_line(df_ltm_occ[FEATURE_COLS['reviews_ltm']].values, df_ltm_occ[FEATURE_COLS['availability']].values)
     x_line = np.linspace(df_ltm_occ[FEATURE_COLS['reviews_ltm']].min(), 
                      df_ltm_occ[FEATURE_COLS['reviews_ltm']].max(), 100)
-    y_line = lr.predict(x_line.reshape(-1, 1))
-    ax.plot(x_line, y_line, 'g--', linewidth=2, label=f'Linear: y={lr.coef_[0]:.2f}x+{lr.intercept_:.1f}')
+    y_line = lr.predict(x_line)
+    ax.plot(x_line, y_line, 'g--', linewidth=2, label=f'Linear: y={lr.slope:.2f}x+{lr.intercept:.1f}')
+    ax.fill_between(x_line, *lr.confidence_band(x_line), color='g', alpha=0.15)
 
     ax.set_xlabel('Reviews Last 12 Months (LTM)', fontsize=12)
     ax.set_ylabel('Availability (days/year)', fontsize=12)
@@ -0,0 +1,44 @@
+"""房源数据类型模式定义"""
+
+# 列类型：
+#   'category' - 字符串列转换为分类类型（等值筛选变为整数编码比较）
+#   'bool'     - 't'/'f' 标志列转换为布尔类型（含缺失值时为可空布尔类型）
+#   'count'    - 计数列在全部为整数且无缺失时压缩为最小整数类型
+LISTING_SCHEMA = {
+    # 分类列
+    'room_type': 'category',
+    'neighbourhood_cleansed': 'category',
+    'neighbourhood_group_cleansed': 'category',
+    'host_listings_count_binned': 'category',
+    'entire_homes_binned': 'category',
+    'outlier_type': 'category',
+    # 布尔标志列
+    'host_is_superhost': 'bool',
+    # 计数列
+    'accommodates': 'count',
+    'availability_365': 'count',
+    'number_of_reviews': 'count',
+    'number_of_reviews_ltm': 'count',
+    'calculated_host_listings_count': 'count',
+    'calculated_host_listings_count_entire_homes': 'count',
+    'host_listings_count': 'count',
+    'host_total_listings_count': 'count',
+    # 清洗生成的0/1指示列
+    'has_reviews': 'count',
+    'accommodates_was_zero': 'count',
+    'has_accuracy_review': 'count',
+    'has_cleanliness_review': 'count',
+    'has_checkin_review': 'count',
+    'has_communication_review': 'count',
+    'has_location_review': 'count',
+    'has_value_review': 'count',
+    'has_rating_review': 'count',
+    'has_host_listings_count': 'count',
+    'has_host_total_listings_count': 'count',
+}
+
+# 布尔标志列的取值映射
+BOOL_VALUES = {
+    't': True,
+    'f': False,
+}
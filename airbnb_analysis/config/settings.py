@@ -6,9 +6,12 @@ BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data" / "raw"  # 数据文件在data/raw目录（所有城市数据都在这里）
 OUTPUT_DIR = BASE_DIR / "outputs" / "figures"
 MULTI_CITY_RESULTS_DIR = BASE_DIR / "outputs" / "multi_city_results"  # 多城市分析结果目录
+CACHE_DIR = BASE_DIR / "data" / "cache"  # 清洗后城市数据的列式缓存目录
+MODEL_DIR = BASE_DIR / "outputs" / "models"  # 模型工件目录
 
 # 数据文件
 DATA_FILE = "listings_2_cleaned 4.0.csv"
+DATA_CITY = "New York"  # DATA_FILE对应的城市（记录在模型工件中）
 
 # 图表配置
 FIGURE_CONFIG = {
@@ -42,4 +45,117 @@ MULTI_CITY_CONFIG = {
     'min_samples_per_city': 100,  # 每个城市最少样本数
     'significance_level': 0.05,  # 统计显著性水平
     'data_file_pattern': '*listings.csv.gz',  # 数据文件匹配模式
+    'projected_columns': True,  # 只读取分析和清洗所需的列（跳过描述、设施、URL等大文本列）
+    'typed_schema': True,  # 清洗后按config/schema.py转换为分类、布尔和紧凑整数类型
+    'load_workers': None,  # 并行加载城市数据的进程数（1为串行，None为CPU核数）
+    'streaming_min_file_size': None,  # 超过该字节数的文件使用分块流式清洗（None为不启用）
+}
+
+# 缓存配置
+CACHE_CONFIG = {
+    'enabled': True,  # 是否启用清洗结果缓存
+    'format': 'feather',  # 缓存格式: 'feather'（支持内存映射零拷贝读取）或 'parquet'
+    'hash_block_size': 1 << 20,  # 计算文件内容哈希时每次读取的字节数
+}
+
+# 流式清洗配置
+STREAMING_CONFIG = {
+    'chunksize': 200_000,  # 每个分块的行数
+    'output_dir': CACHE_DIR / "streaming",  # 流式清洗结果输出目录
+}
+
+# 批量评分配置
+SCORING_CONFIG = {
+    'artifact_file': 'price_model.json',  # 综合模型工件文件名（位于MODEL_DIR）
+    'chunksize': 100_000,  # 批量评分时每个分块的行数（内存只与分块大小有关）
+}
+
+# 空间索引配置
+SPATIAL_CONFIG = {
+    'leafsize': 16,  # KD树叶节点大小
+    'comparable_k': 50,  # 可比房源价格中位数使用的近邻数
+    'comparable_report': False,  # 场景2是否输出可比房源价格分析（对每个房源查询近邻，较耗时）
+    'comparable_radius_km': 1.0,  # 可比房源价格分析中统计周边同类房源数的半径（公里）
+    'cache': True,  # 是否将各城市的空间索引缓存到磁盘
+    'cache_dir': CACHE_DIR / "spatial",  # 空间索引缓存目录
+}
+
+# 六边形网格聚合配置（场景2的空间价格热力图）
+HEXBIN_CONFIG = {
+    'gridsize': 30,  # 横向六边形数（纵向为其1/√3）
+    'min_count': 1,  # 单元最少样本数，不足的单元不显示
+}
+
+# 空间连接配置（用街区多边形为缺少neighbourhood_group的城市补充区域）
+SPATIAL_JOIN_CONFIG = {
+    'enabled': True,
+    'polygon_file_suffix': 'neighbourhoods.geojson',  # 多边形文件名（城市名 + 后缀，与房源文件同目录）
+    # 区域名称属性（按顺序取第一个有值的）。不含neighbourhood：街区比neighbourhood_group细得多，
+    # 混入后区域比较的含义在城市间不一致
+    'region_properties': ['neighbourhood_group'],
+    'grid_size': 128,  # 网格加速的每边单元数
+    'block_size': 4_000_000,  # 每块计算的(点, 边)对数上限
+}
+
+# 分位数草图配置
+QUANTILE_CONFIG = {
+    'sketch_k': 200,  # KLL草图参数，排名误差约为O(1/k)
+    'sketch_min_rows': None,  # 样本量达到该值时用草图代替精确分位数（None为始终精确计算）
+    'streaming_sketch': False,  # 流式清洗时价格分位数使用草图代替按值计数直方图
+}
+
+# 数据读取配置
+READ_CONFIG = {
+    'engine': 'pyarrow',  # CSV解析引擎: 'pyarrow'（多线程）或 'pandas'；未安装pyarrow时自动使用pandas
+    'use_threads': True,  # pyarrow是否多线程解析
+    'block_size': 1 << 24,  # pyarrow每个解析块的字节数
+}
+
+# 价格解析配置
+PRICE_CONFIG = {
+    'decimal_separator': 'auto',  # 小数点: 'auto'（逐值识别"1,234.00"与"1.234,00"）、'.' 或 ','
+    'city_decimal_separators': {},  # 按城市指定小数点，如 {'Antwerp': ','}
+}
+
+# 预处理流水线配置
+PIPELINE_CONFIG = {
+    'copy_free': True,  # 清洗/预处理使用浅拷贝（写时复制，只有被修改的列才真正复制）；False时恢复整表深拷贝
+}
+
+# 自助法置信区间配置
+BOOTSTRAP_CONFIG = {
+    'enabled': False,  # 多城市分析时为各场景效应量计算置信区间（可选，开启后每个城市约11个效应量×n_resamples次重抽样）
+    'n_resamples': 2000,  # 重抽样次数
+    'block_size': 100,  # 每块（一次向量化计算）的重抽样次数
+    'confidence_level': 0.95,  # 置信水平（百分位法）
+    'seed': 42,  # 随机数种子（结果与进程数无关）
+    'workers': None,  # 进程数（1为串行，None为CPU核数）
+}
+
+# 置换检验配置
+PERMUTATION_CONFIG = {
+    'method': 'asymptotic',  # p值计算方式: 'asymptotic'（渐近分布）、'permutation'（置换检验）或 'auto'
+    'auto_max_samples': 500,  # 'auto'时样本量不超过该值（或最小组不超过auto_min_group）使用置换检验
+    'auto_min_group': 20,
+    'block_size': 2000,  # 每块（一次向量化计算）的置换次数
+    'max_block_cells': 4_000_000,  # 每块置换矩阵（置换次数×样本量）的元素数上限
+    'min_permutations': 2000,  # 提前停止前至少完成的置换次数
+    'max_permutations': 200_000,  # 置换次数上限
+    'time_budget': 5.0,  # 单个检验的时间预算（秒），None为不限
+    'alpha': 0.05,  # 显著性水平：p值置信区间完全位于其一侧时提前停止
+    'confidence_level': 0.99,  # p值（Clopper-Pearson）置信区间的置信水平
+    'seed': 0,  # 随机数种子
+}
+
+# 平滑配置
+SMOOTHING_CONFIG = {
+    'lowess_method': 'binned',  # LOWESS计算方式: 'exact'（statsmodels逐点）、'binned'（相同x合并为加权箱）或 'grid'
+    'lowess_iterations': 3,  # 稳健化迭代次数（与statsmodels默认一致）
+    'lowess_delta_frac': 0.01,  # 相距小于 该比例×x范围 的点不单独拟合，线性插值（0为每个不同x值都拟合）
+    'lowess_grid_size': 200,  # 'grid'时拟合的等距网格点数
+    'lowess_grid_min_bins': 20_000,  # 'binned'时不同x值超过该数量改用网格
+    'lowess_tolerance': None,  # 设为数值时与精确结果比较，偏差（相对y范围）超过该值时警告
+    'kde_method': 'binned',  # 核密度估计方式: 'binned'（线性分箱+FFT卷积）或 'exact'（scipy gaussian_kde）
+    'kde_grid_size': 1024,  # 分箱KDE的网格点数
+    'kde_cut': 4,  # 分箱KDE网格在数据范围外延伸的带宽倍数
 }
@@ -1,10 +1,14 @@
 """数据格式适配模块 - 处理不同城市数据格式差异"""
 import pandas as pd
 import numpy as np
+from functools import lru_cache
 from pathlib import Path
-import gzip
 
 from airbnb_analysis.config.constants import FEATURE_COLS
+from airbnb_analysis.config.schema import LISTING_SCHEMA, BOOL_VALUES
+from airbnb_analysis.data.cleaner import CLEANER_COLUMNS
+from airbnb_analysis.data.reader import read_header, read_listings, detect_format
+from airbnb_analysis.data.frame_view import shallow_copy
 
 # 不同城市可能的列名变体
 COLUMN_MAPPINGS = {
@@ -70,6 +74,13 @@ COLUMN_MAPPINGS = {
     'longitude': ['longitude', 'Longitude', 'LONGITUDE'],
 }
 
+# 列投影读取时额外保留的列（用于追溯房源）
+PROJECTED_EXTRA_COLUMNS = ['id']
+
+# 本身也被清洗或分析使用的列名：作为其他标准列的变体匹配到时只建别名，不重命名
+# （如缺少calculated_host_listings_count时匹配到的host_listings_count仍需保留原名）
+RESERVED_COLUMNS = set(COLUMN_MAPPINGS) | set(CLEANER_COLUMNS) | set(PROJECTED_EXTRA_COLUMNS)
+
 def find_column(df, possible_names):
     """在DataFrame中查找列名（支持多种变体）"""
     for name in possible_names:
@@ -77,46 +88,114 @@ def find_column(df, possible_names):
             return name
     return None
 
-def standardize_columns(df):
-    """标准化列名，将不同变体映射到标准列名"""
-    df = df.copy()
+@lru_cache(maxsize=None)
+def resolve_column_mapping(header):
+    """解析表头到标准列名的映射（按表头签名缓存，相同表头的文件只解析一次）"""
+    header_set = set(header)
     
+    renames = {}
+    aliases = {}
     standardized = {}
     for standard_name, possible_names in COLUMN_MAPPINGS.items():
-        found_col = find_column(df, possible_names)
-        if found_col:
-            if found_col != standard_name:
-                df[standard_name] = df[found_col]
-            standardized[standard_name] = True
+        found_col = next((name for name in possible_names if name in header_set), None)
+        standardized[standard_name] = found_col is not None
+        if found_col is None or found_col == standard_name:
+            continue
+        if found_col in renames:
+            # 同一变体已重命名为其他标准列
+            aliases[standard_name] = renames[found_col]
+        elif found_col in RESERVED_COLUMNS:
+            aliases[standard_name] = found_col
         else:
-            standardized[standard_name] = False
+            renames[found_col] = standard_name
+    
+    return renames, aliases, standardized
+
+def standardize_columns(df, inplace=False):
+    """标准化列名，将不同变体重命名为标准列名"""
+    renames, aliases, standardized = resolve_column_mapping(tuple(df.columns))
+    
+    if not inplace:
+        df = shallow_copy(df)
+    if renames:
+        df.rename(columns=renames, inplace=True)
+    for standard_name, source_col in aliases.items():
+        # 写时复制下别名列与原列共享数据
+        df[standard_name] = df[source_col]
+    
+    return df, dict(standardized)
+
+def flag_mask(series, value=True):
+    """布尔标志列的比较掩码（兼容布尔类型和't'/'f'字符串）"""
+    if pd.api.types.is_bool_dtype(series):
+        return (series == value).fillna(False).astype(bool)
+    flag = [k for k, v in BOOL_VALUES.items() if v == value][0]
+    return series == flag
+
+def apply_listing_schema(df, schema=None):
+    """按照LISTING_SCHEMA转换列类型（分类、布尔、紧凑整数）"""
+    if schema is None:
+        schema = LISTING_SCHEMA
     
-    return df, standardized
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        
+        if kind == 'category':
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+        elif kind == 'bool':
+            if pd.api.types.is_bool_dtype(series):
+                continue
+            mapped = series.map(BOOL_VALUES)
+            if mapped.isna().any():
+                df[col] = mapped.astype('boolean')
+            else:
+                df[col] = mapped.astype(bool)
+        elif kind == 'count':
+            if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                continue
+            # 含缺失值或小数（如中位数填充产生的x.5）时保持原类型
+            if series.isna().any() or not (series == np.floor(series)).all():
+                continue
+            df[col] = pd.to_numeric(series.astype(np.int64), downcast='integer')
+    
+    return df
+
+def resolve_projected_columns(header):
+    """根据COLUMN_MAPPINGS和清洗所需列，从表头中解析出需要读取的列"""
+    header_set = set(header)
+    needed = set(name for name in PROJECTED_EXTRA_COLUMNS + CLEANER_COLUMNS if name in header_set)
+    
+    for possible_names in COLUMN_MAPPINGS.values():
+        # 与standardize_columns一致：只取第一个匹配的变体
+        for name in possible_names:
+            if name in header_set:
+                needed.add(name)
+                break
+    
+    # 保持文件中的列顺序
+    return [col for col in header if col in needed]
 
-def load_city_data(filepath):
-    """加载城市数据（支持gzip压缩）"""
+def load_city_data(filepath, projected=False):
+    """加载城市数据（自动识别csv/gzip/zstd/Parquet，projected=True时只读取所需列）"""
     filepath = Path(filepath)
     
     if not filepath.exists():
         raise FileNotFoundError(f"数据文件不存在: {filepath}")
     
-    # 如果是gzip文件
-    if filepath.suffix == '.gz' or str(filepath).endswith('.csv.gz'):
-        print(f"  读取gzip压缩文件: {filepath}")
-        with gzip.open(filepath, 'rt', encoding='utf-8', errors='ignore') as f:
-            df = pd.read_csv(f, low_memory=False)
-    else:
-        print(f"  读取CSV文件: {filepath}")
-        df = pd.read_csv(filepath, low_memory=False)
+    usecols = resolve_projected_columns(read_header(filepath)) if projected else None
     
-    return df
+    print(f"  读取{detect_format(filepath)}格式文件: {filepath}")
+    return read_listings(filepath, usecols=usecols)
 
-def adapt_city_data(filepath, city_name=None):
+def adapt_city_data(filepath, city_name=None, projected=False):
     """适配城市数据格式"""
     print(f"\n适配数据格式: {city_name or filepath}")
     
     # 加载数据
-    df = load_city_data(filepath)
+    df = load_city_data(filepath, projected=projected)
     print(f"  原始数据: {len(df)} 行, {len(df.columns)} 列")
     
     # 标准化列名
@@ -179,10 +258,10 @@ def check_data_quality(df, city_name=None):
     
     return quality_report
 
-def process_city_data(filepath, city_name=None):
+def process_city_data(filepath, city_name=None, projected=False):
     """完整处理城市数据：加载、适配、质量检查"""
     # 适配数据格式
-    df = adapt_city_data(filepath, city_name)
+    df = adapt_city_data(filepath, city_name, projected=projected)
     
     # 检查数据质量
     quality_report = check_data_quality(df, city_name)
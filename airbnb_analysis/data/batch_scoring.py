@@ -0,0 +1,48 @@
+"""批量价格评分模块 - 分块流式读取房源文件，用模型工件预测价格并增量写出"""
+import gzip
+from pathlib import Path
+
+from airbnb_analysis.config.settings import MODEL_DIR, SCORING_CONFIG
+from airbnb_analysis.data.streaming_cleaner import iter_city_chunks
+from airbnb_analysis.models.price_model import load_model_artifact, check_artifact_city, score_frame
+
+def _open_output(output_path):
+    """打开评分结果文件（.gz后缀时gzip压缩）"""
+    if output_path.suffix == '.gz':
+        return gzip.open(output_path, 'wt', encoding='utf-8', newline='')
+    return open(output_path, 'w', encoding='utf-8', newline='')
+
+def score_listings_file(filepaths, output_path, artifact_path=None, chunksize=None, city_name=None):
+    """逐块读取一个或多个房源文件（csv/csv.gz/zstd/Parquet），预测价格后写入CSV（或CSV.GZ）
+
+    每块独立完成填充、特征工程和预测后立即写出，内存只与分块大小有关，与文件行数无关。
+    city_name为输入数据的城市，与工件的训练城市不一致时打印警告。
+    返回(已评分行数, 无法预测的行数)。
+    """
+    if artifact_path is None:
+        artifact_path = MODEL_DIR / SCORING_CONFIG['artifact_file']
+    if chunksize is None:
+        chunksize = SCORING_CONFIG['chunksize']
+    artifact = load_model_artifact(artifact_path)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    print(f"\n批量评分: {output_path.name}")
+    print(f"  模型工件: {artifact_path} (训练城市 {artifact.get('city_name') or '未记录'}, "
+          f"样本量 {artifact['nobs']}, R² {artifact['rsquared']:.4f})")
+    check_artifact_city(artifact, city_name)
+
+    n_scored = 0
+    n_missing = 0
+    with _open_output(output_path) as f:
+        first = True
+        for chunk in iter_city_chunks(filepaths, chunksize, projected=True):
+            scores = score_frame(chunk, artifact)
+            scores.to_csv(f, header=first, index=False)
+            first = False
+            n_scored += len(scores)
+            n_missing += int(scores['predicted_price'].isna().sum())
+
+    print(f"  已评分: {n_scored} 行（特征缺失无法预测: {n_missing} 行）")
+    print(f"  已写出: {output_path}")
+    return n_scored, n_missing
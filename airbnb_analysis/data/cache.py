@@ -0,0 +1,198 @@
+"""清洗结果缓存模块 - 以列式二进制格式缓存清洗后的城市数据"""
+import hashlib
+import inspect
+import json
+from pathlib import Path
+
+from airbnb_analysis.config.settings import CACHE_DIR, CACHE_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CACHE_SUFFIXES = {
+    'feather': '.feather',
+    'parquet': '.parquet',
+}
+
+def compute_content_hash(filepath, block_size=None):
+    """按块计算文件内容的SHA-256哈希"""
+    if block_size is None:
+        block_size = CACHE_CONFIG['hash_block_size']
+
+    hasher = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def compute_file_fingerprint(filepath):
+    """计算源文件指纹（文件大小、修改时间、内容哈希）"""
+    filepath = Path(filepath)
+    stat = filepath.stat()
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'content_hash': compute_content_hash(filepath),
+    }
+
+# 影响清洗结果的配置项（配置名: 计入哈希的键，None为整个配置）
+# 并行度、解析块大小、缓存格式等只影响速度或存储的配置不计入，修改它们不会使缓存失效
+HASHED_CONFIG = {
+    'LISTING_SCHEMA': None,
+    'BOOL_VALUES': None,
+    'FEATURE_COLS': None,
+    'BINNING_CONFIG': None,
+    'PRICE_CONFIG': None,
+    'MULTI_CITY_CONFIG': ['projected_columns', 'typed_schema', 'streaming_min_file_size'],
+    'QUANTILE_CONFIG': ['sketch_k', 'sketch_min_rows', 'streaming_sketch'],
+    'STREAMING_CONFIG': ['chunksize'],  # 流式清洗使用草图时分位数与分块方式有关
+}
+
+def _cleaning_modules(roots):
+    """从清洗入口模块出发，沿模块级导入（模块或其中定义的函数、类）收集项目内的全部依赖模块"""
+    seen = {}
+    stack = list(roots)
+    while stack:
+        module = stack.pop()
+        if module.__name__ in seen:
+            continue
+        seen[module.__name__] = module
+        for value in vars(module).values():
+            dependency = value if inspect.ismodule(value) else inspect.getmodule(value)
+            if dependency is None or dependency.__name__ in seen:
+                continue
+            # 配置模块只按HASHED_CONFIG中的配置项计入哈希
+            if dependency.__name__.startswith('airbnb_analysis.') and \
+                    not dependency.__name__.startswith('airbnb_analysis.config'):
+                stack.append(dependency)
+    return [seen[name] for name in sorted(seen)]
+
+def _hashed_config():
+    """按HASHED_CONFIG取出影响清洗结果的配置值"""
+    from airbnb_analysis.config import constants, schema, settings
+
+    config = {}
+    for name, keys in HASHED_CONFIG.items():
+        for config_module in (settings, schema, constants):
+            if hasattr(config_module, name):
+                value = getattr(config_module, name)
+                config[name] = value if keys is None else {key: value[key] for key in keys}
+                break
+        else:
+            raise KeyError(f"未找到配置项: {name}")
+    return config
+
+def compute_config_hash():
+    """计算清洗配置哈希（读取/清洗代码及其依赖模块的源代码，以及影响清洗结果的配置项）
+
+    依赖模块由清洗入口的导入关系推导，新增的清洗依赖模块会自动计入；
+    新增影响清洗结果的配置项时需加入HASHED_CONFIG。
+    """
+    # 延迟导入，避免与加载模块循环依赖
+    from airbnb_analysis.data import (
+        adapter, cleaner, reader, price_parser, streaming_cleaner, multi_city_loader,
+    )
+
+    modules = _cleaning_modules((adapter, cleaner, reader, price_parser, streaming_cleaner, multi_city_loader))
+
+    hasher = hashlib.sha256()
+    for name, value in sorted(_hashed_config().items()):
+        hasher.update(name.encode('utf-8'))
+        hasher.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+    # 读取或清洗逻辑变更后缓存自动失效
+    for module in modules:
+        hasher.update(module.__name__.encode('utf-8'))
+        hasher.update(inspect.getsource(module).encode('utf-8'))
+    return hasher.hexdigest()
+
+def compute_cache_key(filepath, config_hash=None):
+    """由源文件指纹和清洗配置哈希生成缓存键"""
+    if config_hash is None:
+        config_hash = compute_config_hash()
+
+    fingerprint = compute_file_fingerprint(filepath)
+    fingerprint['config_hash'] = config_hash
+    key = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
+    return key, fingerprint
+
+def _safe_city_name(city_name):
+    """将城市名称转换为安全的文件名前缀"""
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in city_name)
+
+def get_cache_path(city_name, key, cache_dir=None, fmt=None):
+    """获取缓存文件路径"""
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+    if fmt is None:
+        fmt = CACHE_CONFIG['format']
+    return Path(cache_dir) / f"{_safe_city_name(city_name)}_{key[:16]}{CACHE_SUFFIXES[fmt]}"
+
+def load_cached_city(city_name, key, cache_dir=None, fmt=None):
+    """读取缓存的清洗结果，未命中时返回None"""
+    if not HAS_PYARROW:
+        return None
+    if fmt is None:
+        fmt = CACHE_CONFIG['format']
+
+    cache_path = get_cache_path(city_name, key, cache_dir, fmt)
+    if not cache_path.exists():
+        return None
+
+    try:
+        if fmt == 'feather':
+            # 未压缩的Arrow IPC文件通过内存映射读取，数值列零拷贝
+            table = feather.read_table(cache_path, memory_map=True)
+        else:
+            table = pq.read_table(cache_path, memory_map=True)
+        return table.to_pandas()
+    except Exception as e:
+        print(f"  ⚠ 缓存读取失败，将重新清洗: {e}")
+        return None
+
+def save_cached_city(df, city_name, key, fingerprint=None, cache_dir=None, fmt=None):
+    """将清洗结果写入缓存，并删除同一城市的旧缓存"""
+    if not HAS_PYARROW:
+        return None
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+    if fmt is None:
+        fmt = CACHE_CONFIG['format']
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = get_cache_path(city_name, key, cache_dir, fmt)
+
+    # 删除同一城市的过期缓存
+    prefix = f"{_safe_city_name(city_name)}_"
+    for old_file in cache_dir.glob(f"{prefix}*"):
+        stem = old_file.name[len(prefix):].split('.')[0]
+        if len(stem) == 16 and old_file != cache_path:
+            old_file.unlink()
+
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        # 保留索引，使缓存命中与重新清洗得到的结果一致
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        if fmt == 'feather':
+            # 不压缩，保证读取时可以内存映射
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+        else:
+            pq.write_table(table, tmp_path)
+        tmp_path.replace(cache_path)
+    except Exception as e:
+        print(f"  ⚠ 缓存写入失败: {e}")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return None
+
+    if fingerprint is not None:
+        meta_path = cache_path.with_name(cache_path.name + '.json')
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(fingerprint, f, indent=2)
+
+    return cache_path
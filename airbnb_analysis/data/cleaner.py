@@ -3,76 +3,102 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 
-def clean_city_data(df, city_name=None):
-    """按照notebook的逻辑清洗单个城市数据"""
-    print(f"\n清洗数据: {city_name or 'Unknown'}")
-    print(f"  原始数据: {len(df)} 行")
+from airbnb_analysis.models.quantile_sketch import compute_quantiles
+from airbnb_analysis.data.price_parser import parse_prices, resolve_decimal_separator
+from airbnb_analysis.data.frame_view import shallow_copy
+from airbnb_analysis.data.imputation import compute_median_fills, fill_by_group, fill_columns
+
+# 评分列（0视为缺失，用中位数填充）
+REVIEW_SCORE_COLS = [
+    'review_scores_accuracy', 'review_scores_cleanliness', 'review_scores_checkin',
+    'review_scores_communication', 'review_scores_location', 'review_scores_value',
+    'review_scores_rating'
+]
+
+# 房东房源数列（0视为缺失，用中位数填充）
+HOST_COUNT_COLS = ['host_listings_count', 'host_total_listings_count']
+
+# 清洗过程中读取的全部原始列（用于列投影读取）
+CLEANER_COLUMNS = [
+    'price', 'accommodates', 'room_type', 'number_of_reviews', 'reviews_per_month',
+    'calculated_host_listings_count', 'calculated_host_listings_count_entire_homes',
+] + REVIEW_SCORE_COLS + HOST_COUNT_COLS
+
+def parse_price(series, decimal_separator=None):
+    """将价格字符串（如"$1,234.00"、"1.234,00 €"）转换为数值"""
+    return parse_prices(series, decimal_separator)[0]
+
+def compute_cleaning_stats(df):
+    """计算清洗规则所需的全局统计量（中位数、价格分位数，price列需已转换为数值）"""
+    stats = {}
     
-    df = df.copy()
-    initial_count = len(df)
+    # accommodates按房型的中位数与评分、房东房源数的全局中位数一次算出（0视为缺失）
+    accommodates_medians, stats['fill_medians'] = compute_median_fills(
+        df, REVIEW_SCORE_COLS + HOST_COUNT_COLS, 'accommodates', 'room_type'
+    )
+    if 'accommodates' in df.columns:
+        if 'room_type' in df.columns:
+            stats['accommodates_median_by_room_type'] = accommodates_medians
+        else:
+            stats['accommodates_median'] = accommodates_medians
     
-    # 1. 处理reviews_per_month缺失值
-    if 'reviews_per_month' in df.columns:
-        df['reviews_per_month'] = df['reviews_per_month'].fillna(0)
-        df['has_reviews'] = (df['number_of_reviews'] > 0).astype(int)
+    # 价格分位数（仅基于有效价格）
+    if 'price' in df.columns:
+        price = df['price']
+        price = price[price.notna() & (price > 0)]
+        # 三个分位数共用一次排序（样本量大时使用分位数草图）
+        stats['price_q1'], stats['price_q3'], stats['price_p999'] = compute_quantiles(
+            price, [0.25, 0.75, 0.999]
+        )
     
-    # 2. 处理accommodates为0
+    return stats
+
+def apply_imputation_rules(df, stats):
+    """用统计量中的中位数填充accommodates、评分和房东房源数（不删除任何行，批量评分时复用）"""
+    # 2. 处理accommodates为0（按房型编码查表填充中位数）
     if 'accommodates' in df.columns:
-        df.loc[df['accommodates'] == 0, 'accommodates'] = np.nan
         if 'room_type' in df.columns:
-            df['accommodates'] = df.groupby('room_type')['accommodates'].transform(
-                lambda x: x.fillna(x.median())
+            df['accommodates'] = fill_by_group(
+                df, 'accommodates', 'room_type', stats['accommodates_median_by_room_type']
             )
         else:
-            df['accommodates'] = df['accommodates'].fillna(df['accommodates'].median())
+            df['accommodates'] = df['accommodates'].replace(0, np.nan).fillna(stats['accommodates_median'])
         df['accommodates_was_zero'] = df['accommodates'].isna().astype(int)
     
-    # 3. 处理review_scores为0（替换为NaN，然后用中位数填充）
-    review_cols = [
-        'review_scores_accuracy', 'review_scores_cleanliness', 'review_scores_checkin',
-        'review_scores_communication', 'review_scores_location', 'review_scores_value',
-        'review_scores_rating'
+    # 3-4. review_scores和host_listings_count为0时替换为NaN，生成has_*指示列后用中位数填充（各列一次完成）
+    fill_cols = [
+        col for col in REVIEW_SCORE_COLS + HOST_COUNT_COLS
+        if col in df.columns and col in stats['fill_medians']
+    ]
+    indicator_names = [
+        f'has_{col.replace("review_scores_", "")}_review' if col in REVIEW_SCORE_COLS else f'has_{col}'
+        for col in fill_cols
     ]
+    df = fill_columns(df, fill_cols, stats['fill_medians'], indicator_names)
     
-    for col in review_cols:
-        if col in df.columns:
-            df[col] = df[col].replace(0, np.nan)
-            has_col = f'has_{col.replace("review_scores_", "")}_review'
-            df[has_col] = df[col].notna().astype(int)
-            median_val = df[col].median()
-            df[col] = df[col].fillna(median_val)
-    
-    # 4. 处理host_listings_count为0
-    if 'host_listings_count' in df.columns:
-        df['host_listings_count'] = df['host_listings_count'].replace(0, np.nan)
-        df['has_host_listings_count'] = df['host_listings_count'].notna().astype(int)
-        df['host_listings_count'] = df['host_listings_count'].fillna(df['host_listings_count'].median())
-    
-    if 'host_total_listings_count' in df.columns:
-        df['host_total_listings_count'] = df['host_total_listings_count'].replace(0, np.nan)
-        df['has_host_total_listings_count'] = df['host_total_listings_count'].notna().astype(int)
-        df['host_total_listings_count'] = df['host_total_listings_count'].fillna(df['host_total_listings_count'].median())
+    return df
+
+def apply_cleaning_rules(df, stats):
+    """使用给定统计量对数据应用清洗规则（会直接修改传入的DataFrame）"""
+    # 1. 处理reviews_per_month缺失值
+    if 'reviews_per_month' in df.columns:
+        df['reviews_per_month'] = df['reviews_per_month'].fillna(0)
+        df['has_reviews'] = (df['number_of_reviews'] > 0).astype(int)
+    
+    # 2-4. 用统计量中的中位数填充accommodates、评分和房东房源数
+    df = apply_imputation_rules(df, stats)
     
     # 5. 处理价格（按照notebook的逻辑）
     if 'price' in df.columns:
-        # 转换为字符串，移除$和逗号
-        df['price'] = (
-            df['price']
-            .astype(str)
-            .str.replace(r'[\$,]', '', regex=True)  # 使用regex移除$和逗号
-            .str.strip()
-        )
-        
-        # 转成数值
-        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+        df['price'] = parse_price(df['price'])
         
         # 丢掉缺失和不合理值
         df = df[df['price'].notna()]
         df = df[df['price'] > 0]
         
         # 价格异常值处理（IQR方法）
-        Q1 = df['price'].quantile(0.25)
-        Q3 = df['price'].quantile(0.75)
+        Q1 = stats['price_q1']
+        Q3 = stats['price_q3']
         IQR = Q3 - Q1
         lower_bound = Q1 - 1.5 * IQR
         upper_bound = Q3 + 1.5 * IQR
@@ -86,7 +112,7 @@ def clean_city_data(df, city_name=None):
         df['outlier_type'] = 'normal'
         df.loc[df['price'] <= 0, 'outlier_type'] = 'impossible'
         
-        p999 = df['price'].quantile(0.999)
+        p999 = stats['price_p999']
         df.loc[
             (df['price'] > p999) &
             (df['price'] % 10 == 0),
@@ -129,6 +155,23 @@ def clean_city_data(df, city_name=None):
             include_lowest=True
         )
     
+    return df
+
+def clean_city_data(df, city_name=None):
+    """按照notebook的逻辑清洗单个城市数据"""
+    print(f"\n清洗数据: {city_name or 'Unknown'}")
+    print(f"  原始数据: {len(df)} 行")
+    
+    df = shallow_copy(df)
+    initial_count = len(df)
+    
+    if 'price' in df.columns:
+        df['price'], failures = parse_prices(df['price'], resolve_decimal_separator(city_name))
+        print(f"  价格解析失败: {failures} 行")
+    
+    stats = compute_cleaning_stats(df)
+    df = apply_cleaning_rules(df, stats)
+    
     filtered_count = len(df)
     if initial_count > 0:
         print(f"  清洗后: {filtered_count} 行 (保留 {filtered_count/initial_count*100:.1f}%)")
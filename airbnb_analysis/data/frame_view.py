@@ -0,0 +1,74 @@
+"""数据视图模块 - 基于写时复制和行掩码的免拷贝子集"""
+import numpy as np
+import pandas as pd
+
+from airbnb_analysis.config.settings import PIPELINE_CONFIG
+
+PANDAS_MAJOR = int(pd.__version__.split('.')[0])
+
+def enable_copy_on_write():
+    """开启pandas写时复制（全局选项，由程序入口调用；pandas 3起始终启用，pandas 1.5/2.x需显式开启）"""
+    if PIPELINE_CONFIG['copy_free'] and PANDAS_MAJOR < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+def copy_on_write_enabled():
+    """当前是否启用了写时复制"""
+    return PANDAS_MAJOR >= 3 or pd.get_option('mode.copy_on_write') is True
+
+def shallow_copy(df):
+    """复制DataFrame：写时复制下只复制列的引用，某列被修改时才真正复制该列
+
+    未启用写时复制时（如作为库导入、未经程序入口）浅拷贝会被原地修改波及，退回深拷贝。
+    """
+    return df.copy(deep=not (PIPELINE_CONFIG['copy_free'] and copy_on_write_enabled()))
+
+def _to_mask(mask, length):
+    """将布尔条件转换为numpy布尔数组（缺失视为False）"""
+    if isinstance(mask, pd.Series):
+        mask = mask.fillna(False).to_numpy(dtype=bool)
+    mask = np.asarray(mask, dtype=bool)
+    if len(mask) != length:
+        raise ValueError(f"掩码长度 {len(mask)} 与数据行数 {length} 不一致")
+    return mask
+
+class FrameView:
+    """基础数据框上的惰性子集：只保存行掩码，取列时才提取对应行
+
+    多个场景共用同一个不可变的基础数据框，筛选条件只组合掩码；
+    取列时只复制被访问的列，需要完整DataFrame时用to_frame()指定所需列。
+    """
+
+    def __init__(self, base, mask=None):
+        self.base = base
+        self.mask = None if mask is None else _to_mask(mask, len(base))
+
+    def __len__(self):
+        return len(self.base) if self.mask is None else int(self.mask.sum())
+
+    @property
+    def columns(self):
+        return self.base.columns
+
+    def filter(self, mask):
+        """叠加一个按基础数据框行对齐的筛选条件，返回新视图"""
+        mask = _to_mask(mask, len(self.base))
+        if self.mask is not None:
+            mask = mask & self.mask
+        return FrameView(self.base, mask)
+
+    def notna(self, *columns):
+        """筛选指定列均不缺失的行"""
+        mask = np.ones(len(self.base), dtype=bool)
+        for col in columns:
+            mask &= self.base[col].notna().to_numpy()
+        return self.filter(mask)
+
+    def __getitem__(self, column):
+        """取出视图中的一列（只复制这一列）"""
+        series = self.base[column]
+        return series if self.mask is None else series[self.mask]
+
+    def to_frame(self, columns=None):
+        """物化为DataFrame（只包含指定列）"""
+        frame = self.base if columns is None else self.base[list(columns)]
+        return frame if self.mask is None else frame[self.mask]
@@ -0,0 +1,94 @@
+"""缺失值填充模块 - 基于整数分组编码的向量化中位数填充"""
+import numpy as np
+import pandas as pd
+
+def segment_medians(values, segments, n_segments):
+    """一次排序计算每个分段的中位数（忽略NaN和负编码，空分段为NaN）"""
+    values = np.asarray(values, dtype=float)
+    segments = np.asarray(segments, dtype=np.int64)
+    valid = ~np.isnan(values) & (segments >= 0)
+    values = values[valid]
+    segments = segments[valid]
+
+    # 按（分段，数值）排序后，每个分段的中位数位于其区间中点
+    sorted_values = values[np.lexsort((values, segments))]
+    counts = np.bincount(segments, minlength=n_segments)
+    starts = np.cumsum(counts) - counts
+
+    medians = np.full(n_segments, np.nan)
+    nonempty = counts > 0
+    lower = starts[nonempty] + (counts[nonempty] - 1) // 2
+    upper = starts[nonempty] + counts[nonempty] // 2
+    medians[nonempty] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return medians
+
+def _zero_as_nan(series):
+    """转换为float数组，0视为缺失"""
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    return np.where(values == 0, np.nan, values)
+
+def compute_median_fills(df, fill_cols, target_col, group_col=None):
+    """一次计算target_col的分组中位数和fill_cols的全局中位数（0视为缺失）
+
+    所有列拼接为一个数组，每列（及每个分组）对应一个整数分段，只做一次排序。
+    返回 (分组中位数字典或全局中位数, {列名: 中位数})。
+    """
+    fill_cols = [col for col in fill_cols if col in df.columns]
+    blocks = []
+    segment_blocks = []
+    n_segments = 0
+
+    target_medians = None
+    groups = None
+    if target_col in df.columns:
+        if group_col is not None and group_col in df.columns:
+            # 分组编码（缺失分组为-1，不参与计算）
+            codes, groups = pd.factorize(df[group_col], sort=True)
+            n_groups = len(groups)
+        else:
+            codes, groups = np.zeros(len(df), dtype=np.int64), None
+            n_groups = 1
+        blocks.append(_zero_as_nan(df[target_col]))
+        segment_blocks.append(np.where(codes >= 0, codes, -1))
+        n_segments = n_groups
+
+    for col in fill_cols:
+        blocks.append(_zero_as_nan(df[col]))
+        segment_blocks.append(np.full(len(df), n_segments, dtype=np.int64))
+        n_segments += 1
+
+    if not blocks:
+        return None, {}
+    medians = segment_medians(np.concatenate(blocks), np.concatenate(segment_blocks), n_segments)
+
+    offset = 0
+    if target_col in df.columns:
+        if groups is not None:
+            target_medians = dict(zip(groups, medians[:n_groups]))
+        else:
+            target_medians = medians[0]
+        offset = n_groups
+    fill_medians = dict(zip(fill_cols, medians[offset:]))
+    return target_medians, fill_medians
+
+def fill_by_group(df, target_col, group_col, group_medians):
+    """用分组中位数填充target_col（0视为缺失，分组经整数编码查表）"""
+    values = _zero_as_nan(df[target_col])
+    groups = pd.Index(list(group_medians.keys()))
+    lookup = np.append(np.asarray(list(group_medians.values()), dtype=float), np.nan)
+    # 未知或缺失分组的编码为-1，对应查表末尾的NaN
+    codes = groups.get_indexer(df[group_col])
+    return np.where(np.isnan(values), lookup[codes], values)
+
+def fill_columns(df, columns, medians, indicator_names):
+    """对多列一次完成0值置空、缺失指示列生成和中位数填充"""
+    if not columns:
+        return df
+    values = df[columns].to_numpy(dtype=float, na_value=np.nan)
+    values = np.where(values == 0, np.nan, values)
+    present = ~np.isnan(values)
+
+    fill_values = np.array([medians[col] for col in columns], dtype=float)
+    df[columns] = np.where(present, values, fill_values)
+    df[indicator_names] = present.astype(int)
+    return df
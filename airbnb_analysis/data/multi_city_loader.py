@@ -1,21 +1,46 @@
 """多城市数据加载器 - 从raw目录直接加载数据文件"""
 import sys
+import os
+import io
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-import gzip
 import pandas as pd
 
 BASE_PATH = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(BASE_PATH))
 
-from airbnb_analysis.config.settings import DATA_DIR
+from airbnb_analysis.config.settings import DATA_DIR, CACHE_CONFIG, MULTI_CITY_CONFIG, STREAMING_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
-from airbnb_analysis.data.adapter import standardize_columns
+from airbnb_analysis.data.adapter import (
+    standardize_columns,
+    resolve_column_mapping,
+    resolve_projected_columns,
+    apply_listing_schema,
+)
+from airbnb_analysis.data.reader import read_header, read_listings
 from airbnb_analysis.data.cleaner import clean_city_data
+from airbnb_analysis.data.cache import compute_cache_key, load_cached_city, save_cached_city
+from airbnb_analysis.data.streaming_cleaner import clean_city_file_streaming
+from airbnb_analysis.data.spatial_join import add_polygon_regions
+
+# 支持的数据文件后缀（按优先级从高到低，同一城市有多个文件时使用优先级最高的）
+LISTING_SUFFIXES = [
+    'listings.parquet',
+    'listings.csv.gz',
+    'listings.csv.zst',
+    'listings.csv',
+]
 
 def extract_city_name(filename):
     """从文件名提取城市名称"""
-    # 移除 'listings.csv.gz' 或 'listings.csv'
-    name = filename.replace('listings.csv.gz', '').replace('listings.csv', '')
+    # 移除 'listings.parquet'、'listings.csv.gz' 等后缀
+    name = filename
+    for suffix in LISTING_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
     # 移除可能的空格和特殊字符
     name = name.strip()
     return name
@@ -27,72 +52,134 @@ def find_all_city_data(data_dir=None):
     
     data_dir = Path(data_dir)
     
-    # 查找所有listings.csv.gz文件
-    data_files = list(data_dir.glob("*listings.csv.gz"))
-    
-    # 也查找listings.csv文件（已解压的）
-    csv_files = [f for f in data_dir.glob("*listings.csv") 
-                 if not f.name.startswith('listings_2_cleaned')]  # 排除纽约的清洗数据
-    
-    all_files = data_files + csv_files
-    
     city_data_map = {}
-    
-    for filepath in all_files:
-        city_name = extract_city_name(filepath.name)
-        if city_name:
-            # 如果已经有.gz文件，优先使用.gz
-            if filepath.suffix == '.gz':
-                city_data_map[city_name] = filepath
-            elif city_name not in city_data_map:
-                # 如果没有.gz，使用.csv
+    city_priority = {}
+    
+    for priority, suffix in enumerate(LISTING_SUFFIXES):
+        for filepath in data_dir.glob(f"*{suffix}"):
+            if filepath.name.startswith('listings_2_cleaned'):  # 排除纽约的清洗数据
+                continue
+            city_name = extract_city_name(filepath.name)
+            # 同一城市优先使用Parquet，其次是压缩CSV
+            if city_name and priority < city_priority.get(city_name, len(LISTING_SUFFIXES)):
                 city_data_map[city_name] = filepath
+                city_priority[city_name] = priority
     
     return city_data_map
 
-def load_city_data_file(filepath):
-    """加载单个城市数据文件"""
+# 清洗必需的标准列
+REQUIRED_COLUMNS = ['price', 'accommodates']
+
+def check_required_columns(columns):
+    """检查标准化后的列是否包含必需列，缺少时打印提示并返回False"""
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_cols:
+        print(f"  ⚠ 缺少必需列: {missing_cols}")
+        print(f"  可用列（前10个）: {list(columns)[:10]}")
+        return False
+    return True
+
+def load_city_data_file(filepath, projected=None):
+    """加载单个城市数据文件（projected=True时只读取分析所需的列）"""
     filepath = Path(filepath)
     
     if not filepath.exists():
         raise FileNotFoundError(f"数据文件不存在: {filepath}")
     
-    # 读取数据
-    if filepath.suffix == '.gz' or str(filepath).endswith('.csv.gz'):
-        with gzip.open(filepath, 'rt', encoding='utf-8', errors='ignore') as f:
-            df = pd.read_csv(f, low_memory=False)
-    else:
-        df = pd.read_csv(filepath, low_memory=False)
+    if projected is None:
+        projected = MULTI_CITY_CONFIG['projected_columns']
+    usecols = resolve_projected_columns(read_header(filepath)) if projected else None
     
-    return df
+    # 读取数据（自动识别csv/gzip/zstd/Parquet）
+    return read_listings(filepath, usecols=usecols)
 
-def load_and_preprocess_city(filepath, city_name=None):
-    """加载并预处理单个城市数据"""
+def load_and_preprocess_city(filepath, city_name=None, use_cache=None):
+    """加载并预处理单个城市数据（源文件和清洗配置未变化时直接读取缓存）"""
+    filepath = Path(filepath)
     print(f"\n处理城市: {city_name or filepath.name}")
     
-    # 加载数据
-    df = load_city_data_file(filepath)
-    print(f"  原始数据: {len(df)} 行, {len(df.columns)} 列")
+    if use_cache is None:
+        use_cache = CACHE_CONFIG['enabled']
+    
+    cache_name = city_name or extract_city_name(filepath.name)
+    if use_cache:
+        cache_key, fingerprint = compute_cache_key(filepath)
+        df = load_cached_city(cache_name, cache_key)
+        if df is not None:
+            print(f"  ✓ 命中缓存: {len(df)} 行, {len(df.columns)} 列")
+            return add_polygon_regions(df, cache_name, filepath.parent)
+    
+    # 大文件使用分块流式清洗，避免整表读入内存
+    streaming_min_size = MULTI_CITY_CONFIG['streaming_min_file_size']
+    if streaming_min_size is not None and filepath.stat().st_size >= streaming_min_size:
+        # 只读表头检查必需列（与内存清洗分支一致）
+        header = tuple(read_header(filepath))
+        standardized = resolve_column_mapping(header)[2]
+        if not check_required_columns([name for name, found in standardized.items() if found] + list(header)):
+            return pd.DataFrame()
+        output_path = STREAMING_CONFIG['output_dir'] / f"{filepath.name.split('.')[0]}.parquet"
+        if clean_city_file_streaming(filepath, output_path, city_name) is None:
+            return pd.DataFrame()
+        # 有意整体读回：流式清洗限制的是读取和清洗原始文本时的内存峰值，
+        # 清洗结果只含投影后的列、已过滤异常值，而后续类型压缩、缓存和各场景分析都需要完整数据框
+        df = pd.read_parquet(output_path)
+    else:
+        # 加载数据
+        df = load_city_data_file(filepath)
+        print(f"  原始数据: {len(df)} 行, {len(df.columns)} 列")
     
-    # 标准化列名
-    df, column_status = standardize_columns(df)
+        # 标准化列名
+        df, column_status = standardize_columns(df)
     
-    # 检查必需列
-    required_cols = ['price', 'accommodates']
-    missing_cols = [col for col in required_cols if col not in df.columns]
+        # 检查必需列
+        if not check_required_columns(df.columns):
+            return pd.DataFrame()
     
-    if missing_cols:
-        print(f"  ⚠ 缺少必需列: {missing_cols}")
-        print(f"  可用列（前10个）: {list(df.columns)[:10]}")
-        return pd.DataFrame()
+        # 清洗数据（按照notebook的逻辑）
+        df = clean_city_data(df, city_name)
+    
+    # 转换为紧凑类型（分类、布尔、最小整数）
+    if MULTI_CITY_CONFIG['typed_schema'] and len(df) > 0:
+        memory_before = df.memory_usage(deep=True).sum()
+        df = apply_listing_schema(df)
+        memory_after = df.memory_usage(deep=True).sum()
+        print(f"  类型压缩: {memory_before/1e6:.1f} MB → {memory_after/1e6:.1f} MB")
     
-    # 清洗数据（按照notebook的逻辑）
-    df = clean_city_data(df, city_name)
+    if use_cache and len(df) > 0:
+        save_cached_city(df, cache_name, cache_key, fingerprint)
     
-    return df
+    # 空间连接在缓存之后进行（多边形文件不参与缓存键）
+    return add_polygon_regions(df, cache_name, filepath.parent)
+
+def _load_city_worker(filepath, city_name):
+    """进程池中加载单个城市（捕获输出和异常，保证城市之间互不影响）"""
+    log = io.StringIO()
+    df, error = None, None
+    with contextlib.redirect_stdout(log):
+        try:
+            df = load_and_preprocess_city(filepath, city_name)
+        except Exception:
+            error = traceback.format_exc()
+    return df, log.getvalue(), error
 
-def load_all_cities_data(data_dir=None):
-    """加载所有城市数据"""
+def _resolve_load_workers(n_workers, n_cities):
+    """解析并行加载的进程数"""
+    if n_workers is None:
+        n_workers = MULTI_CITY_CONFIG['load_workers']
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    return max(1, min(n_workers, n_cities))
+
+def _report_city_result(df):
+    """打印单个城市的加载结果，返回是否加载成功"""
+    if len(df) > 0:
+        print(f"  ✓ 成功加载: {len(df)} 行")
+        return True
+    print(f"  ✗ 预处理后数据为空")
+    return False
+
+def load_all_cities_data(data_dir=None, n_workers=None):
+    """加载所有城市数据（n_workers > 1 时使用进程池并行加载）"""
     if data_dir is None:
         data_dir = DATA_DIR
     
@@ -111,21 +198,46 @@ def load_all_cities_data(data_dir=None):
     for city, filepath in sorted(city_data_map.items()):
         print(f"  {city}: {filepath.name}")
     
+    n_workers = _resolve_load_workers(n_workers, len(city_data_map))
+    
     # 加载每个城市的数据
     cities_data = {}
     
-    for city_name, filepath in sorted(city_data_map.items()):
-        try:
-            df = load_and_preprocess_city(filepath, city_name)
-            if len(df) > 0:
-                cities_data[city_name] = df
-                print(f"  ✓ 成功加载: {len(df)} 行")
-            else:
-                print(f"  ✗ 预处理后数据为空")
-        except Exception as e:
-            print(f"  ✗ 加载失败: {e}")
-            import traceback
-            traceback.print_exc()
+    if n_workers == 1:
+        for city_name, filepath in sorted(city_data_map.items()):
+            try:
+                df = load_and_preprocess_city(filepath, city_name)
+                if _report_city_result(df):
+                    cities_data[city_name] = df
+            except Exception as e:
+                print(f"  ✗ 加载失败: {e}")
+                traceback.print_exc()
+    else:
+        print(f"\n使用 {n_workers} 个进程并行加载")
+        loaded = {}
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(_load_city_worker, filepath, city_name): city_name
+                for city_name, filepath in sorted(city_data_map.items())
+            }
+            for future in as_completed(futures):
+                city_name = futures[future]
+                try:
+                    df, log, error = future.result()
+                except Exception as e:
+                    # 子进程异常退出等情况
+                    print(f"\n处理城市: {city_name}")
+                    print(f"  ✗ 加载失败: {e}")
+                    continue
+                print(log, end='')
+                if error:
+                    print(f"  ✗ 加载失败:\n{error}")
+                elif _report_city_result(df):
+                    loaded[city_name] = df
+        
+        # 按城市名称排序，与串行模式返回相同的顺序
+        for city_name in sorted(loaded):
+            cities_data[city_name] = loaded[city_name]
     
     print(f"\n成功加载 {len(cities_data)} 个城市的数据")
     
@@ -3,10 +3,11 @@ import pandas as pd
 import numpy as np
 from airbnb_analysis.config.settings import BINNING_CONFIG
 from airbnb_analysis.config.constants import FEATURE_COLS
+from airbnb_analysis.data.frame_view import shallow_copy
 
 def preprocess_data(df):
     """数据预处理主函数"""
-    df = df.copy()
+    df = shallow_copy(df)
     
     # 转换数值类型
     numeric_cols = [
@@ -42,7 +43,7 @@ def preprocess_data(df):
 
 def create_binned_features(df):
     """创建分箱特征"""
-    df = df.copy()
+    df = shallow_copy(df)
     
     # 房东规模分箱
     if FEATURE_COLS['host_listings_count'] in df.columns:
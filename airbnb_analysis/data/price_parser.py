@@ -0,0 +1,93 @@
+"""价格解析模块 - 基于Arrow字符串数组的向量化多地区价格解析"""
+import pandas as pd
+
+from airbnb_analysis.config.settings import PRICE_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 去除货币符号、空白等字符，只保留数字、分隔符和负号
+STRIP_PATTERN = r'[^0-9.,\-]'
+
+# 自动识别时视为','作小数点的写法："1.234,00"、"12,5"、"1.234.567"
+# （"1,234"这类逗号后恰好3位的写法仍按千位分隔符处理）
+COMMA_DECIMAL_PATTERN = r'^-?(\d{1,3}(\.\d{3})+|\d+),\d{1,2}$|^-?\d{1,3}(\.\d{3}){2,}$'
+
+# 分隔符统一后的合法数值
+NUMBER_PATTERN = r'^-?(\d+\.?\d*|\.\d+)$'
+
+def resolve_decimal_separator(city_name=None):
+    """获取城市使用的小数点设置"""
+    return PRICE_CONFIG['city_decimal_separators'].get(city_name, PRICE_CONFIG['decimal_separator'])
+
+def _to_arrow_strings(series):
+    """将价格列转换为Arrow字符串数组（pyarrow存储的字符串列零拷贝）"""
+    try:
+        return pa.array(series, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # 混有非字符串对象时先统一为字符串（缺失值保持缺失）
+        return pa.array(series.astype('string'), type=pa.string(), from_pandas=True)
+
+def _parse_arrow(series, decimal_separator):
+    """用Arrow计算内核解析价格，全程不产生逐行Python对象"""
+    raw = _to_arrow_strings(series)
+    stripped = pc.replace_substring_regex(raw, STRIP_PATTERN, '')
+
+    point_decimal = pc.replace_substring(stripped, ',', '')
+    comma_decimal = pc.replace_substring(pc.replace_substring(stripped, '.', ''), ',', '.')
+    if decimal_separator == ',':
+        normalized = comma_decimal
+    elif decimal_separator == '.':
+        normalized = point_decimal
+    else:
+        is_comma = pc.match_substring_regex(stripped, COMMA_DECIMAL_PATTERN)
+        normalized = pc.if_else(is_comma, comma_decimal, point_decimal)
+
+    is_number = pc.fill_null(pc.match_substring_regex(normalized, NUMBER_PATTERN), False)
+    parsed = pc.cast(pc.if_else(is_number, normalized, pa.scalar(None, pa.string())), pa.float64())
+
+    # 有内容但无法解析的值计为失败（空字符串视为缺失）
+    has_content = pc.greater(pc.utf8_length(pc.utf8_trim_whitespace(raw)), 0)
+    failed = pc.and_(pc.fill_null(has_content, False), pc.invert(is_number))
+    n_failed = pc.sum(failed).as_py() or 0
+
+    values = parsed.to_numpy(zero_copy_only=False)
+    return pd.Series(values, index=series.index, name=series.name), n_failed
+
+def _parse_pandas(series, decimal_separator):
+    """未安装pyarrow时用pandas字符串方法解析（规则相同）"""
+    raw = series.astype('string')
+    stripped = raw.str.replace(STRIP_PATTERN, '', regex=True)
+
+    point_decimal = stripped.str.replace(',', '', regex=False)
+    comma_decimal = stripped.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    if decimal_separator == ',':
+        normalized = comma_decimal
+    elif decimal_separator == '.':
+        normalized = point_decimal
+    else:
+        is_comma = stripped.str.match(COMMA_DECIMAL_PATTERN).fillna(False).astype(bool)
+        normalized = point_decimal.where(~is_comma, comma_decimal)
+
+    is_number = normalized.str.match(NUMBER_PATTERN).fillna(False).astype(bool)
+    parsed = pd.to_numeric(normalized.where(is_number), errors='coerce').astype(float)
+
+    has_content = raw.str.strip().str.len().fillna(0) > 0
+    n_failed = int((has_content & ~is_number).sum())
+
+    return pd.Series(parsed.to_numpy(), index=series.index, name=series.name), n_failed
+
+def parse_prices(series, decimal_separator=None):
+    """解析价格字符串（如"$1,234.00"、"1.234,00 €"），返回数值列和解析失败行数"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series, 0
+    if decimal_separator is None:
+        decimal_separator = PRICE_CONFIG['decimal_separator']
+
+    if HAS_PYARROW:
+        return _parse_arrow(series, decimal_separator)
+    return _parse_pandas(series, decimal_separator)
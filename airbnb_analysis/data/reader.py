@@ -0,0 +1,173 @@
+"""统一数据读取模块 - 自动识别csv、csv.gz、zstd和Parquet格式"""
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from airbnb_analysis.config.settings import READ_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 文件头魔数 -> 格式
+MAGIC_BYTES = {
+    b'\x1f\x8b': 'gzip',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+    b'PAR1': 'parquet',
+}
+
+# 文件后缀 -> 格式（魔数无法识别时使用）
+SUFFIX_FORMATS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+    '.parquet': 'parquet',
+    '.csv': 'csv',
+}
+
+# 格式 -> pandas/pyarrow的压缩参数
+COMPRESSION = {
+    'csv': None,
+    'gzip': 'gzip',
+    'zstd': 'zstd',
+}
+
+# 与pandas默认一致的缺失值标记
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+def detect_format(filepath):
+    """根据文件头魔数（其次是后缀）识别文件格式"""
+    filepath = Path(filepath)
+    with open(filepath, 'rb') as f:
+        head = f.read(4)
+
+    for magic, fmt in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return fmt
+    return SUFFIX_FORMATS.get(filepath.suffix, 'csv')
+
+@contextmanager
+def _open_source(filepath, fmt):
+    """打开CSV数据源：有pyarrow时在C++中流式解压（pandas解压zstd需额外安装zstandard）"""
+    if HAS_PYARROW:
+        with pa.input_stream(str(filepath), compression=COMPRESSION[fmt]) as stream:
+            yield stream, None
+    else:
+        yield filepath, COMPRESSION[fmt]
+
+def read_header(filepath):
+    """只读取数据文件的表头"""
+    filepath = Path(filepath)
+    fmt = detect_format(filepath)
+
+    if fmt == 'parquet':
+        return list(pq.read_schema(filepath).names)
+    with _open_source(filepath, fmt) as (source, compression):
+        return list(pd.read_csv(
+            source, nrows=0, compression=compression,
+            encoding='utf-8', encoding_errors='ignore'
+        ).columns)
+
+def _arrow_table_to_pandas(table):
+    """转换为pandas，保持与pandas CSV读取相同的列类型"""
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_null(field.type):
+            # 整列为空：pandas读取为float64的NaN
+            column = column.cast(pa.float64())
+        elif pa.types.is_temporal(field.type):
+            # pandas未指定parse_dates时日期保持为字符串
+            column = column.cast(pa.string())
+        columns.append(column)
+    return pa.table(columns, names=table.column_names).to_pandas()
+
+def _read_csv_pyarrow(filepath, fmt, usecols):
+    """用pyarrow多线程读取CSV，解压在C++中以流的方式直接送入解析器"""
+    read_options = pa_csv.ReadOptions(
+        use_threads=READ_CONFIG['use_threads'],
+        block_size=READ_CONFIG['block_size'],
+    )
+    # 房源描述等字段包含换行
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    if usecols is not None:
+        # 与pandas一致：按文件中的列顺序返回
+        wanted = set(usecols)
+        usecols = [col for col in read_header(filepath) if col in wanted]
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=usecols,
+        null_values=NA_VALUES,
+        strings_can_be_null=True,
+    )
+    with _open_source(filepath, fmt) as (stream, _):
+        table = pa_csv.read_csv(
+            stream,
+            read_options=read_options,
+            parse_options=parse_options,
+            convert_options=convert_options,
+        )
+    return _arrow_table_to_pandas(table)
+
+def _read_csv_pandas(source, compression, usecols, dtype=None, chunksize=None):
+    """用pandas C引擎读取CSV（非法UTF-8字节直接忽略）"""
+    return pd.read_csv(
+        source,
+        compression=compression,
+        encoding='utf-8',
+        encoding_errors='ignore',
+        usecols=usecols,
+        dtype=dtype,
+        chunksize=chunksize,
+        low_memory=False,
+    )
+
+def read_listings(filepath, usecols=None, engine=None):
+    """读取房源数据文件（自动识别格式，usecols为None时读取全部列）"""
+    filepath = Path(filepath)
+    if not filepath.exists():
+        raise FileNotFoundError(f"数据文件不存在: {filepath}")
+    if engine is None:
+        engine = READ_CONFIG['engine']
+
+    fmt = detect_format(filepath)
+
+    if fmt == 'parquet':
+        return pd.read_parquet(filepath, columns=usecols)
+
+    if engine == 'pyarrow' and HAS_PYARROW:
+        try:
+            return _read_csv_pyarrow(filepath, fmt, usecols)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            # 编码错误等情况回退到pandas引擎
+            print(f"  ⚠ pyarrow读取失败，改用pandas引擎: {e}")
+
+    with _open_source(filepath, fmt) as (source, compression):
+        return _read_csv_pandas(source, compression, usecols)
+
+def iter_listings_chunks(filepath, chunksize, usecols=None, dtype=None):
+    """分块读取房源数据文件"""
+    filepath = Path(filepath)
+    if not filepath.exists():
+        raise FileNotFoundError(f"数据文件不存在: {filepath}")
+
+    fmt = detect_format(filepath)
+
+    if fmt == 'parquet':
+        parquet_file = pq.ParquetFile(filepath)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=usecols):
+            chunk = batch.to_pandas()
+            if dtype:
+                chunk = chunk.astype({col: t for col, t in dtype.items() if col in chunk.columns})
+            yield chunk
+        return
+
+    with _open_source(filepath, fmt) as (source, compression):
+        with _read_csv_pandas(source, compression, usecols, dtype=dtype, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
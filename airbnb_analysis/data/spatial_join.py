@@ -0,0 +1,268 @@
+"""空间连接模块 - 用本地街区多边形文件（neighbourhoods.geojson）为房源补充所属区域"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from airbnb_analysis.config.settings import DATA_DIR, SPATIAL_JOIN_CONFIG, MULTI_CITY_CONFIG
+from airbnb_analysis.config.constants import FEATURE_COLS
+
+# 点在多边形内的判定采用网格加速：
+# 1. 每条边按其外包框登记到覆盖的网格单元（多边形外包框索引），点只与所在单元内的边比较；
+# 2. 网格中心点用射线法（只需同一行网格内的边）确定所在多边形；
+# 3. 点的归属 = 中心点的归属 XOR（中心点到该点的线段穿过各多边形边界的次数为奇数）。
+# 线段完全位于单元内，所以第3步只需单元内的边，整个过程按(点, 边)对向量化计算。
+
+def _ring_edges(ring):
+    """闭合环的各条边 (x1, y1, x2, y2)"""
+    ring = np.asarray(ring, dtype=float)[:, :2]
+    if len(ring) < 3:
+        return np.empty((0, 4))
+    if not np.array_equal(ring[0], ring[-1]):
+        ring = np.vstack([ring, ring[:1]])
+    return np.hstack([ring[:-1], ring[1:]])
+
+def _geometry_rings(geometry):
+    """Polygon/MultiPolygon几何对象的全部环（外环和洞按奇偶规则统一处理）"""
+    if geometry is None:
+        return []
+    if geometry['type'] == 'Polygon':
+        return geometry['coordinates']
+    if geometry['type'] == 'MultiPolygon':
+        return [ring for polygon in geometry['coordinates'] for ring in polygon]
+    return []
+
+def load_polygons(path, region_properties=None):
+    """读取GeoJSON多边形，返回(边数组(E, 4), 每条边所属多边形编号, 各多边形的区域名称, 使用的属性名)
+
+    区域名称取region_properties中第一个在文件里有取值的属性（默认只有neighbourhood_group；
+    Inside Airbnb的文件中该属性常为空，此时不补充区域）。
+    """
+    if region_properties is None:
+        region_properties = SPATIAL_JOIN_CONFIG['region_properties']
+    with open(path, encoding='utf-8') as f:
+        features = json.load(f)['features']
+
+    used_property = None
+    for name in region_properties:
+        if any((feature.get('properties') or {}).get(name) for feature in features):
+            used_property = name
+            break
+
+    edges, edge_feature, labels = [], [], []
+    for feature in features:
+        label = (feature.get('properties') or {}).get(used_property) if used_property else None
+        rings = [_ring_edges(ring) for ring in _geometry_rings(feature.get('geometry'))]
+        rings = [ring for ring in rings if len(ring)]
+        if not rings:
+            continue
+        ring_edges = np.vstack(rings)
+        edges.append(ring_edges)
+        edge_feature.append(np.full(len(ring_edges), len(labels)))
+        labels.append(label)
+
+    if not edges:
+        return np.empty((0, 4)), np.empty(0, dtype=np.int64), [], used_property
+    return np.vstack(edges), np.concatenate(edge_feature), labels, used_property
+
+def _expand_ranges(starts, counts):
+    """CSR展开：每个区间[start, start + count)的全部下标拼接"""
+    total = counts.sum()
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+class PolygonIndex:
+    """多边形集合上的网格索引，locate()批量返回每个点所在多边形的编号（不在任何多边形内为-1）"""
+
+    def __init__(self, edges, edge_feature, labels, grid_size=None, block_size=None):
+        if grid_size is None:
+            grid_size = SPATIAL_JOIN_CONFIG['grid_size']
+        if block_size is None:
+            block_size = SPATIAL_JOIN_CONFIG['block_size']
+        self.edges = np.asarray(edges, dtype=float)
+        self.edge_feature = np.asarray(edge_feature, dtype=np.int64)
+        self.labels = list(labels)
+        self.n_features = len(self.labels)
+        self.grid_size = grid_size
+        self.block_size = block_size
+
+        if len(self.edges) == 0:
+            self.x0 = self.y0 = self.width = self.height = 1.0
+            self.cell_starts = np.zeros(grid_size * grid_size, dtype=np.int64)
+            self.cell_counts = np.zeros(grid_size * grid_size, dtype=np.int64)
+            self.cell_edges = np.empty(0, dtype=np.int64)
+            self.center_feature = np.full(grid_size * grid_size, -1, dtype=np.int64)
+            return
+
+        xs, ys = self.edges[:, [0, 2]], self.edges[:, [1, 3]]
+        self.x0, self.y0 = xs.min(), ys.min()
+        self.width = max((xs.max() - self.x0) / grid_size, 1e-12)
+        self.height = max((ys.max() - self.y0) / grid_size, 1e-12)
+
+        # 每条边按外包框登记到覆盖的全部网格单元
+        ix0, ix1 = self._column(xs.min(axis=1)), self._column(xs.max(axis=1))
+        iy0, iy1 = self._row(ys.min(axis=1)), self._row(ys.max(axis=1))
+        nx, ny = ix1 - ix0 + 1, iy1 - iy0 + 1
+        edge_ids = np.repeat(np.arange(len(self.edges)), nx * ny)
+        local = np.arange(len(edge_ids)) - np.repeat(np.cumsum(nx * ny) - nx * ny, nx * ny)
+        cells = (iy0[edge_ids] + local // nx[edge_ids]) * grid_size + ix0[edge_ids] + local % nx[edge_ids]
+        order = np.argsort(cells, kind='stable')
+        self.cell_edges = edge_ids[order]
+        self.cell_counts = np.bincount(cells, minlength=grid_size * grid_size)
+        self.cell_starts = np.cumsum(self.cell_counts) - self.cell_counts
+
+        self.center_feature = self._locate_centers(iy0, iy1)
+
+    def _column(self, x):
+        """x坐标所在的网格列（网格外的截断到边界）"""
+        return np.clip(((x - self.x0) / self.width).astype(np.int64), 0, self.grid_size - 1)
+
+    def _row(self, y):
+        """y坐标所在的网格行"""
+        return np.clip(((y - self.y0) / self.height).astype(np.int64), 0, self.grid_size - 1)
+
+    def _resolve(self, point_ids, feature_ids, n_points):
+        """每个点按(点, 多边形)对出现次数的奇偶确定所在多边形（奇数次为在内）"""
+        result = np.full(n_points, -1, dtype=np.int64)
+        if len(point_ids) == 0:
+            return result
+        keys, counts = np.unique(point_ids * self.n_features + feature_ids, return_counts=True)
+        inside = keys[counts % 2 == 1]
+        result[inside // self.n_features] = inside % self.n_features
+        return result
+
+    def _locate_centers(self, iy0, iy1):
+        """射线法确定各网格中心点所在多边形（向+x方向的射线只穿过同一行网格内的边）"""
+        G = self.grid_size
+        center_x = self.x0 + (np.arange(G) + 0.5) * self.width
+        point_ids, feature_ids = [], []
+        for row in range(G):
+            row_edges = np.flatnonzero((iy0 <= row) & (iy1 >= row))
+            if len(row_edges) == 0:
+                continue
+            cy = self.y0 + (row + 0.5) * self.height
+            x1, y1, x2, y2 = self.edges[row_edges].T
+            straddles = (y1 > cy) != (y2 > cy)
+            x1, y1, x2, y2 = x1[straddles], y1[straddles], x2[straddles], y2[straddles]
+            crossing_x = x1 + (cy - y1) * (x2 - x1) / (y2 - y1)
+            center, edge = np.nonzero(center_x[:, None] < crossing_x[None, :])
+            point_ids.append(row * G + center)
+            feature_ids.append(self.edge_feature[row_edges[straddles]][edge])
+        if not point_ids:
+            return np.full(G * G, -1, dtype=np.int64)
+        return self._resolve(np.concatenate(point_ids), np.concatenate(feature_ids), G * G)
+
+    def locate(self, x, y):
+        """批量判定各点（经度x、纬度y）所在多边形的编号"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.full(len(x), -1, dtype=np.int64)
+        G = self.grid_size
+        inside_box = (
+            np.isfinite(x) & np.isfinite(y)
+            & (x >= self.x0) & (x <= self.x0 + G * self.width)
+            & (y >= self.y0) & (y <= self.y0 + G * self.height)
+        )
+        points = np.flatnonzero(inside_box)
+        if len(points) == 0:
+            return result
+        ix, iy = self._column(x[points]), self._row(y[points])
+        cells = iy * G + ix
+        result[points] = self.center_feature[cells]
+
+        # 所在单元有边界经过的点：中心点到该点的线段与单元内各边求交
+        boundary = self.cell_counts[cells] > 0
+        points, cells, ix, iy = points[boundary], cells[boundary], ix[boundary], iy[boundary]
+        # 按(点, 边)对的总数分块，限制内存
+        cumulative = np.cumsum(self.cell_counts[cells])
+        start = 0
+        while start < len(points):
+            done = cumulative[start - 1] if start else 0
+            end = max(int(np.searchsorted(cumulative, done + self.block_size, side='right')), start + 1)
+            block = slice(start, end)
+            result[points[block]] = self._locate_block(
+                x[points[block]], y[points[block]], cells[block], ix[block], iy[block]
+            )
+            start = end
+        return result
+
+    def _locate_block(self, px, py, cells, ix, iy):
+        """一块边界单元内的点：由中心点归属和线段穿越边界的奇偶得到所在多边形"""
+        n = len(px)
+        counts = self.cell_counts[cells]
+        pair_point = np.repeat(np.arange(n), counts)
+        pair_edge = self.cell_edges[_expand_ranges(self.cell_starts[cells], counts)]
+
+        cx = self.x0 + (ix + 0.5) * self.width
+        cy = self.y0 + (iy + 0.5) * self.height
+        ax, ay, bx, by = self.edges[pair_edge].T
+        qx, qy = cx[pair_point], cy[pair_point]
+        rx, ry = px[pair_point], py[pair_point]
+
+        # 两条线段相交：各自的两个端点分别位于另一条线段所在直线的两侧（0视为同一侧，保证共享顶点只计一次）
+        side_q = (bx - ax) * (qy - ay) - (by - ay) * (qx - ax) > 0
+        side_r = (bx - ax) * (ry - ay) - (by - ay) * (rx - ax) > 0
+        side_a = (rx - qx) * (ay - qy) - (ry - qy) * (ax - qx) > 0
+        side_b = (rx - qx) * (by - qy) - (ry - qy) * (bx - qx) > 0
+        crosses = (side_q != side_r) & (side_a != side_b)
+
+        center = self.center_feature[cells]
+        has_center = center >= 0
+        point_ids = np.r_[pair_point[crosses], np.flatnonzero(has_center)]
+        feature_ids = np.r_[self.edge_feature[pair_edge[crosses]], center[has_center]]
+        return self._resolve(point_ids, feature_ids, n)
+
+    @classmethod
+    def from_geojson(cls, path, region_properties=None, grid_size=None):
+        """由GeoJSON文件构建索引"""
+        edges, edge_feature, labels, used_property = load_polygons(path, region_properties)
+        index = cls(edges, edge_feature, labels, grid_size)
+        index.region_property = used_property
+        return index
+
+    def region_labels(self, x, y):
+        """各点所在多边形的区域名称（不在任何多边形内为None）"""
+        located = self.locate(x, y)
+        labels = np.asarray(self.labels + [None], dtype=object)
+        return labels[np.where(located >= 0, located, len(self.labels))]
+
+def find_polygon_file(city_name, data_dir=None):
+    """查找城市的街区多边形文件（与房源文件同目录，如 Antwerpneighbourhoods.geojson）"""
+    if data_dir is None:
+        data_dir = DATA_DIR
+    path = Path(data_dir) / f"{city_name}{SPATIAL_JOIN_CONFIG['polygon_file_suffix']}"
+    return path if path.exists() else None
+
+def add_polygon_regions(df, city_name, data_dir=None):
+    """neighbourhood_group缺失时，按房源坐标与街区多边形的空间连接补充区域（有多边形文件时）"""
+    if not SPATIAL_JOIN_CONFIG['enabled'] or city_name is None or len(df) == 0:
+        return df
+    region_col = FEATURE_COLS['neighbourhood_group']
+    lat_col, lon_col = FEATURE_COLS['latitude'], FEATURE_COLS['longitude']
+    if lat_col not in df.columns or lon_col not in df.columns:
+        return df
+    missing = df[region_col].isna().to_numpy() if region_col in df.columns else np.ones(len(df), dtype=bool)
+    if not missing.any():
+        return df
+    polygon_path = find_polygon_file(city_name, data_dir)
+    if polygon_path is None:
+        return df
+
+    index = PolygonIndex.from_geojson(polygon_path)
+    if index.region_property is None:
+        print(f"  ⚠ 多边形文件没有区域属性 {SPATIAL_JOIN_CONFIG['region_properties']} 的取值，不补充区域: {polygon_path.name}")
+        return df
+    regions = index.region_labels(
+        df[lon_col].to_numpy(dtype=float, na_value=np.nan)[missing],
+        df[lat_col].to_numpy(dtype=float, na_value=np.nan)[missing],
+    )
+
+    values = (df[region_col].to_numpy(dtype=object, na_value=None) if region_col in df.columns
+              else np.full(len(df), None, dtype=object))
+    values[missing] = regions
+    region = pd.Series(values, index=df.index, name=region_col)
+    df[region_col] = region.astype('category') if MULTI_CITY_CONFIG['typed_schema'] else region
+    assigned = int(pd.notna(regions).sum())
+    print(f"  ✓ 空间连接: 由{polygon_path.name}（{index.region_property}）为 {assigned}/{missing.sum()} 个房源补充区域")
+    return df
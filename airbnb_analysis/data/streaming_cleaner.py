@@ -0,0 +1,266 @@
+"""分块流式清洗模块 - 两遍处理内存放不下的房源文件"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from airbnb_analysis.config.settings import STREAMING_CONFIG, MULTI_CITY_CONFIG, QUANTILE_CONFIG
+from airbnb_analysis.data.adapter import (
+    COLUMN_MAPPINGS,
+    standardize_columns,
+    resolve_projected_columns,
+)
+from airbnb_analysis.data.reader import read_header, iter_listings_chunks
+from airbnb_analysis.data.cleaner import (
+    REVIEW_SCORE_COLS,
+    HOST_COUNT_COLS,
+    parse_price,
+    apply_cleaning_rules,
+)
+from airbnb_analysis.data.price_parser import parse_prices, resolve_decimal_separator
+from airbnb_analysis.models.quantile_sketch import QuantileSketch
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 流式读取时按字符串读取的标准列（保证各分块类型一致）
+STRING_COLUMNS = [
+    'price', 'room_type', 'host_is_superhost',
+    'neighbourhood_cleansed', 'neighbourhood_group_cleansed',
+]
+
+# 流式读取时保持自动推断类型的列
+INFERRED_COLUMNS = ['id']
+
+def _build_read_dtypes(header, usecols):
+    """为分块读取构建固定的列类型，避免不同分块推断出不同类型
+
+    只固定清洗使用的列（字符串列按str，其余按float64）；不投影读取时的名称、描述等
+    其他列保持自动推断。
+    """
+    string_raw = set()
+    for standard_name in STRING_COLUMNS:
+        for name in COLUMN_MAPPINGS.get(standard_name, [standard_name]):
+            string_raw.add(name)
+
+    columns = usecols if usecols is not None else header
+    known = set(resolve_projected_columns(header))
+    dtypes = {}
+    for col in columns:
+        if col not in known or col in INFERRED_COLUMNS:
+            continue
+        dtypes[col] = str if col in string_raw else 'float64'
+    return dtypes
+
+def iter_city_chunks(filepaths, chunksize=None, projected=None):
+    """逐块读取一个或多个（多期快照）数据文件，并标准化列名"""
+    if isinstance(filepaths, (str, Path)):
+        filepaths = [filepaths]
+    if chunksize is None:
+        chunksize = STREAMING_CONFIG['chunksize']
+    if projected is None:
+        projected = MULTI_CITY_CONFIG['projected_columns']
+
+    for filepath in filepaths:
+        filepath = Path(filepath)
+        if not filepath.exists():
+            raise FileNotFoundError(f"数据文件不存在: {filepath}")
+
+        header = read_header(filepath)
+        usecols = resolve_projected_columns(header) if projected else None
+        dtype = _build_read_dtypes(header, usecols)
+
+        for chunk in iter_listings_chunks(filepath, chunksize, usecols=usecols, dtype=dtype):
+            yield standardize_columns(chunk, inplace=True)[0]
+
+def _value_counts(series):
+    """按值计数（忽略缺失值）"""
+    return series.dropna().value_counts(sort=False)
+
+def _merge_counts(left, right):
+    """合并两个按值计数的直方图"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return left.add(right, fill_value=0)
+
+def _merge_price(left, right):
+    """合并价格累积器（直方图或分位数草图）"""
+    if isinstance(left, QuantileSketch) and isinstance(right, QuantileSketch):
+        return left.merge(right)
+    return _merge_counts(left, right)
+
+def histogram_quantile(counts, q):
+    """由按值计数的直方图精确计算分位数（与Series.quantile的线性插值一致）"""
+    if counts is None or counts.sum() == 0:
+        return np.nan
+
+    counts = counts[counts > 0].sort_index()
+    values = counts.index.to_numpy(dtype=float)
+    cumulative = np.cumsum(counts.to_numpy())
+    n = cumulative[-1]
+
+    position = (n - 1) * q
+    lower = int(np.floor(position))
+    upper = min(lower + 1, n - 1)
+    # 第k个（从0开始）排序值所在的直方图位置
+    lower_value = values[np.searchsorted(cumulative, lower, side='right')]
+    upper_value = values[np.searchsorted(cumulative, upper, side='right')]
+    return lower_value + (position - lower) * (upper_value - lower_value)
+
+def _empty_accumulator():
+    """空的统计量累积器"""
+    return {
+        'accommodates_by_room_type': {}, 'accommodates': None, 'fill': {}, 'price': None,
+        'price_parse_failures': 0,
+    }
+
+def accumulate_cleaning_stats(chunk, acc=None, decimal_separator=None):
+    """第一遍：从一个分块累积可合并的统计量"""
+    # 统计量以按值计数的直方图保存，可精确还原中位数和分位数，
+    # 内存只与各列不同取值的个数有关，与行数无关
+    if acc is None:
+        acc = _empty_accumulator()
+
+    if 'accommodates' in chunk.columns:
+        accommodates = chunk['accommodates'].replace(0, np.nan)
+        if 'room_type' in chunk.columns:
+            for room_type, values in accommodates.groupby(chunk['room_type']):
+                acc['accommodates_by_room_type'][room_type] = _merge_counts(
+                    acc['accommodates_by_room_type'].get(room_type), _value_counts(values)
+                )
+        else:
+            acc['accommodates'] = _merge_counts(acc['accommodates'], _value_counts(accommodates))
+
+    for col in REVIEW_SCORE_COLS + HOST_COUNT_COLS:
+        if col in chunk.columns:
+            acc['fill'][col] = _merge_counts(
+                acc['fill'].get(col), _value_counts(chunk[col].replace(0, np.nan))
+            )
+
+    if 'price' in chunk.columns:
+        price, failures = parse_prices(chunk['price'], decimal_separator)
+        acc['price_parse_failures'] += failures
+        price = price[price > 0]
+        if QUANTILE_CONFIG['streaming_sketch']:
+            # 价格取值过多时用草图代替直方图，内存为O(k)
+            if acc['price'] is None:
+                acc['price'] = QuantileSketch()
+            acc['price'].update(price)
+        else:
+            acc['price'] = _merge_counts(acc['price'], _value_counts(price))
+
+    return acc
+
+def merge_stat_accumulators(left, right):
+    """合并两个统计量累积器（如不同分块、不同文件或不同进程的结果）"""
+    merged = _empty_accumulator()
+
+    for acc in (left, right):
+        for room_type, counts in acc['accommodates_by_room_type'].items():
+            merged['accommodates_by_room_type'][room_type] = _merge_counts(
+                merged['accommodates_by_room_type'].get(room_type), counts
+            )
+        merged['accommodates'] = _merge_counts(merged['accommodates'], acc['accommodates'])
+        for col, counts in acc['fill'].items():
+            merged['fill'][col] = _merge_counts(merged['fill'].get(col), counts)
+        merged['price'] = _merge_price(merged['price'], acc['price'])
+        merged['price_parse_failures'] += acc['price_parse_failures']
+
+    return merged
+
+def finalize_cleaning_stats(acc, has_room_type=True):
+    """由累积器得到与compute_cleaning_stats结构相同的统计量"""
+    stats = {}
+
+    if has_room_type:
+        stats['accommodates_median_by_room_type'] = {
+            room_type: histogram_quantile(counts, 0.5)
+            for room_type, counts in acc['accommodates_by_room_type'].items()
+        }
+    else:
+        stats['accommodates_median'] = histogram_quantile(acc['accommodates'], 0.5)
+
+    stats['fill_medians'] = {
+        col: histogram_quantile(counts, 0.5) for col, counts in acc['fill'].items()
+    }
+
+    if isinstance(acc['price'], QuantileSketch):
+        stats['price_q1'], stats['price_q3'], stats['price_p999'] = acc['price'].quantile([0.25, 0.75, 0.999])
+    elif acc['price'] is not None:
+        stats['price_q1'] = histogram_quantile(acc['price'], 0.25)
+        stats['price_q3'] = histogram_quantile(acc['price'], 0.75)
+        stats['price_p999'] = histogram_quantile(acc['price'], 0.999)
+
+    return stats
+
+def _open_writer(output_path, first_chunk):
+    """根据输出文件后缀创建增量写出器"""
+    if output_path.suffix == '.parquet':
+        if not HAS_PYARROW:
+            raise ImportError("写出Parquet需要安装pyarrow")
+        schema = pa.Table.from_pandas(first_chunk, preserve_index=False).schema
+        return pq.ParquetWriter(output_path, schema), schema
+    return None, None
+
+def clean_city_file_streaming(filepaths, output_path, city_name=None, chunksize=None, projected=None):
+    """两遍分块流式清洗，结果增量写入Parquet或CSV文件"""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    print(f"\n流式清洗数据: {city_name or output_path.stem}")
+
+    decimal_separator = resolve_decimal_separator(city_name)
+
+    # 第一遍：累积统计量
+    acc = None
+    has_room_type = True
+    initial_count = 0
+    for chunk in iter_city_chunks(filepaths, chunksize, projected):
+        acc = accumulate_cleaning_stats(chunk, acc, decimal_separator)
+        has_room_type = 'room_type' in chunk.columns
+        initial_count += len(chunk)
+    print(f"  原始数据: {initial_count} 行")
+    if acc is not None:
+        print(f"  价格解析失败: {acc['price_parse_failures']} 行")
+
+    if acc is None or acc['price'] is None:
+        print(f"  ⚠ 缺少价格数据，跳过")
+        return None
+    stats = finalize_cleaning_stats(acc, has_room_type)
+
+    # 第二遍：逐块应用清洗规则并增量写出
+    writer, schema = None, None
+    filtered_count = 0
+    first = True
+    try:
+        for chunk in iter_city_chunks(filepaths, chunksize, projected):
+            if 'price' in chunk.columns:
+                chunk['price'] = parse_price(chunk['price'], decimal_separator)
+            chunk = apply_cleaning_rules(chunk, stats)
+            if len(chunk) == 0:
+                continue
+            if output_path.suffix == '.parquet':
+                if writer is None:
+                    writer, schema = _open_writer(output_path, chunk)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            else:
+                chunk.to_csv(output_path, mode='w' if first else 'a', header=first, index=False)
+            first = False
+            filtered_count += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if filtered_count == 0:
+        print(f"  ⚠ 清洗后数据为空")
+        return None
+
+    print(f"  清洗后: {filtered_count} 行 (保留 {filtered_count/initial_count*100:.1f}%)")
+    print(f"  已写出: {output_path}")
+
+    return output_path
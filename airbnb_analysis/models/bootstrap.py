@@ -0,0 +1,203 @@
+"""自助法（Bootstrap）模型 - 批量重抽样计算效应量置信区间"""
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from airbnb_analysis.config.settings import BOOTSTRAP_CONFIG
+
+# 重抽样以“每个观测被抽中的次数”矩阵表示（size×n），各效应量按频数加权计算，
+# 与直接在重抽样样本上计算的结果一致，但无需物化size份数据
+
+def resample_counts(rng, n, size):
+    """生成size组重抽样下标矩阵，并转换为每个观测被抽中次数的矩阵（size×n）"""
+    indices = rng.integers(0, n, size=(size, n))
+    offsets = (np.arange(size) * n)[:, None]
+    counts = np.bincount((indices + offsets).ravel(), minlength=size * n)
+    return counts.reshape(size, n).astype(float)
+
+def _tie_groups(values):
+    """排序下标和结（相同取值）的起始位置"""
+    order = np.argsort(values, kind='mergesort')
+    sorted_values = values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    return order, starts
+
+def weighted_ranks(weights, order, starts):
+    """按频数加权的平均秩，返回(各观测的秩, 各结的总频数)"""
+    n = weights.shape[1]
+    tie_counts = np.add.reduceat(weights[:, order], starts, axis=1)
+    before = np.cumsum(tie_counts, axis=1) - tie_counts
+    tie_ranks = before + (tie_counts + 1) / 2
+
+    ranks = np.empty_like(weights)
+    ranks[:, order] = np.repeat(tie_ranks, np.diff(np.r_[starts, n]), axis=1)
+    return ranks, tie_counts
+
+def weighted_median(weights, sorted_values):
+    """各行按频数加权的中位数（sorted_values需已升序排列，列与之对应）"""
+    cumulative = np.cumsum(weights, axis=1)
+    total = cumulative[:, -1]
+    last = len(sorted_values) - 1
+    # 第k个（从0开始）值为累计频数首次超过k的位置
+    lower = np.minimum((cumulative <= np.floor((total - 1) / 2)[:, None]).sum(axis=1), last)
+    upper = np.minimum((cumulative <= np.ceil((total - 1) / 2)[:, None]).sum(axis=1), last)
+    medians = (sorted_values[lower] + sorted_values[upper]) / 2
+    return np.where(total > 0, medians, np.nan)
+
+def _spearman(weights, data):
+    """Spearman相关系数"""
+    rx, _ = weighted_ranks(weights, *_tie_groups(data['x']))
+    ry, _ = weighted_ranks(weights, *_tie_groups(data['y']))
+    total = weights.sum(axis=1, keepdims=True)
+    dx = rx - (weights * rx).sum(axis=1, keepdims=True) / total
+    dy = ry - (weights * ry).sum(axis=1, keepdims=True) / total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (weights * dx * dy).sum(axis=1) / np.sqrt(
+            (weights * dx * dx).sum(axis=1) * (weights * dy * dy).sum(axis=1)
+        )
+
+def _group_medians(weights, data):
+    """编码为0和1的两组的加权中位数"""
+    medians = []
+    for code in (0, 1):
+        members = np.flatnonzero(data['codes'] == code)
+        members = members[np.argsort(data['values'][members], kind='mergesort')]
+        medians.append(weighted_median(weights[:, members], data['values'][members]))
+    return medians
+
+def _median_ratio(weights, data):
+    """两组中位数之比（如整租/独立房间价格溢价倍数）"""
+    first, second = _group_medians(weights, data)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(second > 0, first / second, 0)
+
+def _median_diff(weights, data):
+    """两组中位数之差"""
+    first, second = _group_medians(weights, data)
+    return first - second
+
+def _epsilon_squared(weights, data):
+    """Kruskal-Wallis效应量 epsilon² = H / (N - 1)"""
+    codes = data['codes']
+    n_groups = int(codes.max()) + 1
+    onehot = sparse.csr_matrix(
+        (np.ones(len(codes)), (np.arange(len(codes)), codes)), shape=(len(codes), n_groups)
+    )
+    ranks, tie_counts = weighted_ranks(weights, *_tie_groups(data['values']))
+    sizes = np.asarray(weights @ onehot)
+    rank_sums = np.asarray((weights * ranks) @ onehot)
+    total = weights.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = np.where(sizes > 0, rank_sums ** 2 / sizes, 0).sum(axis=1)
+        statistic = 12.0 / (total * (total + 1)) * between - 3 * (total + 1)
+        correction = 1 - (tie_counts ** 3 - tie_counts).sum(axis=1) / (total ** 3 - total)
+        return statistic / correction / (total - 1)
+
+def _interaction(weights, data):
+    """OLS交互项系数（y ~ x * d 中 x:d 的系数）"""
+    x, d, y = data['x'], data['d'], data['y']
+    design = np.column_stack([np.ones_like(x), x, d, x * d])
+    k = design.shape[1]
+    # X'WX 与 X'Wy 通过频数矩阵与逐观测外积相乘一次得到
+    outer = (design[:, :, None] * design[:, None, :]).reshape(len(x), k * k)
+    xtwx = (weights @ outer).reshape(-1, k, k)
+    xtwy = weights @ (design * y[:, None])
+    coefs = np.full((len(weights), k), np.nan)
+    solvable = np.linalg.matrix_rank(xtwx) == k
+    if solvable.any():
+        coefs[solvable] = np.linalg.solve(xtwx[solvable], xtwy[solvable][:, :, None])[:, :, 0]
+    return coefs[:, 3]
+
+STATISTICS = {
+    'spearman': _spearman,
+    'median_ratio': _median_ratio,
+    'median_diff': _median_diff,
+    'epsilon_squared': _epsilon_squared,
+    'interaction': _interaction,
+}
+
+# 各效应类型的零效应值（比值为1，相关系数、差值和回归系数为0）。
+# epsilon²非负，零效应位于取值下界，百分位区间几乎总不含0，不据此判断，为None（显著性以检验p值为准）
+NULL_VALUES = {
+    'spearman': 0.0,
+    'median_ratio': 1.0,
+    'median_diff': 0.0,
+    'epsilon_squared': None,
+    'interaction': 0.0,
+}
+
+def compute_effect(kind, data):
+    """在原始样本上计算效应量（各观测频数均为1）"""
+    n = len(next(iter(data.values())))
+    return STATISTICS[kind](np.ones((1, n)), data)[0]
+
+def _bootstrap_block(kind, data, seed, spawn_key, size):
+    """计算一个重抽样块的效应量（在子进程中执行）"""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+    n = len(next(iter(data.values())))
+    return STATISTICS[kind](resample_counts(rng, n, size), data)
+
+def _effect_key(name):
+    """由效应名称得到稳定的随机数种子分支（与效应顺序和进程数无关）"""
+    return zlib.crc32('/'.join(str(part) for part in name).encode('utf-8'))
+
+def create_bootstrap_executor(n_workers=None):
+    """创建重抽样进程池（单进程时返回None，直接串行计算）"""
+    if n_workers is None:
+        n_workers = BOOTSTRAP_CONFIG['workers']
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=n_workers)
+
+def bootstrap_effects(effects, n_resamples=None, seed=None, confidence_level=None, executor=None):
+    """计算多个效应量的自助法百分位置信区间
+
+    effects为[{'name': 名称元组, 'kind': 效应类型, 'data': {列名: 数组}}]。
+    每个效应的重抽样按block_size分块，每块的随机数种子由(seed, 效应名称, 块序号)确定，
+    结果与进程数无关、可复现。
+    """
+    if n_resamples is None:
+        n_resamples = BOOTSTRAP_CONFIG['n_resamples']
+    if seed is None:
+        seed = BOOTSTRAP_CONFIG['seed']
+    if confidence_level is None:
+        confidence_level = BOOTSTRAP_CONFIG['confidence_level']
+    block_size = BOOTSTRAP_CONFIG['block_size']
+
+    tasks = []
+    for effect in effects:
+        key = _effect_key(effect['name'])
+        for block, start in enumerate(range(0, n_resamples, block_size)):
+            size = min(block_size, n_resamples - start)
+            tasks.append((effect['name'], (effect['kind'], effect['data'], seed, (key, block), size)))
+
+    if executor is None:
+        outputs = [_bootstrap_block(*args) for _, args in tasks]
+    else:
+        futures = [executor.submit(_bootstrap_block, *args) for _, args in tasks]
+        outputs = [future.result() for future in futures]
+
+    samples = {}
+    for (name, _), output in zip(tasks, outputs):
+        samples.setdefault(name, []).append(output)
+
+    alpha = (1 - confidence_level) / 2
+    results = {}
+    for effect in effects:
+        values = np.concatenate(samples[effect['name']])
+        finite = values[np.isfinite(values)]
+        ci_low, ci_high = (np.quantile(finite, [alpha, 1 - alpha]) if len(finite) else (np.nan, np.nan))
+        results[effect['name']] = {
+            'effect_size': compute_effect(effect['kind'], effect['data']),
+            'ci_low': ci_low,
+            'ci_high': ci_high,
+            'n_resamples': int(len(finite)),
+            'null_value': NULL_VALUES[effect['kind']],
+        }
+    return results
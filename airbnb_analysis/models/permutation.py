@@ -0,0 +1,116 @@
+"""置换检验模型 - 批量向量化置换，p值置信区间确定后提前停止"""
+import time
+
+import numpy as np
+from scipy.stats import beta
+
+from airbnb_analysis.config.settings import PERMUTATION_CONFIG
+
+# 各检验的秩（或数值）只计算一次，置换只打乱分组编码或配对关系；
+# 与排列无关的常数（结校正、N(N+1)等）不影响p值，统计量只保留随置换变化的部分
+
+def resolve_method(method, n, min_group=None):
+    """确定p值计算方式（'asymptotic'或'permutation'）"""
+    if method is None:
+        method = PERMUTATION_CONFIG['method']
+    if method == 'auto':
+        small = n <= PERMUTATION_CONFIG['auto_max_samples']
+        if min_group is not None:
+            small = small or min_group <= PERMUTATION_CONFIG['auto_min_group']
+        return 'permutation' if small else 'asymptotic'
+    if method not in ('asymptotic', 'permutation'):
+        raise ValueError(f"未知的p值计算方式: {method}")
+    return method
+
+def pvalue_interval(exceed, total, confidence_level):
+    """置换p值的Clopper-Pearson置信区间"""
+    alpha = 1 - confidence_level
+    low = beta.ppf(alpha / 2, exceed, total - exceed + 1) if exceed > 0 else 0.0
+    high = beta.ppf(1 - alpha / 2, exceed + 1, total - exceed) if exceed < total else 1.0
+    return low, high
+
+def _group_statistic(ranks, sizes):
+    """组间统计量：各组秩和平方除以组大小之和（与Kruskal-Wallis H单调对应）"""
+    def statistic(permuted_codes):
+        n_perm, n = permuted_codes.shape
+        n_groups = len(sizes)
+        offsets = (np.arange(n_perm) * n_groups)[:, None]
+        rank_sums = np.bincount(
+            (permuted_codes + offsets).ravel(), weights=np.tile(ranks, n_perm), minlength=n_perm * n_groups
+        ).reshape(n_perm, n_groups)
+        return (rank_sums ** 2 / sizes).sum(axis=1)
+    return statistic
+
+def _two_sample_statistic(ranks, sizes):
+    """双侧两样本统计量：第0组秩和与其期望之差的绝对值（与Mann-Whitney |U - n1*n2/2|一致）"""
+    expected = sizes[0] * (len(ranks) + 1) / 2
+    def statistic(permuted_codes):
+        return np.abs(np.where(permuted_codes == 0, ranks, 0).sum(axis=1) - expected)
+    return statistic
+
+def run_permutations(observed, statistic, labels, seed=None):
+    """置换标签并计算统计量不小于观测值的比例
+
+    labels为被置换的一维数组（分组编码或配对下标），statistic接收置换后的(块大小×n)矩阵，
+    返回每次置换的统计量。每块结束后检查p值置信区间，完全位于alpha一侧、
+    达到置换次数上限或超出时间预算时停止。
+    """
+    config = PERMUTATION_CONFIG
+    if seed is None:
+        seed = config['seed']
+    rng = np.random.default_rng(seed)
+    # 浮点误差范围内相等的统计量视为不小于观测值
+    threshold = observed - 1e-9 * max(1.0, abs(observed))
+    deadline = None if config['time_budget'] is None else time.monotonic() + config['time_budget']
+
+    exceed = 0
+    total = 0
+    stop_reason = 'max_permutations'
+    # 块大小同时受置换矩阵元素数上限约束，样本量大时内存不随块大小增长
+    block_size = max(1, min(config['block_size'], config['max_block_cells'] // max(len(labels), 1)))
+    while total < config['max_permutations']:
+        size = min(block_size, config['max_permutations'] - total)
+        permuted = rng.permuted(np.broadcast_to(labels, (size, len(labels))), axis=1)
+        exceed += int(np.count_nonzero(statistic(permuted) >= threshold))
+        total += size
+
+        if total >= config['min_permutations']:
+            low, high = pvalue_interval(exceed, total, config['confidence_level'])
+            if high < config['alpha'] or low > config['alpha']:
+                stop_reason = 'converged'
+                break
+        if deadline is not None and time.monotonic() > deadline:
+            stop_reason = 'time_budget'
+            break
+
+    low, high = pvalue_interval(exceed, total, config['confidence_level'])
+    return {
+        # 加1校正：观测排列本身也计入，p值不会为0
+        'p_value': (exceed + 1) / (total + 1),
+        'n_permutations': total,
+        'p_value_ci': (low, high),
+        'stop_reason': stop_reason,
+    }
+
+def permutation_group_test(ranks, codes, seed=None):
+    """多组（Kruskal-Wallis）置换检验，ranks和codes为已去除无效值的平均秩和组编码（0..k-1）"""
+    sizes = np.bincount(codes).astype(float)
+    statistic = _group_statistic(ranks, sizes)
+    observed = statistic(codes[None, :])[0]
+    return run_permutations(observed, statistic, codes, seed)
+
+def permutation_two_sample_test(ranks, codes, seed=None):
+    """两组（Mann-Whitney）双侧置换检验，codes为0或1"""
+    sizes = np.bincount(codes, minlength=2)
+    statistic = _two_sample_statistic(ranks, sizes)
+    observed = statistic(codes[None, :])[0]
+    return run_permutations(observed, statistic, codes, seed)
+
+def permutation_correlation_test(x_scores, y_scores, seed=None):
+    """相关系数的双侧置换检验（Spearman传入秩，Pearson传入原值），只打乱y的配对关系"""
+    dx = x_scores - x_scores.mean()
+    dy = y_scores - y_scores.mean()
+    def statistic(permuted_index):
+        return np.abs(dy[permuted_index] @ dx)
+    observed = abs(dy @ dx)
+    return run_permutations(observed, statistic, np.arange(len(dy)), seed)
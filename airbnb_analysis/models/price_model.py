@@ -0,0 +1,144 @@
+"""价格模型工件 - 综合模型的序列化、加载和向量化预测"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+from airbnb_analysis.config.constants import FEATURE_COLS
+from airbnb_analysis.data.adapter import flag_mask
+from airbnb_analysis.data.cleaner import apply_imputation_rules
+from airbnb_analysis.data.frame_view import shallow_copy
+
+# 工件格式版本（特征定义变化时递增，旧工件加载时报错）
+ARTIFACT_VERSION = 1
+
+# 综合模型的特征
+MODEL_FEATURES = ['is_entire', 'accommodates', 'is_manhattan', 'is_superhost',
+                  'calculated_host_listings_count', 'review_scores_rating',
+                  'number_of_reviews_ltm', 'latitude', 'longitude']
+
+# 派生特征的定义（写入工件，便于核对）
+FEATURE_SPEC = {
+    'is_entire': f"{FEATURE_COLS['room_type']} == 'Entire home/apt'",
+    'is_manhattan': f"{FEATURE_COLS['neighbourhood_group']} == 'Manhattan'",
+    'is_superhost': f"{FEATURE_COLS['superhost']} is true ('t')",
+    'target': 'log(price)',
+}
+
+# 评分时需要的清洗统计量（价格分位数只用于训练数据的异常值过滤）
+IMPUTATION_STATS = ['accommodates_median_by_room_type', 'accommodates_median', 'fill_medians']
+
+def engineer_model_features(df):
+    """综合模型的特征工程（向量化，训练和批量评分共用）"""
+    df_model = shallow_copy(df)
+
+    df_model['is_entire'] = (df_model[FEATURE_COLS['room_type']] == 'Entire home/apt').astype(int)
+    df_model['is_manhattan'] = (df_model[FEATURE_COLS['neighbourhood_group']] == 'Manhattan').astype(int)
+    df_model['is_superhost'] = flag_mask(df_model[FEATURE_COLS['superhost']]).astype(int)
+    # 先转为float64，避免紧凑整数类型（int8/int16）经log1p得到低精度浮点
+    df_model['log_accommodates'] = np.log1p(df_model[FEATURE_COLS['accommodates']].astype(float))
+    df_model['log_ltm'] = np.log1p(df_model[FEATURE_COLS['reviews_ltm']].astype(float) + 1)
+    df_model['log_host_listings'] = np.log1p(df_model[FEATURE_COLS['host_listings_count']].astype(float) + 1)
+    return df_model
+
+def _json_number(value):
+    """转换为JSON可保存的数值（NaN保存为null）"""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+def _json_stats(stats):
+    """清洗统计量转换为JSON可保存的字典"""
+    result = {}
+    for key in IMPUTATION_STATS:
+        if key not in stats:
+            continue
+        value = stats[key]
+        if isinstance(value, dict):
+            result[key] = {str(k): _json_number(v) for k, v in value.items()}
+        else:
+            result[key] = _json_number(value)
+    return result
+
+def _restore_stats(stats):
+    """由工件恢复清洗统计量（null还原为NaN）"""
+    restored = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            restored[key] = {k: np.nan if v is None else v for k, v in value.items()}
+        else:
+            restored[key] = np.nan if value is None else value
+    return restored
+
+def predict_log_price(artifact, features):
+    """由特征数据框计算对数价格预测值（特征缺失的行为NaN）"""
+    X = features[artifact['features']].to_numpy(dtype=float, na_value=np.nan)
+    coefficients = np.array([artifact['coefficients'][name] for name in artifact['features']])
+    return artifact['intercept'] + X @ coefficients
+
+def build_model_artifact(model, cleaning_stats, city_name=None):
+    """由拟合的对数线性模型构建工件：系数、特征定义和评分时填充缺失值用的清洗统计量"""
+    features = [name for name in model.params.index if name != 'const']
+    return {
+        'version': ARTIFACT_VERSION,
+        'model': 'log_linear',
+        'city_name': city_name,
+        'features': features,
+        'feature_spec': FEATURE_SPEC,
+        'intercept': float(model.params['const']),
+        'coefficients': {name: float(model.params[name]) for name in features},
+        'cleaning_stats': _json_stats(cleaning_stats),
+        'nobs': int(model.nobs),
+        'rsquared': float(model.rsquared),
+    }
+
+def save_model_artifact(artifact, path):
+    """将工件保存为JSON文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(artifact, f, indent=2, ensure_ascii=False)
+    return path
+
+def load_model_artifact(path):
+    """读取工件并检查格式版本"""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"模型工件不存在: {path}")
+    with open(path, encoding='utf-8') as f:
+        artifact = json.load(f)
+    if artifact.get('version') != ARTIFACT_VERSION:
+        raise ValueError(f"模型工件版本不兼容: {artifact.get('version')} (需要 {ARTIFACT_VERSION})")
+    unknown = [name for name in artifact['features'] if name not in MODEL_FEATURES]
+    if unknown:
+        raise ValueError(f"模型工件包含未知特征: {unknown}")
+    artifact['cleaning_stats'] = _restore_stats(artifact['cleaning_stats'])
+    return artifact
+
+def _normalize_city(city_name):
+    """城市名称比较时忽略大小写、空格和标点"""
+    return ''.join(c for c in str(city_name).lower() if c.isalnum())
+
+def check_artifact_city(artifact, city_name):
+    """核对输入数据的城市与工件的训练城市，不一致或无法核对时打印警告，返回是否一致"""
+    trained_city = artifact.get('city_name')
+    if trained_city is None:
+        print(f"  ⚠ 模型工件未记录训练城市，无法核对输入数据（{city_name or '未知城市'}）")
+        return False
+    if city_name is None:
+        print(f"  ⚠ 未能确定输入数据的城市，模型训练城市为 {trained_city}")
+        return False
+    if _normalize_city(city_name) != _normalize_city(trained_city):
+        print(f"  ⚠ 输入城市 {city_name} 与模型训练城市 {trained_city} 不一致，预测可能不可靠")
+        return False
+    return True
+
+def score_frame(df, artifact):
+    """对一块标准化列名的原始房源数据应用训练时的填充规则和特征工程，返回预测结果"""
+    df = apply_imputation_rules(shallow_copy(df), artifact['cleaning_stats'])
+    df_features = engineer_model_features(df)
+    log_price = predict_log_price(artifact, df_features)
+    scores = df[['id']].copy() if 'id' in df.columns else df.iloc[:, :0].copy()
+    scores['predicted_log_price'] = log_price
+    # 对数尺度上的预测值取指数，对应价格的条件中位数（与各场景以中位数为主的口径一致）
+    scores['predicted_price'] = np.exp(log_price)
+    return scores
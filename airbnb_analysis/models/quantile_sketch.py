@@ -0,0 +1,119 @@
+"""分位数草图 - 可合并、误差有界的近似分位数（KLL）"""
+import numpy as np
+
+from airbnb_analysis.config.settings import QUANTILE_CONFIG
+
+class QuantileSketch:
+    """KLL分位数草图
+
+    第h层的每个元素代表2^h个原始值；某层超出容量时排序后隔一取一提升到上一层。
+    排名误差约为O(1/k)，内存为O(k)，与数据量无关。不同分块、不同城市的草图可直接合并，
+    一次构建后可回答任意多个分位数查询。
+    """
+
+    def __init__(self, k=None, seed=0):
+        if k is None:
+            k = QUANTILE_CONFIG['sketch_k']
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level):
+        """第level层的容量（越低的层容量越小）"""
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        """逐层压缩直到每层都不超过容量"""
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # 奇数个元素时保留一个在当前层
+                keep = items[:len(items) % 2]
+                paired = items[len(items) % 2:]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                # 层数增加后低层容量变化，从头检查
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values):
+        """批量加入数据（忽略NaN）"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """合并另一个草图（如其他分块或城市的结果）"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """查询一个或多个分位数"""
+        q_arr = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.n == 0:
+            result = np.full(len(q_arr), np.nan)
+            return result if np.ndim(q) else result[0]
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind='mergesort')
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+
+        idx = np.searchsorted(cumulative, q_arr * cumulative[-1], side='left')
+        result = items[np.clip(idx, 0, len(items) - 1)]
+        # 端点使用精确的最小值和最大值
+        result = np.where(q_arr <= 0, self.min, result)
+        result = np.where(q_arr >= 1, self.max, result)
+        return result if np.ndim(q) else result[0]
+
+    @classmethod
+    def from_values(cls, values, k=None, seed=0):
+        """由数据直接构建草图"""
+        return cls(k=k, seed=seed).update(values)
+
+def compute_quantiles(values, qs, min_rows=None):
+    """计算多个分位数：样本量达到min_rows时使用草图，否则使用精确的Series.quantile"""
+    if min_rows is None:
+        min_rows = QUANTILE_CONFIG['sketch_min_rows']
+
+    values = np.asarray(values, dtype=float)
+    if min_rows is not None and len(values) >= min_rows:
+        return list(QuantileSketch.from_values(values).quantile(list(qs)))
+
+    # 精确计算时只排序一次
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return [np.nan for _ in qs]
+    return list(np.quantile(values, list(qs)))
@@ -0,0 +1,101 @@
+"""秩缓存 - 同一城市数据集上的Spearman相关共用列的秩"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy.special import stdtr
+from scipy.stats import rankdata
+
+from airbnb_analysis.models.permutation import resolve_method, permutation_correlation_test
+
+def _mask_key(mask):
+    """行子集的缓存键（None表示全部行）"""
+    if mask is None:
+        return None
+    return hashlib.blake2b(np.packbits(mask).tobytes(), digest_size=16).digest()
+
+def spearman_from_ranks(rx, ry):
+    """由两列平均秩计算Spearman相关系数和双侧p值（与scipy.stats.spearmanr一致）"""
+    n = len(rx)
+    if n < 2 or np.all(rx == rx[0]) or np.all(ry == ry[0]):
+        # 常数列的相关系数无定义
+        return np.nan, np.nan
+
+    dx = rx - rx.mean()
+    dy = ry - ry.mean()
+    r = np.dot(dx, dy) / np.sqrt(np.dot(dx, dx) * np.dot(dy, dy))
+    r = np.clip(r, -1.0, 1.0)
+
+    dof = n - 2
+    if dof <= 0:
+        return r, np.nan
+    with np.errstate(divide='ignore'):
+        t = r * np.sqrt(max(dof / ((r + 1.0) * (1.0 - r)), 0))
+    p_value = 2 * stdtr(dof, -abs(t))
+    return r, p_value
+
+def spearman_test(rx, ry, pvalue_method=None):
+    """由已计算的平均秩得到Spearman相关和p值（pvalue_method见PERMUTATION_CONFIG，置换检验直接打乱秩的配对）"""
+    corr_coef, p_value = spearman_from_ranks(rx, ry)
+    result = {'correlation': corr_coef, 'p_value': p_value}
+    if not np.isnan(corr_coef) and resolve_method(pvalue_method, len(rx)) == 'permutation':
+        permutation = permutation_correlation_test(rx, ry)
+        result.update(p_value=permutation['p_value'], n_permutations=permutation['n_permutations'])
+    return result
+
+class RankCache:
+    """城市数据集上的秩缓存
+
+    每个（列，行子集）的平均秩只计算一次（一次排序），任意两列的Spearman相关
+    即为缓存秩上的Pearson相关。行子集用基础数据框上的布尔掩码表示，
+    与FrameView的掩码可直接共用。
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._ranks = {}
+        self._notna = {}
+
+    def _column_notna(self, column):
+        if column not in self._notna:
+            self._notna[column] = self.df[column].notna().to_numpy()
+        return self._notna[column]
+
+    def pair_mask(self, x_col, y_col, mask=None):
+        """两列均不缺失（且在给定子集内）的行掩码；全部行有效时返回None"""
+        pair = self._column_notna(x_col) & self._column_notna(y_col)
+        if mask is not None:
+            pair = pair & mask
+        return None if pair.all() else pair
+
+    def ranks(self, column, mask=None):
+        """某列在行子集上的平均秩（结果缓存）"""
+        key = (column, _mask_key(mask))
+        if key not in self._ranks:
+            values = self.df[column].to_numpy(dtype=float, na_value=np.nan)
+            if mask is not None:
+                values = values[mask]
+            self._ranks[key] = rankdata(values, method='average')
+        return self._ranks[key]
+
+    def spearman(self, x_col, y_col, mask=None, pvalue_method=None):
+        """两列的Spearman相关（成对删除缺失值；置换检验也使用缓存的秩）"""
+        pair = self.pair_mask(x_col, y_col, mask)
+        rx = self.ranks(x_col, pair)
+        result = spearman_test(rx, self.ranks(y_col, pair), pvalue_method)
+        result['n'] = len(rx)
+        return result
+
+    def correlation_matrix(self, pairs, mask=None):
+        """批量计算多对列的Spearman相关，返回(相关系数矩阵, p值矩阵)"""
+        columns = list(dict.fromkeys(col for pair in pairs for col in pair))
+        corr = pd.DataFrame(np.nan, index=columns, columns=columns)
+        p_values = pd.DataFrame(np.nan, index=columns, columns=columns)
+        for col in columns:
+            corr.loc[col, col] = 1.0
+
+        for x_col, y_col in pairs:
+            result = self.spearman(x_col, y_col, mask)
+            corr.loc[x_col, y_col] = corr.loc[y_col, x_col] = result['correlation']
+            p_values.loc[x_col, y_col] = p_values.loc[y_col, x_col] = result['p_value']
+        return corr, p_values
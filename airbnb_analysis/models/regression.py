@@ -1,21 +1,367 @@
 """回归模型"""
-from sklearn.linear_model import LinearRegression
-from statsmodels.formula.api import ols
-import statsmodels.api as sm
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.special import stdtr, stdtrit, ndtr, ndtri
 
-def fit_linear_regression(X, y):
-    """拟合简单线性回归"""
-    lr = LinearRegression()
-    lr.fit(X, y)
-    return lr
+# OLS直接由NumPy列构建设计矩阵求解，不经过patsy公式解析和statsmodels模型对象；
+# 多个模型（如各城市）的X'X块堆叠后一次批量Cholesky分解。
+# 系数、标准误、t值和p值与statsmodels OLS（非稳健协方差）一致
+
+class OLSResult:
+    """OLS拟合结果（属性命名与statsmodels结果对象一致）
+
+    稳健协方差（cov_type为HC0-HC3）与statsmodels一样默认使用正态分布计算p值和置信区间。
+    """
+
+    def __init__(self, params, cov_params, nobs, df_resid, ssr, centered_tss, cov_type='nonrobust', use_t=None):
+        if use_t is None:
+            use_t = cov_type == 'nonrobust'
+        self.params = params
+        self.cov_type = cov_type
+        self.use_t = use_t
+        self.centered_tss = centered_tss
+        self.nobs = nobs
+        self.df_resid = df_resid
+        self.df_model = nobs - df_resid - 1
+        self.ssr = ssr
+        self.rsquared = 1 - ssr / centered_tss if centered_tss > 0 else np.nan
+        self.scale = ssr / df_resid if df_resid > 0 else np.nan
+        self.cov_params = pd.DataFrame(cov_params, index=params.index, columns=params.index)
+        self.bse = pd.Series(np.sqrt(np.maximum(np.diag(cov_params), 0)), index=params.index)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.tvalues = self.params / self.bse
+        abs_t = np.abs(self.tvalues.to_numpy())
+        tail = stdtr(df_resid, -abs_t) if use_t else ndtr(-abs_t)
+        self.pvalues = pd.Series(2 * tail, index=params.index)
+
+    def conf_int(self, alpha=0.05):
+        """系数的置信区间"""
+        q = stdtrit(self.df_resid, 1 - alpha / 2) if self.use_t else ndtri(1 - alpha / 2)
+        return pd.DataFrame({0: self.params - q * self.bse, 1: self.params + q * self.bse})
+
+    def summary_frame(self, alpha=0.05):
+        """系数表（与statsmodels summary().tables[1]的列一致）"""
+        ci = self.conf_int(alpha)
+        return pd.DataFrame({
+            'coef': self.params,
+            'std err': self.bse,
+            't': self.tvalues,
+            'P>|t|': self.pvalues,
+            f'[{alpha / 2:g}': ci[0],
+            f'{1 - alpha / 2:g}]': ci[1],
+        })
+
+def _result(names, params, xtx_inv, nobs, rank, ssr, centered_tss):
+    """由系数、(X'X)^-1和残差平方和得到结果对象"""
+    df_resid = nobs - rank
+    scale = ssr / df_resid if df_resid > 0 else np.nan
+    result = OLSResult(pd.Series(params, index=names), scale * xtx_inv, nobs, df_resid, ssr, centered_tss)
+    result.normalized_cov_params = xtx_inv
+    return result
+
+def fit_ols(X, y, names):
+    """单个OLS模型（QR分解；秩亏时与statsmodels一样使用伪逆）"""
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    q, r = np.linalg.qr(X)
+    rank = np.linalg.matrix_rank(r)
+    if rank == X.shape[1]:
+        params = np.linalg.solve(r, q.T @ y)
+        r_inv = np.linalg.solve(r, np.eye(len(r)))
+        xtx_inv = r_inv @ r_inv.T
+    else:
+        params = np.linalg.pinv(X) @ y
+        xtx_inv = np.linalg.pinv(X.T @ X)
+    resid = y - X @ params
+    return _result(names, params, xtx_inv, len(y), rank, resid @ resid, np.sum((y - y.mean()) ** 2))
+
+def solve_normal_equations(xtx, xty, yty, nobs, y_sum, names):
+    """由堆叠的充分统计量(X'X, X'y, y'y, n, sum(y))批量求解多个OLS模型
+
+    xtx为(m, k, k)，xty为(m, k)；先按对角线缩放改善条件数，满秩的模型一次批量Cholesky求解，
+    Cholesky失败（秩亏）的模型逐个用伪逆求解。
+    """
+    xtx = np.asarray(xtx, dtype=float)
+    xty = np.asarray(xty, dtype=float)
+    m, k, _ = xtx.shape
+    diag = np.sqrt(np.maximum(np.einsum('mii->mi', xtx), 1e-300))
+    scaled = xtx / diag[:, :, None] / diag[:, None, :]
+
+    params = np.empty((m, k))
+    xtx_inv = np.empty((m, k, k))
+    ranks = np.full(m, k)
+    try:
+        chol = np.linalg.cholesky(scaled)
+        singular = np.zeros(m, dtype=bool)
+    except np.linalg.LinAlgError:
+        chol = None
+        singular = np.ones(m, dtype=bool)
+    if chol is not None:
+        # 条件数过大的也视为秩亏
+        pivots = np.einsum('mii->mi', chol)
+        singular = pivots.min(axis=1) < 1e-7 * pivots.max(axis=1)
+    regular = ~singular
+    if regular.any():
+        inv_scaled = np.linalg.inv(scaled[regular])
+        xtx_inv[regular] = inv_scaled / diag[regular][:, :, None] / diag[regular][:, None, :]
+        params[regular] = np.einsum('mij,mj->mi', xtx_inv[regular], xty[regular])
+    for i in np.flatnonzero(singular):
+        xtx_inv[i] = np.linalg.pinv(xtx[i])
+        params[i] = xtx_inv[i] @ xty[i]
+        ranks[i] = np.linalg.matrix_rank(xtx[i])
+
+    # 残差平方和：y'y - b'X'y（正规方程成立时）
+    ssr = np.maximum(np.asarray(yty, dtype=float) - np.einsum('mi,mi->m', params, xty), 0)
+    nobs = np.asarray(nobs)
+    centered_tss = np.asarray(yty, dtype=float) - np.asarray(y_sum, dtype=float) ** 2 / nobs
+    return [
+        _result(names, params[i], xtx_inv[i], int(nobs[i]), int(ranks[i]), ssr[i], centered_tss[i])
+        for i in range(m)
+    ]
+
+def fit_ols_batch(designs, names):
+    """批量拟合多个设计矩阵列相同的OLS模型，designs为[(X, y), ...]"""
+    xtx = np.stack([X.T @ X for X, _ in designs])
+    xty = np.stack([X.T @ y for X, y in designs])
+    yty = np.array([y @ y for _, y in designs])
+    nobs = np.array([len(y) for _, y in designs])
+    y_sum = np.array([y.sum() for _, y in designs])
+    return solve_normal_equations(xtx, xty, yty, nobs, y_sum, names)
+
+HC_TYPES = ('HC0', 'HC1', 'HC2', 'HC3')
+
+class RegressionAccumulator:
+    """流式OLS累积器：逐块累积X'X、X'y、y'y和n，可跨分块、进程或城市合并
+
+    第一遍update()后fit()得到系数和经典标准误。稳健（HC）标准误需要残差和杠杆值，
+    用fit()的结果再做一遍update_robust()累积 sum(w_i x_i x_i')，最后robust_fit()。
+    两遍累积的量都只与列数有关，与行数无关。
+    """
+
+    def __init__(self, names):
+        k = len(names)
+        self.names = list(names)
+        self.xtx = np.zeros((k, k))
+        self.xty = np.zeros(k)
+        self.yty = 0.0
+        self.y_sum = 0.0
+        self.n = 0
+        self.meat = np.zeros((k, k))
+        self.robust_n = 0
+        self.cov_type = None
+
+    def update(self, X, y):
+        """第一遍：累积一个分块"""
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.xtx += X.T @ X
+        self.xty += X.T @ y
+        self.yty += y @ y
+        self.y_sum += y.sum()
+        self.n += len(y)
+        return self
+
+    def merge(self, other):
+        """合并另一个累积器（如其他进程或城市的结果）"""
+        if other.names != self.names:
+            raise ValueError("合并的累积器列名不一致")
+        if self.cov_type is not None and other.cov_type is not None and self.cov_type != other.cov_type:
+            raise ValueError("合并的累积器稳健协方差类型不一致")
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.yty += other.yty
+        self.y_sum += other.y_sum
+        self.n += other.n
+        self.meat += other.meat
+        self.robust_n += other.robust_n
+        self.cov_type = self.cov_type or other.cov_type
+        return self
+
+    def subset(self, columns):
+        """只保留部分列的累积器（如删除全为0的列）"""
+        index = [self.names.index(name) for name in columns]
+        subset = RegressionAccumulator(columns)
+        subset.xtx = self.xtx[np.ix_(index, index)].copy()
+        subset.xty = self.xty[index].copy()
+        subset.yty, subset.y_sum, subset.n = self.yty, self.y_sum, self.n
+        subset.meat = self.meat[np.ix_(index, index)].copy()
+        subset.robust_n, subset.cov_type = self.robust_n, self.cov_type
+        return subset
+
+    def fit(self):
+        """由累积的充分统计量求解OLS（经典标准误）"""
+        return solve_normal_equations(
+            self.xtx[None], self.xty[None], [self.yty], [self.n], [self.y_sum], self.names
+        )[0]
+
+    def update_robust(self, X, y, result, cov_type='HC1'):
+        """第二遍：用fit()的系数累积稳健协方差的中间矩阵"""
+        if cov_type not in HC_TYPES:
+            raise ValueError(f"不支持的稳健协方差类型: {cov_type}")
+        X = np.asarray(X, dtype=float)
+        resid = np.asarray(y, dtype=float) - X @ result.params.to_numpy()
+        weights = resid ** 2
+        if cov_type in ('HC2', 'HC3'):
+            leverage = np.einsum('ij,jk,ik->i', X, result.normalized_cov_params, X)
+            weights = weights / (1 - leverage) ** (1 if cov_type == 'HC2' else 2)
+        self.meat += (X * weights[:, None]).T @ X
+        self.robust_n += len(X)
+        self.cov_type = cov_type
+        return self
+
+    def robust_fit(self, result):
+        """夹心估计 (X'X)^-1 M (X'X)^-1 得到稳健标准误（HC1另乘 n/(n-k)）"""
+        if self.cov_type is None or self.robust_n != self.n:
+            raise ValueError("需要先对全部数据调用update_robust()")
+        bread = result.normalized_cov_params
+        cov = bread @ self.meat @ bread
+        if self.cov_type == 'HC1':
+            cov = cov * self.n / result.df_resid
+        robust = OLSResult(
+            result.params, cov, result.nobs, result.df_resid, result.ssr, result.centered_tss,
+            cov_type=self.cov_type
+        )
+        robust.normalized_cov_params = bread
+        return robust
+
+def fit_fixed_effects_model(X, y, groups, names, prefix='fe'):
+    """带一维固定效应（如街区）的OLS：等价于在设计矩阵中加入每个水平一列的虚拟变量（不设常数项）
+
+    虚拟变量以scipy.sparse的one-hot矩阵D表示，不物化n×G的稠密矩阵。由于D'D为对角阵，
+    稀疏正规方程按分块消元求解：先用D做组内去均值得到特征的系数和协方差（k×k），
+    再由组均值回代各水平的截距。组内无变异的特征（被固定效应吸收，如is_manhattan）自动删除。
+    系数、标准误与在稠密虚拟变量设计矩阵上拟合的statsmodels OLS一致。
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    codes, levels = pd.factorize(np.asarray(groups), sort=True)
+    n, G = len(y), len(levels)
+    D = sparse.csr_matrix((np.ones(n), (np.arange(n), codes)), shape=(n, G))
+    counts = np.asarray(D.sum(axis=0)).ravel()
+
+    # 组内去均值（D @ 组均值 即每行所在组的均值）
+    X_within = X - D @ ((D.T @ X) / counts[:, None])
+    y_within = y - D @ ((D.T @ y) / counts)
+
+    # 组内平方和相对总平方和接近0的特征视为被固定效应吸收
+    total_ss = ((X - X.mean(axis=0)) ** 2).sum(axis=0)
+    within_ss = (X_within ** 2).sum(axis=0)
+    kept = within_ss > 1e-10 * np.maximum(total_ss, 1e-300)
+    absorbed = [name for name, keep in zip(names, kept) if not keep]
+    names = [name for name, keep in zip(names, kept) if keep]
+    X, X_within = X[:, kept], X_within[:, kept]
+
+    within = solve_normal_equations(
+        (X_within.T @ X_within)[None], (X_within.T @ y_within)[None], [y_within @ y_within],
+        [n], [0.0], names
+    )[0]
+    beta = within.params.to_numpy()
+    S_inv = within.normalized_cov_params
+
+    # 回代：alpha_g = mean(y_g) - mean(X_g) @ beta；协方差由分块求逆得到
+    A = (D.T @ X) / counts[:, None]
+    alpha = (D.T @ y) / counts - A @ beta
+    cov_ba = -S_inv @ A.T
+    cov_aa = np.diag(1 / counts) + A @ S_inv @ A.T
+    xtx_inv = np.block([[S_inv, cov_ba], [cov_ba.T, cov_aa]])
+
+    level_names = [f'{prefix}[{level}]' for level in levels]
+    rank = n - within.df_resid + G
+    result = _result(
+        names + level_names, np.r_[beta, alpha], xtx_inv, n, rank, within.ssr,
+        np.sum((y - y.mean()) ** 2)
+    )
+    result.absorbed = absorbed
+    result.n_levels = G
+    return result
+
+def parse_formula(formula):
+    """解析简单公式（'y ~ a * b + c'），返回(因变量, 项列表)；a * b 展开为 a、b、a:b"""
+    response, rhs = [part.strip() for part in formula.split('~')]
+    terms = []
+    for term in rhs.split('+'):
+        factors = [factor.strip() for factor in term.split('*')]
+        expanded = factors if len(factors) == 1 else factors + [':'.join(factors)]
+        for name in expanded:
+            if name not in terms:
+                terms.append(name)
+    # 与patsy一致：主效应在前，交互项在后
+    terms.sort(key=lambda name: name.count(':'))
+    return response, terms
+
+def build_design(df, terms, response=None):
+    """由数据框的NumPy列直接构建设计矩阵（含截距，交互项为列的乘积），删除含缺失值的行"""
+    columns = {}
+    for term in terms:
+        for name in term.split(':'):
+            if name not in columns:
+                columns[name] = df[name].to_numpy(dtype=float, na_value=np.nan)
+    design = np.column_stack([np.ones(len(df))] + [
+        np.prod([columns[name] for name in term.split(':')], axis=0) for term in terms
+    ])
+    y = None if response is None else df[response].to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(design).any(axis=1)
+    if y is not None:
+        valid &= ~np.isnan(y)
+        y = y[valid]
+    return design[valid], y
+
+class LineFit:
+    """单变量直线拟合 y = intercept + slope * x（闭式解）"""
+
+    def __init__(self, n, x_mean, y_mean, sxx, sxy, syy):
+        self.n = n
+        self.x_mean = x_mean
+        self.sxx = sxx
+        self.slope = sxy / sxx if sxx > 0 else np.nan
+        self.intercept = y_mean - self.slope * x_mean
+        ssr = max(syy - self.slope * sxy, 0) if sxx > 0 else syy
+        self.r_squared = 1 - ssr / syy if syy > 0 else np.nan
+        self.df_resid = n - 2
+        self.residual_std = np.sqrt(ssr / self.df_resid) if self.df_resid > 0 else np.nan
+
+    def predict(self, x):
+        """预测值"""
+        return self.intercept + self.slope * np.asarray(x, dtype=float)
+
+    def confidence_band(self, x, level=0.95):
+        """回归直线（均值）的逐点置信带，返回(下限, 上限)"""
+        x = np.asarray(x, dtype=float)
+        q = stdtrit(self.df_resid, 1 - (1 - level) / 2) if self.df_resid > 0 else np.nan
+        half = q * self.residual_std * np.sqrt(1 / self.n + (x - self.x_mean) ** 2 / self.sxx)
+        fitted = self.predict(x)
+        return fitted - half, fitted + half
+
+def fit_line(x, y):
+    """单变量线性回归：由（中心化的）累加和直接得到斜率、截距和R²，忽略含缺失值的点"""
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if n == 0:
+        return LineFit(0, np.nan, np.nan, 0.0, 0.0, 0.0)
+    x_mean, y_mean = x.mean(), y.mean()
+    dx, dy = x - x_mean, y - y_mean
+    return LineFit(n, x_mean, y_mean, dx @ dx, dx @ dy, dy @ dy)
 
 def fit_interaction_model(df, formula):
-    """拟合交互效应模型"""
-    model = ols(formula, data=df).fit()
-    return model
+    """拟合交互效应模型（如 'price ~ accommodates * is_entire'）"""
+    response, terms = parse_formula(formula)
+    X, y = build_design(df, terms, response)
+    return fit_ols(X, y, ['Intercept'] + terms)
+
+def fit_interaction_models(frames, formula):
+    """对多个数据框（如各城市）批量拟合同一交互效应模型，返回{键: 结果}"""
+    response, terms = parse_formula(formula)
+    keys = list(frames)
+    designs = [build_design(frames[key], terms, response) for key in keys]
+    results = fit_ols_batch(designs, ['Intercept'] + terms)
+    return dict(zip(keys, results))
 
 def fit_log_linear_model(X, y_log):
     """拟合对数线性模型"""
-    X_with_const = sm.add_constant(X)
-    model = sm.OLS(y_log, X_with_const).fit()
-    return model
+    names = ['const'] + list(X.columns)
+    X_with_const = np.column_stack([np.ones(len(X)), X.to_numpy(dtype=float)])
+    return fit_ols(X_with_const, np.asarray(y_log, dtype=float), names)
@@ -1,17 +1,253 @@
 """非参数平滑模型"""
 from statsmodels.nonparametric.smoothers_lowess import lowess
 from scipy.stats import gaussian_kde
+from scipy import fft
 import numpy as np
+import pandas as pd
 
-def fit_lowess(x, y, frac=0.3):
-    """LOWESS平滑"""
-    sorted_idx = np.argsort(x)
+from airbnb_analysis.config.settings import SMOOTHING_CONFIG
+
+# 分箱LOWESS：相同x值的点合并为一个箱，箱内保存（稳健权重加权的）点数、y之和，
+# 局部加权回归的各项和式按箱累加即可，与逐点计算的结果相同；
+# 拟合只在锚点（不同x值、delta跳跃后的点或等距网格）上进行，其余位置线性插值
+
+def _tricube(u):
+    """三次立方核 (1 - |u|^3)^3"""
+    u = np.clip(np.abs(u), 0, 1)
+    return (1 - u ** 3) ** 3
+
+def _bisquare_weights(residuals):
+    """残差的双平方稳健权重（与statsmodels一致）"""
+    abs_resid = np.abs(residuals)
+    median = np.median(abs_resid)
+    if median == 0:
+        scaled = (abs_resid > 0).astype(float)
+    else:
+        scaled = np.minimum(abs_resid / (6.0 * median), 1.0)
+    return (1 - scaled ** 2) ** 2
+
+def _neighbourhood_radius(x_sorted, anchors, k):
+    """各锚点的邻域半径：到第k近的点的距离（各锚点同时二分查找k近邻窗口的左端）"""
+    n = len(x_sorted)
+    position = np.searchsorted(x_sorted, anchors)
+    lo = np.clip(position - k, 0, n - k)
+    hi = np.clip(position, 0, n - k)
+    # 找到满足 anchor - x[l] <= x[l+k] - anchor 的最小l（l = n-k时恒成立）
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        right = x_sorted[np.minimum(mid + k, n - 1)]
+        shift = (mid + k < n) & (anchors - x_sorted[mid] > right - anchors)
+        lo = np.where(shift & (lo < hi), mid + 1, lo)
+        hi = np.where(~shift & (lo < hi), mid, hi)
+    return np.maximum(anchors - x_sorted[lo], x_sorted[lo + k - 1] - anchors)
+
+def _select_anchors(bin_x, delta):
+    """delta跳跃：从上一个拟合点起，相距delta以内的最后一个点作为下一个拟合点"""
+    if delta <= 0:
+        return bin_x
+    indices = [0]
+    while indices[-1] < len(bin_x) - 1:
+        last = indices[-1]
+        k = np.searchsorted(bin_x, bin_x[last] + delta, side='right')
+        indices.append(max(k - 1, last + 1))
+    return bin_x[indices]
+
+def _fit_anchors(anchors, radius, bin_x, bin_weight, bin_wy):
+    """在各锚点上做局部加权线性回归（按箱累加和式）"""
+    left = np.searchsorted(bin_x, anchors - radius, side='left')
+    right = np.searchsorted(bin_x, anchors + radius, side='right')
+    fitted = np.full(len(anchors), np.nan)
+    for i, (anchor, r, lo, hi) in enumerate(zip(anchors, radius, left, right)):
+        x = bin_x[lo:hi]
+        kernel = _tricube((x - anchor) / r) if r > 0 else (x == anchor).astype(float)
+        # 箱的权重为核权重乘以箱内稳健权重之和，加权y之和同理
+        w = kernel * bin_weight[lo:hi]
+        wy = kernel * bin_wy[lo:hi]
+        total = w.sum()
+        if total <= 1e-12:
+            continue
+        x_mean = np.dot(w, x) / total
+        y_mean = wy.sum() / total
+        sqdev = max(np.dot(w, (x - x_mean) ** 2) / total, 1e-12)
+        slope = np.dot(x - x_mean, wy) / total / sqdev
+        fitted[i] = y_mean + (anchor - x_mean) * slope
+    return fitted
+
+def _binned_lowess(x_sorted, y_sorted, frac, iterations, delta, grid_size=None):
+    """分箱LOWESS，返回每个（已排序）点上的拟合值"""
+    n = len(x_sorted)
+    k = min(max(int(frac * n + 1e-10), 2), n)
+
+    bin_x, bin_count = np.unique(x_sorted, return_counts=True)
+    bin_index = np.repeat(np.arange(len(bin_x)), bin_count)
+    if grid_size is not None:
+        anchors = np.linspace(bin_x[0], bin_x[-1], grid_size)
+    else:
+        anchors = _select_anchors(bin_x, delta)
+    radius = _neighbourhood_radius(x_sorted, anchors, k)
+
+    robust = np.ones(n)
+    for _ in range(iterations + 1):
+        bin_weight = np.bincount(bin_index, weights=robust, minlength=len(bin_x))
+        bin_wy = np.bincount(bin_index, weights=robust * y_sorted, minlength=len(bin_x))
+        anchor_fit = _fit_anchors(anchors, radius, bin_x, bin_weight, bin_wy)
+        valid = ~np.isnan(anchor_fit)
+        if not valid.any():
+            break
+        fitted = np.interp(bin_x, anchors[valid], anchor_fit[valid])[bin_index]
+        robust = _bisquare_weights(y_sorted - fitted)
+    return fitted
+
+def lowess_deviation(x_sorted, y_sorted, fitted, frac=0.3):
+    """近似LOWESS与精确结果（statsmodels逐点计算）的最大偏差，以y的取值范围为单位"""
+    exact = lowess(y_sorted, x_sorted, frac=frac, it=SMOOTHING_CONFIG['lowess_iterations'], return_sorted=False)
+    y_range = np.ptp(y_sorted)
+    return np.max(np.abs(fitted - exact)) / (y_range if y_range > 0 else 1.0)
+
+def fit_lowess(x, y, frac=0.3, method=None):
+    """LOWESS平滑（method见SMOOTHING_CONFIG['lowess_method']）"""
+    config = SMOOTHING_CONFIG
+    if method is None:
+        method = config['lowess_method']
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    sorted_idx = np.argsort(x, kind='mergesort')
     x_sorted = x[sorted_idx]
     y_sorted = y[sorted_idx]
-    result = lowess(y_sorted, x_sorted, frac=frac)
-    return result[:, 0], result[:, 1]
 
-def fit_kde(data):
-    """核密度估计"""
-    kde = gaussian_kde(data)
-    return kde
+    if method == 'exact' or len(x_sorted) < 2:
+        result = lowess(y_sorted, x_sorted, frac=frac, it=config['lowess_iterations'])
+        return result[:, 0], result[:, 1]
+
+    if method == 'binned' and len(np.unique(x_sorted)) > config['lowess_grid_min_bins']:
+        method = 'grid'
+    delta = config['lowess_delta_frac'] * np.ptp(x_sorted)
+    grid_size = config['lowess_grid_size'] if method == 'grid' else None
+    fitted = _binned_lowess(x_sorted, y_sorted, frac, config['lowess_iterations'], delta, grid_size)
+
+    if config['lowess_tolerance'] is not None:
+        deviation = lowess_deviation(x_sorted, y_sorted, fitted, frac)
+        if deviation > config['lowess_tolerance']:
+            print(f"  ⚠ LOWESS近似偏差 {deviation:.2e} 超过容差 {config['lowess_tolerance']:.0e}")
+    return x_sorted, fitted
+
+# 分箱KDE：数据线性分箱到等距网格后与高斯核做FFT卷积，复杂度O(n + m log m)，
+# 与求值点数无关；带宽规则与gaussian_kde一致（Scott / Silverman / 标量因子）
+
+def kde_bandwidth(values, bw_method=None):
+    """一维gaussian_kde的带宽（核标准差）"""
+    n = len(values)
+    if bw_method is None or bw_method == 'scott':
+        factor = n ** (-1 / 5)
+    elif bw_method == 'silverman':
+        factor = (n * 3 / 4) ** (-1 / 5)
+    elif np.isscalar(bw_method):
+        factor = float(bw_method)
+    else:
+        raise ValueError(f"不支持的带宽规则: {bw_method}")
+    return np.std(values, ddof=1) * factor if n > 1 else 0.0
+
+def _linear_bin(values, codes, n_groups, start, step, size):
+    """按组线性分箱：每个值按距离分配到相邻两个网格点（各组计数归一化为1）"""
+    position = (values - start) / step
+    lower = np.clip(np.floor(position).astype(np.int64), 0, size - 2)
+    upper_weight = np.clip(position - lower, 0, 1)
+    offsets = codes * size + lower
+    counts = np.bincount(offsets, weights=1 - upper_weight, minlength=n_groups * size)
+    counts += np.bincount(offsets + 1, weights=upper_weight, minlength=n_groups * size)
+    counts = counts.reshape(n_groups, size)
+    totals = counts.sum(axis=1, keepdims=True)
+    return counts / np.where(totals > 0, totals, 1)
+
+def _gaussian_smooth(counts, bandwidths, step):
+    """各组分箱计数与各自带宽的高斯核做FFT卷积（补零避免循环卷积回绕）"""
+    n_groups, size = counts.shape
+    padded = 2 * size
+    offsets = np.minimum(np.arange(padded), padded - np.arange(padded)) * step
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kernels = np.exp(-0.5 * (offsets[None, :] / bandwidths[:, None]) ** 2) / (
+            np.sqrt(2 * np.pi) * bandwidths[:, None]
+        )
+    kernels = np.where(bandwidths[:, None] > 0, kernels, 0)
+    smoothed = fft.irfft(fft.rfft(counts, padded, axis=1) * fft.rfft(kernels, axis=1), padded, axis=1)
+    return np.maximum(smoothed[:, :size], 0)
+
+class BinnedKDE:
+    """分箱核密度估计（接口与gaussian_kde的一维用法一致：kde(points)返回密度）"""
+
+    def __init__(self, data, bw_method=None, grid_size=None, cut=None):
+        if grid_size is None:
+            grid_size = SMOOTHING_CONFIG['kde_grid_size']
+        if cut is None:
+            cut = SMOOTHING_CONFIG['kde_cut']
+        self.dataset = np.asarray(data, dtype=float).ravel()
+        self.n = len(self.dataset)
+        self.bandwidth = kde_bandwidth(self.dataset, bw_method)
+        self.factor = self.bandwidth / np.std(self.dataset, ddof=1) if self.bandwidth > 0 else np.nan
+        self.covariance = np.array([[self.bandwidth ** 2]])
+
+        low = self.dataset.min() - cut * self.bandwidth
+        high = self.dataset.max() + cut * self.bandwidth
+        self.grid = np.linspace(low, high, grid_size)
+        step = (high - low) / (grid_size - 1) if high > low else 1.0
+        counts = _linear_bin(self.dataset, np.zeros(self.n, dtype=np.int64), 1, low, step, grid_size)
+        self.density = _gaussian_smooth(counts, np.array([self.bandwidth]), step)[0]
+
+    def evaluate(self, points):
+        """在任意点上求密度（网格上线性插值，网格外为0）"""
+        return np.interp(np.asarray(points, dtype=float), self.grid, self.density, left=0, right=0)
+
+    __call__ = evaluate
+
+def grouped_kde(values, groups, bw_method=None, cut=None, grid_size=None, order=None):
+    """多组密度一次计算：共用网格，全部分箱一次bincount，各组卷积一次批量FFT
+
+    返回(网格, 各组密度矩阵, 各组[下限, 上限]支撑范围, 分组标签)，支撑范围外的密度为0
+    （与seaborn小提琴图一致：每组在其数据范围外延伸cut倍带宽）。
+    """
+    if cut is None:
+        cut = SMOOTHING_CONFIG['kde_cut']
+    if grid_size is None:
+        grid_size = SMOOTHING_CONFIG['kde_grid_size']
+    values = np.asarray(values, dtype=float)
+    groups = pd.Series(groups)
+    if order is None:
+        codes, labels = pd.factorize(groups, sort=isinstance(groups.dtype, pd.CategoricalDtype))
+    else:
+        labels = pd.Index(order)
+        codes = labels.get_indexer(groups)
+    valid = (codes >= 0) & ~np.isnan(values)
+    values, codes = values[valid], codes[valid]
+    n_groups = len(labels)
+
+    # 各组带宽与支撑范围（按组排序一次）
+    order_idx = np.lexsort((values, codes))
+    sorted_values, sorted_codes = values[order_idx], codes[order_idx]
+    sizes = np.bincount(sorted_codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    bandwidths = np.zeros(n_groups)
+    supports = np.full((n_groups, 2), np.nan)
+    for g in np.flatnonzero(sizes > 0):
+        group_values = sorted_values[starts[g]:starts[g] + sizes[g]]
+        bandwidths[g] = kde_bandwidth(group_values, bw_method)
+        supports[g] = group_values[0] - cut * bandwidths[g], group_values[-1] + cut * bandwidths[g]
+
+    if not (sizes > 0).any():
+        return np.empty(0), np.zeros((n_groups, 0)), supports, labels
+
+    low, high = np.nanmin(supports[:, 0]), np.nanmax(supports[:, 1])
+    grid = np.linspace(low, high, grid_size)
+    step = (high - low) / (grid_size - 1) if high > low else 1.0
+    counts = _linear_bin(values, codes, n_groups, low, step, grid_size)
+    densities = _gaussian_smooth(counts, bandwidths, step)
+    outside = (grid[None, :] < supports[:, :1]) | (grid[None, :] > supports[:, 1:])
+    densities[outside | ~(sizes > 0)[:, None]] = 0
+    return grid, densities, supports, labels
+
+def fit_kde(data, bw_method=None, method=None):
+    """核密度估计（method见SMOOTHING_CONFIG['kde_method']）"""
+    if method is None:
+        method = SMOOTHING_CONFIG['kde_method']
+    if method == 'exact':
+        return gaussian_kde(data, bw_method=bw_method)
+    return BinnedKDE(data, bw_method=bw_method)
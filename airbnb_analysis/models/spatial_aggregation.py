@@ -0,0 +1,165 @@
+"""空间聚合 - 六边形网格单元编号的向量化分配和按单元的一次排序分组统计"""
+import numpy as np
+import pandas as pd
+
+from airbnb_analysis.config.settings import HEXBIN_CONFIG
+
+# 六边形顶点（以单元横向间距sx、纵向间距sy/3为单位，与matplotlib hexbin一致）
+_HEXAGON = np.array([[.5, -.5], [.5, .5], [0., 1.], [-.5, .5], [-.5, -.5], [0., -1.]])
+
+def segment_quantiles(values, segments, n_segments, quantiles):
+    """一次排序计算每个分段的多个分位数（线性插值，与np.quantile默认方法一致）
+
+    忽略NaN和负编码。返回(每个分段的样本数, 形状为(len(quantiles), n_segments)的分位数，空分段为NaN)。
+    """
+    values = np.asarray(values, dtype=float)
+    segments = np.asarray(segments, dtype=np.int64)
+    valid = ~np.isnan(values) & (segments >= 0)
+    values = values[valid]
+    segments = segments[valid]
+
+    # 按（分段，数值）排序后，每个分段的分位数位于其区间内的固定相对位置
+    sorted_values = values[np.lexsort((values, segments))]
+    counts = np.bincount(segments, minlength=n_segments)
+    starts = np.cumsum(counts) - counts
+
+    result = np.full((len(quantiles), n_segments), np.nan)
+    nonempty = counts > 0
+    starts = starts[nonempty]
+    last = counts[nonempty] - 1
+    for i, q in enumerate(quantiles):
+        position = q * last
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, last)
+        weight = position - lower
+        low_values = sorted_values[starts + lower]
+        high_values = sorted_values[starts + upper]
+        result[i, nonempty] = low_values + (high_values - low_values) * weight
+    return counts, result
+
+def _widen_range(vmin, vmax, expander=0.1, tiny=1e-15):
+    """范围退化（宽度相对端点几乎为0）时向两侧扩展，与hexbin确定网格范围的方式一致"""
+    vmin, vmax = float(vmin), float(vmax)
+    max_abs = max(abs(vmin), abs(vmax))
+    if max_abs < (1e6 / tiny) * np.finfo(float).tiny:
+        return -expander, expander
+    if vmax - vmin <= max_abs * tiny:
+        return vmin - expander * abs(vmin), vmax + expander * abs(vmax)
+    return vmin, vmax
+
+class HexGrid:
+    """覆盖矩形范围的六边形网格（几何与matplotlib hexbin相同）
+
+    单元由两套格点组成：第一套位于整数格点(i, j)，第二套位于(i+0.5, j+0.5)，
+    每个点分配给两套中距离最近的格点。范围固定后网格可用于多个图和多个城市，
+    同一单元编号在不同数据集上对应同一位置。
+    """
+
+    def __init__(self, extent, gridsize=None):
+        if gridsize is None:
+            gridsize = HEXBIN_CONFIG['gridsize']
+        if np.iterable(gridsize):
+            nx, ny = gridsize
+        else:
+            nx = gridsize
+            ny = int(nx / np.sqrt(3))
+        xmin, xmax, ymin, ymax = (float(v) for v in extent)
+        if xmin > xmax or ymin > ymax:
+            raise ValueError(f"网格范围无效: {extent}")
+
+        # 横向上六边形恰好覆盖[xmin, xmax]，略加扩展避免舍入误差
+        padding = 1.e-9 * (xmax - xmin)
+        self.xmin = xmin - padding
+        self.xmax = xmax + padding
+        self.ymin = ymin
+        self.ymax = ymax
+        self.nx = nx
+        self.ny = ny
+        self.sx = (self.xmax - self.xmin) / nx
+        self.sy = (ymax - ymin) / ny
+        self.n_first = (nx + 1) * (ny + 1)
+        self.n_cells = self.n_first + nx * ny
+
+    @classmethod
+    def from_points(cls, x, y, gridsize=None):
+        """由数据点的范围构建网格（范围退化时两侧扩展，与hexbin相同）"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        finite = np.isfinite(x) & np.isfinite(y)
+        if finite.any():
+            xmin, xmax = _widen_range(x[finite].min(), x[finite].max())
+            ymin, ymax = _widen_range(y[finite].min(), y[finite].max())
+        else:
+            xmin, xmax, ymin, ymax = 0., 1., 0., 1.
+        return cls((xmin, xmax, ymin, ymax), gridsize)
+
+    @property
+    def extent(self):
+        return self.xmin, self.xmax, self.ymin, self.ymax
+
+    def cell_ids(self, x, y):
+        """每个点所在单元的编号（范围外或坐标缺失为-1）"""
+        nx1, ny1 = self.nx + 1, self.ny + 1
+        with np.errstate(invalid='ignore'):
+            ix = (np.asarray(x, dtype=float) - self.xmin) / self.sx
+            iy = (np.asarray(y, dtype=float) - self.ymin) / self.sy
+            finite = np.isfinite(ix) & np.isfinite(iy)
+            ix = np.where(finite, ix, -1.)
+            iy = np.where(finite, iy, -1.)
+
+        ix1 = np.round(ix).astype(np.int64)
+        iy1 = np.round(iy).astype(np.int64)
+        ix2 = np.floor(ix).astype(np.int64)
+        iy2 = np.floor(iy).astype(np.int64)
+        id1 = np.where((ix1 >= 0) & (ix1 < nx1) & (iy1 >= 0) & (iy1 < ny1), ix1 * ny1 + iy1, -1)
+        id2 = np.where((ix2 >= 0) & (ix2 < self.nx) & (iy2 >= 0) & (iy2 < self.ny),
+                       self.n_first + ix2 * self.ny + iy2, -1)
+
+        # 纵向距离按六边形的宽高比加权后比较到两套格点的距离
+        d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+        d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+        return np.where(finite, np.where(d1 < d2, id1, id2), -1)
+
+    def centers(self, cell_ids):
+        """单元编号对应的中心坐标(x, y)"""
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        second = cell_ids >= self.n_first
+        local = np.where(second, cell_ids - self.n_first, cell_ids)
+        rows = np.where(second, self.ny, self.ny + 1)
+        offset = np.where(second, 0.5, 0.)
+        cx = self.xmin + (local // rows + offset) * self.sx
+        cy = self.ymin + (local % rows + offset) * self.sy
+        return cx, cy
+
+    def polygon(self):
+        """以单元中心为原点的六边形顶点（数据坐标）"""
+        return [self.sx, self.sy / 3] * _HEXAGON
+
+    def aggregate(self, x, y, values, min_count=None):
+        """按单元统计数值的样本数、中位数和四分位数，返回单元表（每个非空单元一行，按编号排序）
+
+        所有单元的统计量由一次排序计算；值缺失的点不计入。min_count为单元最少样本数。
+        """
+        if min_count is None:
+            min_count = HEXBIN_CONFIG['min_count']
+        counts, (q1, median, q3) = segment_quantiles(
+            values, self.cell_ids(x, y), self.n_cells, (0.25, 0.5, 0.75)
+        )
+        cell_ids = np.flatnonzero(counts >= max(min_count, 1))
+        cx, cy = self.centers(cell_ids)
+        return pd.DataFrame({
+            'cell_id': cell_ids,
+            'x': cx,
+            'y': cy,
+            'count': counts[cell_ids],
+            'median': median[cell_ids],
+            'q1': q1[cell_ids],
+            'q3': q3[cell_ids],
+            'iqr': q3[cell_ids] - q1[cell_ids],
+        })
+
+def aggregate_hex_cells(x, y, values, grid=None, gridsize=None, min_count=None):
+    """点数据的六边形单元统计，返回(网格, 单元表)；未给出网格时按数据范围构建"""
+    if grid is None:
+        grid = HexGrid.from_points(x, y, gridsize)
+    return grid, grid.aggregate(x, y, values, min_count)
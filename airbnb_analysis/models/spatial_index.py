@@ -0,0 +1,300 @@
+"""空间索引 - 房源坐标上的KD树，支持按大圆距离的批量半径查询和k近邻查询"""
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from airbnb_analysis.config.settings import SPATIAL_CONFIG
+from airbnb_analysis.config.constants import FEATURE_COLS
+from airbnb_analysis.data.cache import _safe_city_name
+
+# 数据框指纹的字节数（缓存文件名中为两倍长度的十六进制串）
+FINGERPRINT_SIZE = 16
+
+# 地球平均半径（公里）
+EARTH_RADIUS_KM = 6371.0088
+
+# 经纬度映射到单位球面上的三维坐标后，欧氏（弦）距离是大圆（haversine）距离的单调函数：
+# chord = 2 sin(d / 2R)，因此KD树上的k近邻和半径查询与按haversine距离查询结果完全一致
+
+def to_unit_vectors(latitude, longitude):
+    """经纬度（度）转换为单位球面上的三维坐标"""
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def km_to_chord(distance_km):
+    """大圆距离（公里）转换为单位球面上的弦长"""
+    return 2 * np.sin(np.minimum(np.asarray(distance_km, dtype=float) / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+def chord_to_km(chord):
+    """弦长转换为大圆距离（公里）"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=float) / 2, 0, 1))
+
+def _broadcast(value, m):
+    """筛选条件扩展为每个查询一个值（标量或None时所有查询相同）"""
+    if value is None or np.ndim(value) == 0:
+        return np.full(m, value, dtype=object)
+    value = np.asarray(value, dtype=object)
+    if len(value) != m:
+        raise ValueError(f"筛选条件长度 {len(value)} 与查询数 {m} 不一致")
+    return value
+
+class SpatialIndex:
+    """一个城市的房源空间索引
+
+    全部房源建一棵KD树；按房型、容纳人数筛选的查询在对应子集上各建一棵树（首次使用时构建并保留），
+    筛选条件可以对每个查询不同，按条件分组后批量查询。返回的位置为构建时数据框中的行位置。
+    """
+
+    def __init__(self, latitude, longitude, prices=None, room_type=None, accommodates=None, leafsize=None):
+        if leafsize is None:
+            leafsize = SPATIAL_CONFIG['leafsize']
+        latitude = np.asarray(latitude, dtype=float)
+        longitude = np.asarray(longitude, dtype=float)
+        valid = np.isfinite(latitude) & np.isfinite(longitude)
+
+        self.leafsize = leafsize
+        self.n_rows = len(latitude)
+        self.positions = np.flatnonzero(valid)
+        self.points = to_unit_vectors(latitude[valid], longitude[valid])
+        self.prices = None if prices is None else np.asarray(prices, dtype=float)
+        self.room_type = None if room_type is None else np.asarray(room_type, dtype=object)[valid]
+        self.accommodates = None if accommodates is None else np.asarray(accommodates, dtype=float)[valid]
+        self._trees = {}
+
+    @classmethod
+    def from_frame(cls, df, leafsize=None):
+        """由清洗后的城市数据框构建"""
+        def column(name):
+            col = FEATURE_COLS[name]
+            return df[col].to_numpy(dtype=object if name == 'room_type' else float, na_value=np.nan) \
+                if col in df.columns else None
+        return cls(
+            column('latitude'), column('longitude'), column('price'),
+            column('room_type'), column('accommodates'), leafsize
+        )
+
+    @property
+    def n_trees(self):
+        """已构建的KD树数（全部房源和各筛选子集）"""
+        return len(self._trees)
+
+    def _segment(self, room_type=None, accommodates=None):
+        """筛选条件对应的(KD树, 子集在self.points中的下标)，首次使用时构建"""
+        key = (room_type, accommodates)
+        if key not in self._trees:
+            mask = np.ones(len(self.points), dtype=bool)
+            if room_type is not None:
+                if self.room_type is None:
+                    raise ValueError("构建索引时没有提供房型")
+                mask &= self.room_type == room_type
+            if accommodates is not None:
+                if self.accommodates is None:
+                    raise ValueError("构建索引时没有提供容纳人数")
+                mask &= self.accommodates == accommodates
+            local = np.flatnonzero(mask)
+            tree = cKDTree(self.points[local], leafsize=self.leafsize) if len(local) else None
+            self._trees[key] = (tree, local)
+        return self._trees[key]
+
+    def _groups(self, m, room_type, accommodates):
+        """按筛选条件对查询分组，返回[(房型, 容纳人数, 查询下标), ...]"""
+        if np.ndim(room_type) == 0 and np.ndim(accommodates) == 0:
+            # 所有查询筛选条件相同（单个实时查询的常见情形），不需要分组
+            return [(room_type, accommodates, np.arange(m))]
+        room_types = _broadcast(room_type, m)
+        accommodates = _broadcast(accommodates, m)
+        keys = pd.DataFrame({'room_type': room_types, 'accommodates': accommodates})
+        groups = keys.groupby(['room_type', 'accommodates'], dropna=False, sort=False).indices
+        result = []
+        for (group_room_type, group_accommodates), index in groups.items():
+            result.append((
+                None if pd.isna(group_room_type) else group_room_type,
+                None if pd.isna(group_accommodates) else group_accommodates,
+                index,
+            ))
+        return result
+
+    def query_knn(self, latitude, longitude, k, room_type=None, accommodates=None, exclude=None):
+        """批量k近邻查询，返回(距离公里数, 行位置)，均为(m, k)；不足k个时距离为inf、位置为-1
+
+        exclude为每个查询要排除的行位置（如查询点本身所在的行，-1表示不排除）。
+        """
+        query_points = to_unit_vectors(np.atleast_1d(latitude), np.atleast_1d(longitude))
+        m = len(query_points)
+        distances = np.full((m, k), np.inf)
+        positions = np.full((m, k), -1, dtype=np.int64)
+        exclude = None if exclude is None else np.broadcast_to(np.asarray(exclude, dtype=np.int64), (m,))
+        extra = 0 if exclude is None else 1
+
+        finite = np.isfinite(query_points).all(axis=1)
+        for group_room_type, group_accommodates, index in self._groups(m, room_type, accommodates):
+            tree, local = self._segment(group_room_type, group_accommodates)
+            index = index[finite[index]]
+            if tree is None or len(index) == 0:
+                continue
+            chord, hits = tree.query(query_points[index], k=k + extra)
+            chord = chord.reshape(len(index), k + extra)
+            hits = hits.reshape(len(index), k + extra)
+            # 子集中不足k个时cKDTree返回的下标为len(local)
+            keep = hits < len(local)
+            hit_positions = np.where(keep, self.positions[local[np.minimum(hits, len(local) - 1)]], -1)
+            if exclude is not None:
+                # 排除指定行后按距离顺序保留前k个
+                keep &= hit_positions != exclude[index][:, None]
+                order = np.argsort(~keep, axis=1, kind='stable')[:, :k]
+                keep = np.take_along_axis(keep, order, axis=1)
+                chord = np.take_along_axis(chord, order, axis=1)
+                hit_positions = np.take_along_axis(hit_positions, order, axis=1)
+            distances[index] = np.where(keep, chord_to_km(chord), np.inf)
+            positions[index] = np.where(keep, hit_positions, -1)
+        return distances, positions
+
+    def query_radius(self, latitude, longitude, radius_km, room_type=None, accommodates=None):
+        """批量半径查询，返回每个查询在radius_km公里内的行位置数组列表"""
+        query_points = to_unit_vectors(np.atleast_1d(latitude), np.atleast_1d(longitude))
+        m = len(query_points)
+        radius = km_to_chord(radius_km)
+        results = [np.empty(0, dtype=np.int64)] * m
+
+        finite = np.isfinite(query_points).all(axis=1)
+        for group_room_type, group_accommodates, index in self._groups(m, room_type, accommodates):
+            tree, local = self._segment(group_room_type, group_accommodates)
+            index = index[finite[index]]
+            if tree is None or len(index) == 0:
+                continue
+            group_radius = radius if np.ndim(radius) == 0 else radius[index]
+            for i, hits in zip(index, tree.query_ball_point(query_points[index], group_radius, return_sorted=True)):
+                results[i] = self.positions[local[np.asarray(hits, dtype=np.int64)]]
+        return results
+
+    def comparable_median(self, latitude, longitude, k=None, room_type=None, accommodates=None, exclude=None):
+        """k个最近可比房源的价格中位数（如最近50个同房型、同容纳人数的房源），没有可比房源时为NaN"""
+        if self.prices is None:
+            raise ValueError("构建索引时没有提供价格")
+        if k is None:
+            k = SPATIAL_CONFIG['comparable_k']
+        _, positions = self.query_knn(latitude, longitude, k, room_type, accommodates, exclude)
+        prices = np.where(positions >= 0, self.prices[np.maximum(positions, 0)], np.nan)
+        if not np.isnan(prices).any():
+            return np.median(prices, axis=1)
+        medians = np.full(len(prices), np.nan)
+        found = ~np.isnan(prices).all(axis=1)
+        medians[found] = np.nanmedian(prices[found], axis=1)
+        return medians
+
+    def save(self, path):
+        """保存到磁盘（np.savez格式：坐标、筛选列和各子集的下标，读取时重建KD树）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            'leafsize': np.array(self.leafsize),
+            'n_rows': np.array(self.n_rows),
+            'positions': self.positions,
+            'points': self.points,
+        }
+        if self.prices is not None:
+            arrays['prices'] = self.prices
+        if self.room_type is not None:
+            missing = pd.isna(self.room_type)
+            arrays['room_type'] = np.where(missing, '', self.room_type).astype(str)
+            arrays['room_type_missing'] = missing
+        if self.accommodates is not None:
+            arrays['accommodates'] = self.accommodates
+
+        # 已构建的子集：筛选条件和子集下标（按偏移拼接）
+        keys = list(self._trees)
+        locals_ = [self._trees[key][1] for key in keys]
+        arrays['segment_room_type'] = np.array(['' if r is None else str(r) for r, _ in keys], dtype=str)
+        arrays['segment_has_room_type'] = np.array([r is not None for r, _ in keys], dtype=bool)
+        arrays['segment_accommodates'] = np.array([np.nan if a is None else a for _, a in keys], dtype=float)
+        arrays['segment_offsets'] = np.cumsum([0] + [len(local) for local in locals_]).astype(np.int64)
+        arrays['segment_local'] = np.concatenate(locals_).astype(np.int64) if locals_ else np.empty(0, dtype=np.int64)
+
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """从磁盘读取（不执行缓存文件中的任何代码），按保存的子集下标重建KD树"""
+        with np.load(path, allow_pickle=False) as data:
+            index = cls.__new__(cls)
+            index.leafsize = int(data['leafsize'])
+            index.n_rows = int(data['n_rows'])
+            index.positions = data['positions']
+            index.points = data['points']
+            index.prices = data['prices'] if 'prices' in data else None
+            index.room_type = None
+            if 'room_type' in data:
+                index.room_type = data['room_type'].astype(object)
+                index.room_type[data['room_type_missing']] = None
+            index.accommodates = data['accommodates'] if 'accommodates' in data else None
+
+            index._trees = {}
+            offsets = data['segment_offsets']
+            for i, (room_type, has_room_type, accommodates) in enumerate(zip(
+                data['segment_room_type'], data['segment_has_room_type'], data['segment_accommodates']
+            )):
+                key = (str(room_type) if has_room_type else None,
+                       None if np.isnan(accommodates) else float(accommodates))
+                local = data['segment_local'][offsets[i]:offsets[i + 1]]
+                tree = cKDTree(index.points[local], leafsize=index.leafsize) if len(local) else None
+                index._trees[key] = (tree, local)
+        return index
+
+def frame_fingerprint(df):
+    """由索引用到的列内容计算数据框指纹（清洗结果变化时缓存失效）"""
+    hasher = hashlib.blake2b(digest_size=FINGERPRINT_SIZE)
+    for name in ('latitude', 'longitude', 'price', 'room_type', 'accommodates'):
+        col = FEATURE_COLS[name]
+        if col in df.columns:
+            values = df[col].astype(str) if name == 'room_type' else df[col].astype(float)
+            hasher.update(name.encode('utf-8'))
+            hasher.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    hasher.update(str(SPATIAL_CONFIG['leafsize']).encode('utf-8'))
+    return hasher.hexdigest()
+
+def spatial_index_cache_path(df, city_name, cache_dir=None):
+    """城市空间索引的缓存文件路径（由数据内容指纹区分）"""
+    if cache_dir is None:
+        cache_dir = SPATIAL_CONFIG['cache_dir']
+    return Path(cache_dir) / f"{_safe_city_name(city_name)}_{frame_fingerprint(df)}.npz"
+
+def load_or_build_spatial_index(df, city_name, cache_dir=None):
+    """读取城市的空间索引缓存，未命中（或数据已变化）时构建并写入缓存
+
+    查询中新建了子集KD树后可再次调用save_spatial_index，使缓存包含这些树。
+    """
+    if cache_dir is None:
+        cache_dir = SPATIAL_CONFIG['cache_dir']
+    cache_path = spatial_index_cache_path(df, city_name, cache_dir)
+
+    if SPATIAL_CONFIG['cache'] and cache_path.exists():
+        try:
+            return SpatialIndex.load(cache_path)
+        except Exception as e:
+            print(f"  ⚠ 空间索引缓存读取失败，将重新构建: {e}")
+
+    index = SpatialIndex.from_frame(df)
+    if SPATIAL_CONFIG['cache']:
+        # 删除同一城市的过期缓存（指纹长度不符的是名称以该城市开头的其他城市）
+        prefix = f"{_safe_city_name(city_name)}_"
+        for old_file in Path(cache_dir).glob(f"{prefix}*.npz"):
+            stem = old_file.name[len(prefix):].split('.')[0]
+            if len(stem) == 2 * FINGERPRINT_SIZE and old_file != cache_path:
+                old_file.unlink()
+        index.save(cache_path)
+    return index
+
+def save_spatial_index(index, df, city_name, cache_dir=None):
+    """将（已构建了子集KD树的）空间索引写回城市缓存"""
+    if SPATIAL_CONFIG['cache']:
+        index.save(spatial_index_cache_path(df, city_name, cache_dir))
+    return index
@@ -1,50 +1,202 @@
 """统计检验模型"""
-from scipy.stats import mannwhitneyu, kruskal, spearmanr
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+from scipy.stats import mannwhitneyu, chi2, rankdata
 
-def test_privacy_premium(df, price_col='price', room_type_col='room_type'):
-    """测试隐私溢价（Mann-Whitney U检验）"""
-    entire_home = df[df[room_type_col] == 'Entire home/apt'][price_col].dropna()
-    private_room = df[df[room_type_col] == 'Private room'][price_col].dropna()
+from airbnb_analysis.models.permutation import (
+    resolve_method,
+    permutation_group_test,
+    permutation_two_sample_test,
+    permutation_correlation_test,
+)
+from airbnb_analysis.models.rank_cache import spearman_test
+
+def tied_ranks_sorted(sorted_values):
+    """已排序数组的平均秩（结内取平均）和结校正项 sum(t^3 - t)"""
+    n = len(sorted_values)
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    ranks = np.repeat(starts + (counts + 1) / 2, counts)
+    tie_term = float(np.sum(counts.astype(float) ** 3 - counts))
+    return ranks, tie_term
+
+def _group_medians(sorted_values, sorted_codes, n_groups):
+    """由按数值排序的值和分组编码计算各组中位数"""
+    # 对编码做稳定排序，组内数值仍然有序
+    grouped_values = sorted_values[np.argsort(sorted_codes, kind='stable')]
+    sizes = np.bincount(sorted_codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+
+    medians = np.full(n_groups, np.nan)
+    nonempty = sizes > 0
+    lower = starts[nonempty] + (sizes[nonempty] - 1) // 2
+    upper = starts[nonempty] + sizes[nonempty] // 2
+    medians[nonempty] = (grouped_values[lower] + grouped_values[upper]) / 2
+    return medians
+
+def _sort_by_value(values, codes):
+    """去除缺失值和无效分组（编码<0）后按数值排序（只排序一次）"""
+    if isinstance(values, pd.Series):
+        values = values.to_numpy(dtype=float, na_value=np.nan)
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes, dtype=np.int64)
+    valid = ~np.isnan(values) & (codes >= 0)
+    values = values[valid]
+    codes = codes[valid]
+    order = np.argsort(values, kind='mergesort')
+    return values[order], codes[order]
+
+def kruskal_by_codes(values, codes, n_groups=None, tested_groups=None, pvalue_method=None):
+    """按整数分组编码的Kruskal-Wallis检验，一次排序同时得到H统计量、p值和各组中位数
+
+    tested_groups为按分组的布尔数组时只有这些组参与检验，中位数仍对全部分组计算。
+    pvalue_method为'permutation'时p值由置换检验（复用已计算的秩）得到。
+    """
+    sorted_values, sorted_codes = _sort_by_value(values, codes)
+    if n_groups is None:
+        n_groups = int(sorted_codes.max()) + 1 if len(sorted_codes) else 0
+    medians = _group_medians(sorted_values, sorted_codes, n_groups)
+
+    if tested_groups is not None:
+        # 从已排序序列中取子集，仍然有序，无需重新排序
+        keep = np.asarray(tested_groups, dtype=bool)[sorted_codes]
+        sorted_values = sorted_values[keep]
+        sorted_codes = sorted_codes[keep]
+
+    ranks, tie_term = tied_ranks_sorted(sorted_values)
+    sizes = np.bincount(sorted_codes, minlength=n_groups)
+    rank_sums = np.bincount(sorted_codes, weights=ranks, minlength=n_groups)
+
+    n = len(sorted_values)
+    present = sizes > 0
+    statistic = np.nan
+    p_value = np.nan
+    correction = 1 - tie_term / (n ** 3 - n) if n > 1 else 0
+    # 全部取值相同时统计量无定义
+    if present.sum() >= 2 and correction > 0:
+        statistic = 12.0 / (n * (n + 1)) * np.sum(rank_sums[present] ** 2 / sizes[present]) - 3 * (n + 1)
+        statistic /= correction
+        p_value = chi2.sf(statistic, present.sum() - 1)
+
+    result = {
+        'statistic': statistic,
+        'p_value': p_value,
+        'medians': medians,
+        'sizes': sizes,
+    }
+    if not np.isnan(statistic) and resolve_method(pvalue_method, n, sizes[present].min()) == 'permutation':
+        # 参与检验的组重新编码为0..k-1
+        dense_codes = (np.cumsum(present) - 1)[sorted_codes]
+        permutation = permutation_group_test(ranks, dense_codes)
+        result.update(p_value=permutation['p_value'], n_permutations=permutation['n_permutations'])
+    return result
+
+def mannwhitney_by_codes(values, codes, pvalue_method=None):
+    """按分组编码（0和1）的双侧Mann-Whitney U检验，一次排序同时得到U统计量、p值和两组中位数
+
+    与scipy.stats.mannwhitneyu默认设置一致：样本量较大或有结时使用带连续性校正的正态近似，
+    否则使用scipy的精确分布。返回的U为第0组的统计量。
+    pvalue_method为'permutation'时p值由置换检验（复用已计算的秩）得到。
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    sorted_values, sorted_codes = _sort_by_value(values, np.where(codes <= 1, codes, -1))
+    ranks, tie_term = tied_ranks_sorted(sorted_values)
+    sizes = np.bincount(sorted_codes, minlength=2)
+    medians = _group_medians(sorted_values, sorted_codes, 2)
+    result = {'statistic': np.nan, 'p_value': np.nan, 'medians': medians, 'sizes': sizes}
+
+    n1, n2 = sizes
+    if n1 == 0 or n2 == 0:
+        return result
+
+    if resolve_method(pvalue_method, n1 + n2, min(n1, n2)) == 'permutation':
+        permutation = permutation_two_sample_test(ranks, sorted_codes)
+        u1 = ranks[sorted_codes == 0].sum() - n1 * (n1 + 1) / 2
+        result.update(
+            statistic=u1, p_value=permutation['p_value'], n_permutations=permutation['n_permutations']
+        )
+        return result
+
+    if not (n1 > 8 and n2 > 8) and tie_term == 0:
+        stat, p_value = mannwhitneyu(
+            sorted_values[sorted_codes == 0], sorted_values[sorted_codes == 1], alternative='two-sided'
+        )
+        result.update(statistic=stat, p_value=p_value)
+        return result
+
+    n = n1 + n2
+    u1 = ranks[sorted_codes == 0].sum() - n1 * (n1 + 1) / 2
+    u = max(u1, n1 * n2 - u1)
+    sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (u - n1 * n2 / 2 - 0.5) / sigma
+    result.update(statistic=u1, p_value=np.clip(2 * ndtr(-z), 0, 1))
+    return result
+
+def test_privacy_premium(df, price_col='price', room_type_col='room_type', pvalue_method=None):
+    """测试隐私溢价（Mann-Whitney U检验，pvalue_method见PERMUTATION_CONFIG）"""
+    room_type = df[room_type_col]
+    codes = np.select(
+        [(room_type == 'Entire home/apt').to_numpy(), (room_type == 'Private room').to_numpy()],
+        [0, 1], default=-1
+    )
+    result = mannwhitney_by_codes(df[price_col], codes, pvalue_method)
     
-    if len(entire_home) > 0 and len(private_room) > 0:
-        stat, p_value = mannwhitneyu(entire_home, private_room, alternative='two-sided')
-        median_entire = entire_home.median()
-        median_private = private_room.median()
+    if result['sizes'][0] > 0 and result['sizes'][1] > 0:
+        median_entire, median_private = result['medians']
         premium_ratio = median_entire / median_private if median_private > 0 else 0
         
-        return {
-            'statistic': stat,
-            'p_value': p_value,
+        output = {
+            'statistic': result['statistic'],
+            'p_value': result['p_value'],
             'median_entire': median_entire,
             'median_private': median_private,
             'premium_ratio': premium_ratio
         }
+        if 'n_permutations' in result:
+            output['n_permutations'] = result['n_permutations']
+        return output
     return None
 
-def test_group_differences(df, group_col, value_col, min_samples=10):
-    """Kruskal-Wallis检验（多组比较）"""
-    groups = [
-        group[value_col].dropna() 
-        for name, group in df.groupby(group_col) 
-        if len(group) >= min_samples
-    ]
+def test_group_differences(df, group_col, value_col, min_samples=10, pvalue_method=None):
+    """Kruskal-Wallis检验（多组比较，pvalue_method见PERMUTATION_CONFIG）"""
+    # 分组编码与groupby(observed=True)的分组顺序一致（分类列按类别顺序，其余按取值排序）
+    codes, groups = pd.factorize(df[group_col], sort=True)
+    
+    # 参与检验的组按行数（含缺失值）筛选
+    row_counts = np.bincount(codes[codes >= 0], minlength=len(groups))
+    tested = row_counts >= min_samples
     
-    if len(groups) > 2:
-        stat, p_value = kruskal(*groups)
-        medians = df.groupby(group_col)[value_col].median()
-        return {
-            'statistic': stat,
-            'p_value': p_value,
-            'medians': medians.to_dict()
+    if tested.sum() > 2:
+        result = kruskal_by_codes(
+            df[value_col], codes, len(groups), tested_groups=tested, pvalue_method=pvalue_method
+        )
+        output = {
+            'statistic': result['statistic'],
+            'p_value': result['p_value'],
+            'medians': dict(zip(groups, result['medians']))
         }
+        if 'n_permutations' in result:
+            output['n_permutations'] = result['n_permutations']
+        return output
     return None
 
-def compute_correlation(x, y, method='spearman'):
-    """计算相关系数"""
+def compute_correlation(x, y, method='spearman', pvalue_method=None, ranks=None):
+    """计算相关系数（pvalue_method见PERMUTATION_CONFIG）
+
+    Spearman相关的秩只计算一次，相关系数和置换检验共用；ranks可传入已计算的(x秩, y秩)，
+    如RankCache.ranks()的结果。
+    """
     if method == 'spearman':
-        corr_coef, p_value = spearmanr(x, y)
-    else:
-        from scipy.stats import pearsonr
-        corr_coef, p_value = pearsonr(x, y)
-    
-    return {'correlation': corr_coef, 'p_value': p_value}
+        if ranks is None:
+            ranks = rankdata(np.asarray(x, dtype=float)), rankdata(np.asarray(y, dtype=float))
+        return spearman_test(*ranks, pvalue_method)
+
+    from scipy.stats import pearsonr
+    corr_coef, p_value = pearsonr(x, y)
+    result = {'correlation': corr_coef, 'p_value': p_value}
+    if not np.isnan(corr_coef) and resolve_method(pvalue_method, len(x)) == 'permutation':
+        permutation = permutation_correlation_test(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        result.update(p_value=permutation['p_value'], n_permutations=permutation['n_permutations'])
+    return result
@@ -9,7 +9,6 @@ REQUIRED_PACKAGES = {
     'seaborn': 'seaborn',
     'scipy': 'scipy',
     'statsmodels': 'statsmodels',
-    'sklearn': 'scikit-learn',
     'requests': 'requests',
 }
 
@@ -17,8 +16,6 @@ def install_package(package):
     """安装单个包"""
     try:
         module_name = package.split('-')[0] if '-' in package else package
-        if module_name == 'scikit-learn':
-            module_name = 'sklearn'
         __import__(module_name)
     except ImportError:
         print(f"Installing {package}...")
@@ -2,6 +2,7 @@
 import sys
 from pathlib import Path
 import pandas as pd
+import numpy as np
 import json
 
 BASE_PATH = Path(__file__).parent.parent.parent
@@ -11,15 +12,44 @@ from airbnb_analysis.data.loader import load_data
 from airbnb_analysis.data.preprocessor import preprocess_data
 from airbnb_analysis.models.statistical_tests import (
     test_privacy_premium, 
-    test_group_differences, 
-    compute_correlation
+    test_group_differences,
+    mannwhitney_by_codes
 )
-from airbnb_analysis.models.regression import fit_interaction_model
+from airbnb_analysis.models.regression import fit_interaction_model, fit_interaction_models
+from airbnb_analysis.data.adapter import flag_mask
+from airbnb_analysis.data.frame_view import FrameView
+from airbnb_analysis.models.rank_cache import RankCache
 from airbnb_analysis.config.constants import FEATURE_COLS
 
-def validate_scenario1(df):
-    """验证场景1: 物理空间溢价"""
+INTERACTION_FORMULA = 'price ~ accommodates * is_entire'
+
+def interaction_frame(df):
+    """场景1交互效应模型使用的数据（价格和容量非缺失的行）"""
+    df_model = FrameView(df).notna(FEATURE_COLS['price'], FEATURE_COLS['accommodates']).to_frame(
+        [FEATURE_COLS['price'], FEATURE_COLS['accommodates'], FEATURE_COLS['room_type']]
+    ).copy()
+    df_model['is_entire'] = (df_model[FEATURE_COLS['room_type']] == 'Entire home/apt').astype(int)
+    return df_model
+
+def fit_city_interaction_models(cities_data):
+    """各城市的交互效应模型一次批量求解（X'X块堆叠后批量Cholesky），返回{城市: 结果}"""
+    frames = {}
+    for city_name, df in cities_data.items():
+        try:
+            df_model = interaction_frame(df)
+        except KeyError:
+            continue
+        if len(df_model) > 100:
+            frames[city_name] = df_model
+    if not frames:
+        return {}
+    return fit_interaction_models(frames, INTERACTION_FORMULA)
+
+def validate_scenario1(df, rank_cache=None, interaction_model=None):
+    """验证场景1: 物理空间溢价（interaction_model为批量预先拟合的交互效应模型）"""
     results = {}
+    if rank_cache is None:
+        rank_cache = RankCache(df)
     
     # 1.1 隐私溢价
     privacy_result = test_privacy_premium(df)
@@ -32,12 +62,11 @@ def validate_scenario1(df):
             'median_private': privacy_result['median_private']
         }
     
-    # 1.2 容量溢价
-    df_cap = df[df[FEATURE_COLS['accommodates']].between(1, 10)].copy()
+    # 1.2 容量溢价（各子集均为基础数据框上的掩码视图，只提取用到的列）
+    df_cap = FrameView(df).filter(df[FEATURE_COLS['accommodates']].between(1, 10))
     if len(df_cap) > 100:
-        corr_result = compute_correlation(
-            df_cap[FEATURE_COLS['accommodates']],
-            df_cap[FEATURE_COLS['price']]
+        corr_result = rank_cache.spearman(
+            FEATURE_COLS['accommodates'], FEATURE_COLS['price'], df_cap.mask
         )
         results['capacity_premium'] = {
             'correlation': corr_result['correlation'],
@@ -46,15 +75,13 @@ def validate_scenario1(df):
         }
     
     # 1.3 交互效应
-    df_model = df.copy()
-    df_model['is_entire'] = (df_model[FEATURE_COLS['room_type']] == 'Entire home/apt').astype(int)
-    df_model = df_model[df_model[FEATURE_COLS['price']].notna() & 
-                        df_model[FEATURE_COLS['accommodates']].notna() &
-                        df_model['is_entire'].notna()]
+    df_model = interaction_frame(df)
     
     if len(df_model) > 100:
         try:
-            model = fit_interaction_model(df_model, 'price ~ accommodates * is_entire')
+            model = interaction_model
+            if model is None:
+                model = fit_interaction_model(df_model, INTERACTION_FORMULA)
             results['interaction_effect'] = {
                 'interaction_coef': model.params.get('accommodates:is_entire', None),
                 'interaction_p_value': model.pvalues.get('accommodates:is_entire', None),
@@ -69,7 +96,9 @@ def validate_scenario2(df):
     """验证场景2: 位置溢价"""
     results = {}
     
-    df_region = df[df[FEATURE_COLS['neighbourhood_group']].notna()].copy()
+    df_region = FrameView(df).notna(FEATURE_COLS['neighbourhood_group']).to_frame(
+        [FEATURE_COLS['neighbourhood_group'], FEATURE_COLS['price']]
+    )
     if len(df_region) > 100:
         region_result = test_group_differences(
             df_region, 
@@ -89,7 +118,9 @@ def validate_scenario3(df):
     """验证场景3: 规模溢价"""
     results = {}
     
-    df_scale = df[df['host_listings_count_binned'].notna()].copy()
+    df_scale = FrameView(df).notna('host_listings_count_binned').to_frame(
+        ['host_listings_count_binned', FEATURE_COLS['price'], FEATURE_COLS['availability']]
+    )
     if len(df_scale) > 100:
         # 价格
         price_result = test_group_differences(
@@ -119,17 +150,17 @@ def validate_scenario3(df):
     
     return results
 
-def validate_scenario4(df):
+def validate_scenario4(df, rank_cache=None):
     """验证场景4: 信任货币化"""
     results = {}
+    if rank_cache is None:
+        rank_cache = RankCache(df)
     
     # 评分 vs 入住率
-    df_rating = df[df[FEATURE_COLS['review_rating']].notna() & 
-                   df[FEATURE_COLS['availability']].notna()].copy()
+    df_rating = FrameView(df).notna(FEATURE_COLS['review_rating'], FEATURE_COLS['availability'])
     if len(df_rating) > 100:
-        corr_result = compute_correlation(
-            df_rating[FEATURE_COLS['review_rating']],
-            df_rating[FEATURE_COLS['availability']]
+        corr_result = rank_cache.spearman(
+            FEATURE_COLS['review_rating'], FEATURE_COLS['availability'], df_rating.mask
         )
         results['rating_occupancy'] = {
             'correlation': corr_result['correlation'],
@@ -138,35 +169,35 @@ def validate_scenario4(df):
         }
     
     # 超赞房东
-    df_superhost = df[df[FEATURE_COLS['superhost']].notna() & 
-                      df[FEATURE_COLS['availability']].notna()].copy()
+    df_superhost = FrameView(df).notna(FEATURE_COLS['superhost'], FEATURE_COLS['availability'])
     if len(df_superhost) > 100:
-        superhost_occ = df_superhost[df_superhost[FEATURE_COLS['superhost']] == 't'][FEATURE_COLS['availability']].dropna()
-        regular_occ = df_superhost[df_superhost[FEATURE_COLS['superhost']] == 'f'][FEATURE_COLS['availability']].dropna()
+        superhost = df_superhost[FEATURE_COLS['superhost']]
+        # 超赞房东编码为0，普通房东为1，一次排序完成检验和中位数
+        codes = np.select([flag_mask(superhost, True), flag_mask(superhost, False)], [0, 1], default=-1)
+        comparison = mannwhitney_by_codes(df_superhost[FEATURE_COLS['availability']], codes)
         
-        if len(superhost_occ) > 10 and len(regular_occ) > 10:
-            from scipy.stats import mannwhitneyu
-            stat, p_value = mannwhitneyu(superhost_occ, regular_occ, alternative='two-sided')
+        if comparison['sizes'][0] > 10 and comparison['sizes'][1] > 10:
+            p_value = comparison['p_value']
             results['superhost_comparison'] = {
                 'p_value': p_value,
                 'significant': p_value < 0.05,
-                'superhost_median': superhost_occ.median(),
-                'regular_median': regular_occ.median()
+                'superhost_median': comparison['medians'][0],
+                'regular_median': comparison['medians'][1]
             }
     
     return results
 
-def validate_scenario5(df):
+def validate_scenario5(df, rank_cache=None):
     """验证场景5: 活跃度信号"""
     results = {}
+    if rank_cache is None:
+        rank_cache = RankCache(df)
     
     # LTM vs 价格
-    df_ltm = df[df[FEATURE_COLS['reviews_ltm']].notna() & 
-                df[FEATURE_COLS['price']].notna()].copy()
+    df_ltm = FrameView(df).notna(FEATURE_COLS['reviews_ltm'], FEATURE_COLS['price'])
     if len(df_ltm) > 100:
-        corr_ltm_price = compute_correlation(
-            df_ltm[FEATURE_COLS['reviews_ltm']],
-            df_ltm[FEATURE_COLS['price']]
+        corr_ltm_price = rank_cache.spearman(
+            FEATURE_COLS['reviews_ltm'], FEATURE_COLS['price'], df_ltm.mask
         )
         results['ltm_price'] = {
             'correlation': corr_ltm_price['correlation'],
@@ -175,12 +206,10 @@ def validate_scenario5(df):
         }
     
     # 历史评论 vs 价格
-    df_hist = df[df[FEATURE_COLS['reviews_total']].notna() & 
-                 df[FEATURE_COLS['price']].notna()].copy()
+    df_hist = FrameView(df).notna(FEATURE_COLS['reviews_total'], FEATURE_COLS['price'])
     if len(df_hist) > 100:
-        corr_hist_price = compute_correlation(
-            df_hist[FEATURE_COLS['reviews_total']],
-            df_hist[FEATURE_COLS['price']]
+        corr_hist_price = rank_cache.spearman(
+            FEATURE_COLS['reviews_total'], FEATURE_COLS['price'], df_hist.mask
         )
         results['historical_price'] = {
             'correlation': corr_hist_price['correlation'],
@@ -189,12 +218,10 @@ def validate_scenario5(df):
         }
     
     # LTM vs 入住率
-    df_ltm_occ = df[df[FEATURE_COLS['reviews_ltm']].notna() & 
-                    df[FEATURE_COLS['availability']].notna()].copy()
+    df_ltm_occ = FrameView(df).notna(FEATURE_COLS['reviews_ltm'], FEATURE_COLS['availability'])
     if len(df_ltm_occ) > 100:
-        corr_ltm_occ = compute_correlation(
-            df_ltm_occ[FEATURE_COLS['reviews_ltm']],
-            df_ltm_occ[FEATURE_COLS['availability']]
+        corr_ltm_occ = rank_cache.spearman(
+            FEATURE_COLS['reviews_ltm'], FEATURE_COLS['availability'], df_ltm_occ.mask
         )
         results['ltm_occupancy'] = {
             'correlation': corr_ltm_occ['correlation'],
@@ -204,6 +231,113 @@ def validate_scenario5(df):
     
     return results
 
+def _numeric(series):
+    """转换为float数组（缺失值为NaN）"""
+    return series.to_numpy(dtype=float, na_value=np.nan)
+
+def _spearman_effect(name, view, x_col, y_col):
+    """Spearman相关效应（成对删除缺失值）"""
+    view = view.notna(x_col, y_col)
+    return {'name': name, 'kind': 'spearman', 'data': {'x': _numeric(view[x_col]), 'y': _numeric(view[y_col])}}
+
+def _two_group_effect(name, kind, values, codes):
+    """两组（编码0和1）中位数比较效应"""
+    values = _numeric(values)
+    keep = ~np.isnan(values) & (codes >= 0)
+    if not ((codes[keep] == 0).any() and (codes[keep] == 1).any()):
+        return None
+    return {'name': name, 'kind': kind, 'data': {'values': values[keep], 'codes': codes[keep]}}
+
+def _kruskal_effect(name, df, group_col, value_col, min_samples=10):
+    """多组比较效应（epsilon²），参与的分组与test_group_differences一致"""
+    codes, groups = pd.factorize(df[group_col], sort=True)
+    tested = np.bincount(codes[codes >= 0], minlength=len(groups)) >= min_samples
+    if tested.sum() <= 2:
+        return None
+    values = _numeric(df[value_col])
+    keep = (codes >= 0) & tested[np.maximum(codes, 0)] & ~np.isnan(values)
+    return {'name': name, 'kind': 'epsilon_squared', 'data': {'values': values[keep], 'codes': codes[keep]}}
+
+def collect_scenario_effects(df):
+    """收集validate_scenario1-5中各检验对应的效应量数据（用于自助法置信区间）"""
+    effects = []
+    base = FrameView(df)
+    
+    # 场景1: 隐私溢价（中位数之比）、容量溢价（相关）、交互效应（OLS系数）
+    room_type = df[FEATURE_COLS['room_type']]
+    room_codes = np.select(
+        [(room_type == 'Entire home/apt').to_numpy(), (room_type == 'Private room').to_numpy()],
+        [0, 1], default=-1
+    )
+    effects.append(_two_group_effect(
+        ('scenario1', 'privacy_premium'), 'median_ratio', df[FEATURE_COLS['price']], room_codes
+    ))
+    
+    df_cap = base.filter(df[FEATURE_COLS['accommodates']].between(1, 10))
+    if len(df_cap) > 100:
+        effects.append(_spearman_effect(
+            ('scenario1', 'capacity_premium'), df_cap, FEATURE_COLS['accommodates'], FEATURE_COLS['price']
+        ))
+    
+    df_model = base.notna(FEATURE_COLS['price'], FEATURE_COLS['accommodates'])
+    if len(df_model) > 100:
+        effects.append({
+            'name': ('scenario1', 'interaction_effect'),
+            'kind': 'interaction',
+            'data': {
+                'x': _numeric(df_model[FEATURE_COLS['accommodates']]),
+                'd': (df_model[FEATURE_COLS['room_type']] == 'Entire home/apt').to_numpy(dtype=float),
+                'y': _numeric(df_model[FEATURE_COLS['price']]),
+            },
+        })
+    
+    # 场景2、3: 多组比较
+    df_region = base.notna(FEATURE_COLS['neighbourhood_group'])
+    if len(df_region) > 100:
+        df_region = df_region.to_frame([FEATURE_COLS['neighbourhood_group'], FEATURE_COLS['price']])
+        effects.append(_kruskal_effect(
+            ('scenario2', 'region_comparison'), df_region, FEATURE_COLS['neighbourhood_group'], FEATURE_COLS['price']
+        ))
+    
+    df_scale = base.notna('host_listings_count_binned')
+    if len(df_scale) > 100:
+        df_scale = df_scale.to_frame(
+            ['host_listings_count_binned', FEATURE_COLS['price'], FEATURE_COLS['availability']]
+        )
+        effects.append(_kruskal_effect(
+            ('scenario3', 'scale_price'), df_scale, 'host_listings_count_binned', FEATURE_COLS['price']
+        ))
+        effects.append(_kruskal_effect(
+            ('scenario3', 'scale_occupancy'), df_scale, 'host_listings_count_binned', FEATURE_COLS['availability']
+        ))
+    
+    # 场景4: 评分与入住率相关、超赞房东入住率中位数之差
+    df_rating = base.notna(FEATURE_COLS['review_rating'], FEATURE_COLS['availability'])
+    if len(df_rating) > 100:
+        effects.append(_spearman_effect(
+            ('scenario4', 'rating_occupancy'), df_rating, FEATURE_COLS['review_rating'], FEATURE_COLS['availability']
+        ))
+    
+    df_superhost = base.notna(FEATURE_COLS['superhost'], FEATURE_COLS['availability'])
+    if len(df_superhost) > 100:
+        superhost = df_superhost[FEATURE_COLS['superhost']]
+        codes = np.select([flag_mask(superhost, True), flag_mask(superhost, False)], [0, 1], default=-1)
+        effects.append(_two_group_effect(
+            ('scenario4', 'superhost_comparison'), 'median_diff', df_superhost[FEATURE_COLS['availability']], codes
+        ))
+    
+    # 场景5: 活跃度相关
+    for name, x_col, y_col in [
+        ('ltm_price', FEATURE_COLS['reviews_ltm'], FEATURE_COLS['price']),
+        ('historical_price', FEATURE_COLS['reviews_total'], FEATURE_COLS['price']),
+        ('ltm_occupancy', FEATURE_COLS['reviews_ltm'], FEATURE_COLS['availability']),
+    ]:
+        view = base.notna(x_col, y_col)
+        if len(view) > 100:
+            effects.append(_spearman_effect(('scenario5', name), view, x_col, y_col))
+    
+    return [effect for effect in effects if effect is not None]
+
 def validate_all_results():
     """验证所有场景的统计检验结果"""
     print("="*80)
@@ -215,10 +349,12 @@ def validate_all_results():
     df = preprocess_data(df)
     
     all_results = {}
+    # 各场景共用同一个秩缓存
+    rank_cache = RankCache(df)
     
     # 场景1
     print("\n验证场景1: 物理空间溢价...")
-    all_results['scenario1'] = validate_scenario1(df)
+    all_results['scenario1'] = validate_scenario1(df, rank_cache)
     
     # 场景2
     print("验证场景2: 位置溢价...")
@@ -230,11 +366,11 @@ def validate_all_results():
     
     # 场景4
     print("验证场景4: 信任货币化...")
-    all_results['scenario4'] = validate_scenario4(df)
+    all_results['scenario4'] = validate_scenario4(df, rank_cache)
     
     # 场景5
     print("验证场景5: 活跃度信号...")
-    all_results['scenario5'] = validate_scenario5(df)
+    all_results['scenario5'] = validate_scenario5(df, rank_cache)
     
     # 生成汇总报告
     print("\n" + "="*80)
@@ -0,0 +1,26 @@
+"""六边形热力图 - 由预先计算的单元表绘制"""
+import matplotlib as mpl
+from matplotlib.collections import PolyCollection
+from matplotlib.transforms import AffineDeltaTransform
+
+def plot_hex_cells(ax, grid, cells, column='median', cmap=None, vmin=None, vmax=None,
+                   linewidths=None, edgecolors='face'):
+    """按单元表的column列着色绘制六边形（外观与ax.hexbin相同），返回可用于colorbar的集合"""
+    if linewidths is None:
+        linewidths = [mpl.rcParams['patch.linewidth']]
+    collection = PolyCollection(
+        [grid.polygon()],
+        edgecolors=edgecolors,
+        linewidths=linewidths,
+        offsets=cells[['x', 'y']].to_numpy(dtype=float),
+        offset_transform=AffineDeltaTransform(ax.transData),
+    )
+    collection.set_cmap(cmap)
+    collection.set_array(cells[column].to_numpy(dtype=float))
+    collection.set_clim(vmin, vmax)
+
+    # 坐标范围为整个网格（与hexbin一致）
+    ax.update_datalim([(grid.xmin, grid.ymin), (grid.xmax, grid.ymax)])
+    ax.add_collection(collection, autolim=False)
+    ax.autoscale_view(tight=True)
+    return collection
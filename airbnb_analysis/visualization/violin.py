@@ -0,0 +1,39 @@
+"""小提琴图 - 各组密度由分箱KDE一次批量计算"""
+import numpy as np
+import seaborn as sns
+
+from airbnb_analysis.models.smoothing import grouped_kde
+
+def plot_violins(ax, data, x, y, order=None, palette=None, inner='quartile', cut=2, width=0.8):
+    """绘制小提琴图（参数含义与seaborn.violinplot一致，各组面积相同）"""
+    grid, densities, supports, labels = grouped_kde(
+        data[y].to_numpy(dtype=float, na_value=np.nan), data[x], cut=cut, order=order
+    )
+    colors = sns.color_palette(palette, n_colors=len(labels))
+    # 各组密度共用同一缩放，密度最大处宽度为width
+    peak = densities.max() if densities.size else 0
+    scale = width / 2 / peak if peak > 0 else 0
+
+    values = data[y]
+    for i, label in enumerate(labels):
+        if not densities[i].any():
+            continue
+        inside = (grid >= supports[i, 0]) & (grid <= supports[i, 1])
+        half_width = densities[i][inside] * scale
+        ax.fill_betweenx(
+            grid[inside], i - half_width, i + half_width,
+            facecolor=colors[i], edgecolor='#3f3f3f', linewidth=1.25
+        )
+        if inner == 'quartile':
+            group_values = values[(data[x] == label).to_numpy()].dropna()
+            for q, style in zip((0.25, 0.5, 0.75), (':', '--', ':')):
+                level = group_values.quantile(q)
+                half = np.interp(level, grid, densities[i]) * scale
+                ax.plot([i - half, i + half], [level, level], color='#3f3f3f', linestyle=style, linewidth=1.25)
+
+    ax.set_xticks(range(len(labels)))
+    ax.set_xticklabels([str(label) for label in labels])
+    ax.set_xlim(-0.5, len(labels) - 0.5)
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return ax
@@ -6,6 +6,9 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent
 sys.path.insert(0, str(BASE_DIR))
 
+from airbnb_analysis.data.frame_view import enable_copy_on_write
+enable_copy_on_write()
+
 from airbnb_analysis.utils.dependencies import ensure_dependencies
 from airbnb_analysis.visualization.style import setup_style
 from airbnb_analysis.data.loader import load_data
@@ -16,6 +19,7 @@ from airbnb_analysis.analysis.scenario3_scale import run_scenario3
 from airbnb_analysis.analysis.scenario4_trust import run_scenario4
 from airbnb_analysis.analysis.scenario5_activity import run_scenario5
 from airbnb_analysis.analysis.comprehensive_model import run_comprehensive_model
+from airbnb_analysis.config.settings import DATA_CITY
 
 def main():
     """主函数"""
@@ -32,11 +36,11 @@ def main():
     # 4. 运行所有场景分析
     results = {}
     results['scenario1'] = run_scenario1(df)
-    results['scenario2'] = run_scenario2(df)
+    results['scenario2'] = run_scenario2(df, DATA_CITY)
     results['scenario3'] = run_scenario3(df)
     results['scenario4'] = run_scenario4(df)
     results['scenario5'] = run_scenario5(df)
-    results['comprehensive'] = run_comprehensive_model(df)
+    results['comprehensive'] = run_comprehensive_model(df, DATA_CITY)
     
     print("\n" + "="*80)
     print("所有分析完成！")
@@ -12,6 +12,8 @@ print("正在检查并安装依赖...")
 ensure_dependencies()
 
 # 现在可以安全导入其他模块
+from airbnb_analysis.data.frame_view import enable_copy_on_write
+enable_copy_on_write()
 from airbnb_analysis.visualization.style import setup_style
 from airbnb_analysis.utils.validate_results import validate_all_results
 from airbnb_analysis.analysis.multi_city_analysis import analyze_all_cities
@@ -0,0 +1,35 @@
+"""批量价格评分入口 - 用综合模型工件对房源文件逐块预测价格"""
+import argparse
+import sys
+from pathlib import Path
+
+# 添加airbnb_analysis到路径
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR))
+
+from airbnb_analysis.data.frame_view import enable_copy_on_write
+enable_copy_on_write()
+
+from airbnb_analysis.data.batch_scoring import score_listings_file
+from airbnb_analysis.data.multi_city_loader import extract_city_name
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="用综合模型工件批量预测房源价格")
+    parser.add_argument('inputs', nargs='+', help="房源文件（csv、csv.gz、zstd或Parquet，可多个）")
+    parser.add_argument('-o', '--output', required=True, help="输出文件（.csv或.csv.gz）")
+    parser.add_argument('-m', '--model', default=None, help="模型工件路径（默认outputs/models/price_model.json）")
+    parser.add_argument('--chunksize', type=int, default=None, help="每个分块的行数")
+    parser.add_argument('--city', default=None, help="输入数据的城市（默认由文件名推断），与模型训练城市不一致时警告")
+    args = parser.parse_args(argv)
+
+    city_name = args.city
+    if city_name is None:
+        # 多期快照文件应属于同一城市
+        cities = {extract_city_name(Path(path).name) for path in args.inputs}
+        city_name = cities.pop() if len(cities) == 1 else None
+
+    return score_listings_file(args.inputs, args.output, args.model, args.chunksize, city_name)
+
+if __name__ == "__main__":
+    main()